@@ -0,0 +1,176 @@
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+import asyncio
+import math
+import time
+
+from metrics import registry
+
+admission_in_flight = registry.gauge("questgen_admission_in_flight", "Requests holding a slot in each admission pool", labelnames=("pool",))
+admission_queued = registry.gauge("questgen_admission_queued", "Requests waiting for a slot in each admission pool", labelnames=("pool",))
+admission_capacity = registry.gauge("questgen_admission_capacity", "Concurrent slots in each admission pool", labelnames=("pool",))
+admission_decisions = registry.counter(
+    "questgen_admission_decisions_total", "Admission outcomes per pool (admitted, queue_full, deadline, timeout)",
+    labelnames=("pool", "outcome")
+)
+admission_wait_seconds = registry.histogram(
+    "questgen_admission_wait_seconds", "Time admitted requests spent queued for a slot", labelnames=("pool",)
+)
+
+
+class AdmissionRejected(Exception):
+    """Raised when a pool cannot admit a request in time; carries the HTTP status and Retry-After"""
+
+    def __init__(self, pool: str, reason: str, status_code: int, retry_after: int):
+        super().__init__(f"{pool} pool is saturated ({reason}), retry in {retry_after}s")
+        self.pool = pool
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionPool:
+    """
+    Bounded concurrency with a bounded FIFO queue, for use on the event loop.
+
+    A request gets a slot immediately if one is free. Otherwise it queues,
+    unless the queue is full (429) or the expected wait already exceeds its
+    budget (503). The budget is the smaller of max_wait_seconds and the
+    caller's deadline. The expected wait is estimated from the moving
+    average time a slot is held, so overload is refused up front instead of
+    timing out late.
+    """
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_wait_seconds: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self._waiters: "deque[asyncio.Future]" = deque()
+        self._service_seconds = 1.0  # moving average of slot hold time
+        self._samples = 0
+        self.admitted = 0
+        self.rejected = 0
+        admission_in_flight.track(lambda: self.in_flight, pool=name)
+        admission_queued.track(lambda: len(self._waiters), pool=name)
+        admission_capacity.track(lambda: self.max_concurrency, pool=name)
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def estimated_wait(self, position: int) -> float:
+        """
+        Seconds until the request at this queue position (1-based) gets a
+        slot. Slots free up at about max_concurrency / service time per
+        second, so the first waiters are admitted long before one full hold.
+        """
+        return position * self._service_seconds / self.max_concurrency
+
+    def _reject(self, reason: str, status_code: int, wait: float):
+        self.rejected += 1
+        admission_decisions.inc(pool=self.name, outcome=reason)
+        raise AdmissionRejected(self.name, reason, status_code, max(1, math.ceil(wait)))
+
+    async def acquire(self, deadline: Optional[float] = None) -> float:
+        """
+        Wait for a slot; `deadline` is a time.monotonic() value. Returns the
+        admission time to pass back to release().
+        """
+        start = time.monotonic()
+        if self.in_flight < self.max_concurrency and not self._waiters:
+            self.in_flight += 1
+        else:
+            position = len(self._waiters) + 1
+            if position > self.max_queue:
+                self._reject("queue_full", 429, self.estimated_wait(position))
+            budget = self.max_wait_seconds if deadline is None else min(self.max_wait_seconds, deadline - start)
+            if self.estimated_wait(position) > budget:
+                self._reject("deadline", 503, self.estimated_wait(position))
+
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await asyncio.wait_for(asyncio.shield(waiter), timeout=max(budget, 0))
+            except asyncio.TimeoutError:
+                if waiter.done() and not waiter.cancelled():
+                    pass  # the slot arrived as the timer fired; keep it
+                else:
+                    waiter.cancel()
+                    self._discard(waiter)
+                    self._reject("timeout", 503, self.estimated_wait(len(self._waiters) + 1))
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release_slot()  # handed a slot we will never use
+                else:
+                    waiter.cancel()
+                    self._discard(waiter)
+                raise
+
+        admitted_at = time.monotonic()
+        self.admitted += 1
+        admission_decisions.inc(pool=self.name, outcome="admitted")
+        admission_wait_seconds.observe(admitted_at - start, pool=self.name)
+        return admitted_at
+
+    def release(self, admitted_at: float):
+        held = time.monotonic() - admitted_at
+        self._samples += 1
+        # Fast start, then a moving average that tracks load changes within ~20 requests
+        weight = max(1 / self._samples, 0.05)
+        self._service_seconds += weight * (held - self._service_seconds)
+        self._release_slot()
+
+    def _release_slot(self):
+        # Hand the slot straight to the oldest live waiter, so in_flight never dips
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _discard(self, waiter: asyncio.Future):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    @asynccontextmanager
+    async def slot(self, deadline: Optional[float] = None):
+        admitted_at = await self.acquire(deadline)
+        try:
+            yield
+        finally:
+            self.release(admitted_at)
+
+    def stats(self) -> Dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_seconds": self.max_wait_seconds,
+            "in_flight": self.in_flight,
+            "queued": self.queued,
+            "avg_service_seconds": self._service_seconds if self._samples else None,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+class AdmissionController:
+    """Named admission pools: interactive queries, ingestion and background jobs"""
+
+    def __init__(self):
+        self._pools: Dict[str, AdmissionPool] = {}
+
+    def add_pool(self, name: str, max_concurrency: int, max_queue: int, max_wait_seconds: float) -> AdmissionPool:
+        self._pools[name] = AdmissionPool(name, max_concurrency, max_queue, max_wait_seconds)
+        return self._pools[name]
+
+    def pool(self, name: str) -> AdmissionPool:
+        return self._pools[name]
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: pool.stats() for name, pool in self._pools.items()}
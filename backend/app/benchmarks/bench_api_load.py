@@ -0,0 +1,213 @@
+"""
+End-to-end load test of the API with concurrent authenticated users.
+
+Each of --users virtual users registers, logs in, uploads a synthetic PDF
+(which becomes its active file), then loops until --duration runs out.
+Every iteration sends a request picked by --mix weights to /query,
+/comprehensive-query or /upload-file. The script reports throughput,
+p50/p95/p99 latency and error rate per endpoint, and writes them as JSON
+with --output.
+
+To keep provider latency and cost out of the numbers, --start-fake-llm runs
+benchmarks/fake_llm_server.py, and --start-api runs uvicorn with
+OPENAI_BASE_URL pointed at it. Qdrant must still be reachable (e.g. a local
+container with QDRANT_HOST=localhost). Run from backend/app:
+    python benchmarks/bench_api_load.py --start-fake-llm --start-api [--users 20] [--duration 60]
+    python benchmarks/bench_api_load.py --base-url http://localhost:8000 --mix query=1
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_ingestion import build_pdf
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+QUERIES = (
+    "Summarize the main argument of this document.",
+    "Generate 5 multiple choice questions about the key concepts.",
+    "Explain the relationship between the model and the measured results.",
+    "What evidence supports the hypothesis in section 2?",
+    "Create 10 short answer questions with answers for revision.",
+)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def start_process(command, env=None) -> subprocess.Popen:
+    return subprocess.Popen(command, cwd=APP_DIR, env={**os.environ, **(env or {})})
+
+
+async def wait_ready(url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"{url} did not answer within {timeout}s")
+
+
+class VirtualUser:
+    def __init__(self, base_url: str, pdf_bytes: bytes, max_tokens: int):
+        self.client = httpx.AsyncClient(base_url=base_url, timeout=300)
+        self.pdf_bytes = pdf_bytes
+        self.max_tokens = max_tokens
+        self.uploads = 0
+
+    async def login(self):
+        username, password = f"load_{secrets.token_hex(5)}", secrets.token_urlsafe(12)
+        await self.client.post("/auth/register", json={
+            "username": username, "email": f"{username}@example.com", "password": password
+        })
+        response = await self.client.post("/auth/login", json={"username": username, "password": password})
+        response.raise_for_status()
+
+    async def request(self, endpoint: str) -> httpx.Response:
+        if endpoint == "query":
+            return await self.client.post("/query", json={"query": random.choice(QUERIES)})
+        if endpoint == "comprehensive-query":
+            return await self.client.post("/comprehensive-query", json={
+                "query": random.choice(QUERIES), "max_tokens": self.max_tokens
+            })
+        if endpoint == "upload-file":
+            self.uploads += 1
+            files = {"file": (f"load_{secrets.token_hex(4)}.pdf", self.pdf_bytes, "application/pdf")}
+            return await self.client.post("/upload-file", files=files)
+        raise ValueError(f"Unknown endpoint: {endpoint}")
+
+    async def close(self):
+        await self.client.aclose()
+
+
+async def run(args):
+    mix = {name: float(weight) for name, weight in (item.split("=") for item in args.mix.split(","))}
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = os.path.join(workdir, "load.pdf")
+        build_pdf(pdf_path, args.pages, 0.3, seed=11)
+        with open(pdf_path, "rb") as f:
+            pdf_bytes = f.read()
+
+    users = [VirtualUser(args.base_url, pdf_bytes, args.max_tokens) for _ in range(args.users)]
+    await asyncio.gather(*(user.login() for user in users))
+    # Every user needs an active file before /comprehensive-query works
+    setup = await asyncio.gather(*(user.request("upload-file") for user in users))
+    if any(response.status_code != 200 for response in setup):
+        print(f"warning: {sum(r.status_code != 200 for r in setup)} setup uploads failed", file=sys.stderr)
+
+    latencies = {name: [] for name in mix}
+    statuses = {name: {} for name in mix}
+    names, weights = list(mix), list(mix.values())
+    deadline = time.monotonic() + args.duration
+
+    async def drive(user: VirtualUser):
+        while time.monotonic() < deadline:
+            endpoint = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = (await user.request(endpoint)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            latencies[endpoint].append(time.perf_counter() - start)
+            statuses[endpoint][status] = statuses[endpoint].get(status, 0) + 1
+            if args.think_time:
+                await asyncio.sleep(random.expovariate(1 / args.think_time))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(drive(user) for user in users))
+    elapsed = time.perf_counter() - start
+    await asyncio.gather(*(user.close() for user in users))
+
+    report = {}
+    for endpoint in names:
+        samples = latencies[endpoint]
+        errors = sum(count for status, count in statuses[endpoint].items() if status != 200)
+        report[endpoint] = {
+            "requests": len(samples),
+            "rps": len(samples) / elapsed,
+            "p50_ms": percentile(samples, 0.50) * 1e3,
+            "p95_ms": percentile(samples, 0.95) * 1e3,
+            "p99_ms": percentile(samples, 0.99) * 1e3,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "statuses": {str(status): count for status, count in statuses[endpoint].items()},
+        }
+    return elapsed, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--mix", default="query=5,comprehensive-query=4,upload-file=1")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean seconds between a user's requests")
+    parser.add_argument("--max-tokens", type=int, default=300)
+    parser.add_argument("--pages", type=int, default=10, help="pages in the uploaded synthetic PDF")
+    parser.add_argument("--start-api", action="store_true", help="run uvicorn main:app for the test")
+    parser.add_argument("--api-workers", type=int, default=1)
+    parser.add_argument("--start-fake-llm", action="store_true", help="run fake_llm_server.py for the test")
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--llm-ttft", default="lognormal:600,0.5")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    processes = []
+    try:
+        llm_url = f"http://127.0.0.1:{args.llm_port}"
+        if args.start_fake_llm:
+            processes.append(start_process([
+                sys.executable, "benchmarks/fake_llm_server.py", "--port", str(args.llm_port),
+                "--ttft", args.llm_ttft, "--tokens-per-second", str(args.llm_tokens_per_second)
+            ]))
+            asyncio.run(wait_ready(f"{llm_url}/v1/models", args.startup_timeout))
+        if args.start_api:
+            port = httpx.URL(args.base_url).port or 8000
+            env = {"API_WORKERS": str(args.api_workers)}
+            if args.start_fake_llm:
+                env.update(OPENAI_BASE_URL=f"{llm_url}/v1", WARM_UP_LLM_PING="false")
+            processes.append(start_process([
+                sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+                "--workers", str(args.api_workers), "--log-level", "warning"
+            ], env))
+            asyncio.run(wait_ready(f"{args.base_url}/ready", args.startup_timeout))
+
+        elapsed, report = asyncio.run(run(args))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"{args.users} users for {elapsed:.1f}s")
+    print(f"{'endpoint':>20} {'requests':>9} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for endpoint, stats in report.items():
+        print(f"{endpoint:>20} {stats['requests']:>9} {stats['rps']:>8.2f} {stats['p50_ms']:>9.1f} "
+              f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats['error_rate']:>6.1%}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"users": args.users, "duration_seconds": elapsed, "mix": args.mix,
+                       "llm": {"ttft": args.llm_ttft, "tokens_per_second": args.llm_tokens_per_second}
+                       if args.start_fake_llm else "external",
+                       "endpoints": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Prompt tokens saved by the context compressor on retrieval-shaped input.
+
+Builds a seeded synthetic document with the prose generator from
+bench_ingestion.py and splits it with the ingestion splitter settings
+(1000 characters, 150 overlap). It then retrieves --top-k chunks per query
+by query-term overlap, which stands in for dense retrieval and likewise
+returns clusters of adjacent chunks. Each hit list is formatted the old way
+(a SOURCE header per chunk) and through ContextCompressor with and without
+sentence selection. The script reports mean prompt tokens, the reduction,
+whether every source is still cited and the compression time. Run from
+backend/app:
+    python benchmarks/bench_context_compression.py [--paragraphs 400] [--queries 200] [--top-k 10]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
+
+from bench_ingestion import WORDS, sentence  # noqa: E402
+from context_compressor import ContextCompressor  # noqa: E402
+from conversation_memory import count_tokens  # noqa: E402
+
+
+def build_chunks(paragraphs: int, seed: int):
+    rng = random.Random(seed)
+    text = "\n\n".join(" ".join(sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(paragraphs))
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=150, length_function=len, separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    return splitter.split_text(text)
+
+
+def retrieve(chunks, chunk_words, query: str, top_k: int):
+    terms = set(query.lower().split())
+    scored = sorted(
+        ((len(terms & words) / len(terms), i) for i, words in enumerate(chunk_words)), reverse=True
+    )[:top_k]
+    return [
+        (chunks[i], {"filename": "synthetic.pdf", "chunk_index": i, "page_number": i // 3}, 0.3 + 0.7 * score)
+        for score, i in scored
+    ]
+
+
+def raw_context(hits) -> str:
+    context = ""
+    for i, (text, metadata, score) in enumerate(hits):
+        context += f"\n--- SOURCE {i+1}: {metadata['filename']} | Page {metadata['page_number']} | Score: {score:.3f} ---\n"
+        context += text + "\n"
+    return context
+
+
+def all_cited(context: str, count: int) -> bool:
+    cited = {int(n) for header in re.findall(r"\[Source ([\d, ]+)\]", context) for n in header.split(",")}
+    return cited == set(range(1, count + 1))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--keep-ratio", type=float, default=0.6)
+    parser.add_argument("--seed", type=int, default=3)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    chunks = build_chunks(args.paragraphs, args.seed)
+    chunk_words = [set(chunk.lower().split()) for chunk in chunks]
+    rng = random.Random(args.seed + 1)
+    queries = [" ".join(rng.sample(WORDS, 4)) for _ in range(args.queries)]
+    modes = {
+        "dedupe": ContextCompressor(),
+        "dedupe+select": ContextCompressor(select_sentences=True, keep_ratio=args.keep_ratio),
+    }
+
+    raw_tokens = []
+    results = {mode: {"tokens": [], "seconds": 0.0, "all_cited": 0} for mode in modes}
+    for query in queries:
+        hits = retrieve(chunks, chunk_words, query, args.top_k)
+        raw = raw_context(hits)
+        raw_tokens.append(count_tokens(raw))
+        for mode, compressor in modes.items():
+            start = time.perf_counter()
+            context, _ = compressor.compress(query, hits, raw_context=raw)
+            results[mode]["seconds"] += time.perf_counter() - start
+            results[mode]["tokens"].append(count_tokens(context))
+            results[mode]["all_cited"] += all_cited(context, len(hits))
+
+    mean_raw = sum(raw_tokens) / len(raw_tokens)
+    report = {"chunks": len(chunks), "queries": len(queries), "top_k": args.top_k, "raw_tokens": mean_raw, "modes": {}}
+    print(f"{len(chunks)} chunks, {len(queries)} queries, top {args.top_k}: {mean_raw:.0f} raw context tokens")
+    print(f"{'mode':>14} {'tokens':>8} {'saved':>7} {'all cited':>10} {'ms/query':>9}")
+    for mode, stats in results.items():
+        mean = sum(stats["tokens"]) / len(stats["tokens"])
+        report["modes"][mode] = {
+            "tokens": mean,
+            "reduction": 1 - mean / mean_raw,
+            "all_cited_fraction": stats["all_cited"] / len(queries),
+            "ms_per_query": stats["seconds"] / len(queries) * 1e3,
+        }
+        row = report["modes"][mode]
+        print(f"{mode:>14} {mean:>8.0f} {row['reduction']:>7.1%} {row['all_cited_fraction']:>10.0%} "
+              f"{row['ms_per_query']:>9.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Conversation history latency as the conversations table grows.
+
+Grows two copies of the table step by step: one with the original schema
+(no indexes, ORDER BY timestamp DESC) and one migrated with the
+conversation indexes and read through keyset pages. At each size it times
+the last-5 lookup /comprehensive-query does on every request, and a walk
+of --pages pages of 20 through /conversations.
+
+Run from backend/app:
+    python benchmarks/bench_conversation_history.py [--sizes 10000,100000,1000000] [--users 1000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import CONNECTION_PRAGMAS, decode_cursor, encode_cursor  # noqa: E402
+
+# Kept in sync with CONVERSATION_INDEXES in main.py, which can't be imported here
+# without loading the whole API.
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_conversations_user_timestamp ON conversations (user_id, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp)",
+)
+OLD_HISTORY_SQL = '''
+    SELECT query, response, timestamp FROM conversations
+    WHERE user_id = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+'''
+PAGE_SQL = '''
+    SELECT id, query, response, timestamp FROM conversations
+    WHERE user_id = ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+PAGE_AFTER_SQL = '''
+    SELECT id, query, response, timestamp FROM conversations
+    WHERE user_id = ? AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
+
+def open_database(path: str, indexed: bool) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    conn.execute('''
+        CREATE TABLE conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, query TEXT NOT NULL,
+            response TEXT NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if indexed:
+        for create_sql in INDEXES:
+            conn.execute(create_sql)
+    return conn
+
+
+def grow(conn: sqlite3.Connection, start: int, stop: int, users: int, seed: int):
+    """Append rows start..stop with increasing timestamps and random owners"""
+    rng = random.Random(seed + start)
+    base = datetime(2024, 1, 1)
+    response = "r" * 400
+    rows = (
+        (rng.randrange(1, users + 1), f"question {i}", response,
+         (base + timedelta(seconds=i // 3)).strftime("%Y-%m-%d %H:%M:%S"))
+        for i in range(start, stop)
+    )
+    with conn:
+        conn.executemany("INSERT INTO conversations (user_id, query, response, timestamp) VALUES (?, ?, ?, ?)", rows)
+
+
+def time_calls(fn, repeats: int) -> float:
+    """Median milliseconds per call"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e3)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def walk_pages(conn: sqlite3.Connection, user_id: int, pages: int, page_size: int = 20):
+    cursor = None
+    for _ in range(pages):
+        if cursor:
+            timestamp, conversation_id = decode_cursor(cursor)
+            rows = conn.execute(PAGE_AFTER_SQL, (user_id, timestamp, conversation_id, page_size)).fetchall()
+        else:
+            rows = conn.execute(PAGE_SQL, (user_id, page_size)).fetchall()
+        if len(rows) < page_size:
+            return
+        cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    workdir = tempfile.mkdtemp()
+    old = open_database(os.path.join(workdir, "old.db"), indexed=False)
+    new = open_database(os.path.join(workdir, "new.db"), indexed=True)
+    rng = random.Random(args.seed)
+
+    print(f"{'rows':>10} {'old last-5 ms':>14} {'new last-5 ms':>14} {'new page walk ms':>17}")
+    previous = 0
+    for size in sizes:
+        grow(old, previous, size, args.users, args.seed)
+        grow(new, previous, size, args.users, args.seed)
+        previous = size
+        new.execute("ANALYZE")
+
+        user_ids = [rng.randrange(1, args.users + 1) for _ in range(args.repeats)]
+        users = iter(user_ids * 3)
+        old_ms = time_calls(lambda: old.execute(OLD_HISTORY_SQL, (next(users), 5)).fetchall(), args.repeats)
+        new_ms = time_calls(lambda: new.execute(PAGE_SQL, (next(users), 5)).fetchall(), args.repeats)
+        walk_ms = time_calls(lambda: walk_pages(new, next(users), args.pages), args.repeats)
+        print(f"{size:>10} {old_ms:>14.3f} {new_ms:>14.3f} {walk_ms:>17.3f}")
+
+    plan = new.execute("EXPLAIN QUERY PLAN " + PAGE_AFTER_SQL, (1, "2024-01-01 00:00:00", 1, 20)).fetchall()
+    print("Keyset page plan: " + "; ".join(row["detail"] for row in plan))
+    old.close()
+    new.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Tail latency of streamed LLM calls with and without hedging.
+
+Starts benchmarks/fake_llm_server.py with a heavy-tailed time-to-first-token
+and sends --requests streamed chat completions through deadlines.hedged()
+at --concurrency. This is the same path generate_comprehensive_response
+takes. The run is done once with hedging off and once with it on (after
+--warmup calls that teach the policy the latency distribution). For each
+run the script reports p50/p95/p99 latency, how many calls were hedged and
+how many of the hedges won. Run from backend/app:
+    python benchmarks/bench_hedging.py [--requests 400] [--concurrency 16] [--ttft lognormal:600,0.8]
+    python benchmarks/bench_hedging.py --llm-url http://127.0.0.1:9100/v1 --hedge-model gpt-4o-mini
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import AsyncOpenAI  # noqa: E402
+
+from bench_api_load import percentile, start_process, wait_ready  # noqa: E402
+from deadlines import HedgePolicy, hedged  # noqa: E402
+
+
+async def run(args, client: AsyncOpenAI, policy: HedgePolicy, count: int):
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies, errors = [], 0
+
+    async def attempt(model: str) -> str:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": "Generate 5 questions about photosynthesis."}],
+            max_tokens=args.max_tokens,
+            stream=True
+        )
+        parts = []
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+        finally:
+            await stream.close()
+        return "".join(parts)
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await hedged(attempt, args.model, policy)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one() for _ in range(count)))
+    return latencies, errors
+
+
+def summarize(latencies, errors, policy: HedgePolicy) -> dict:
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+        "hedged": policy.hedged,
+        "hedge_wins": policy.hedge_wins,
+    }
+
+
+async def compare(args) -> dict:
+    client = AsyncOpenAI(api_key="bench", base_url=args.llm_url, max_retries=0)
+    baseline = HedgePolicy(False)
+    latencies, errors = await run(args, client, baseline, args.requests)
+    report = {"no_hedging": summarize(latencies, errors, baseline)}
+
+    policy = HedgePolicy(
+        True, percentile=args.hedge_percentile, min_delay=args.hedge_min_delay,
+        hedge_model=args.hedge_model, max_fraction=args.hedge_max_fraction
+    )
+    await run(args, client, policy, args.warmup)
+    policy.calls = policy.hedged = policy.hedge_wins = 0
+    latencies, errors = await run(args, client, policy, args.requests)
+    report["hedging"] = summarize(latencies, errors, policy)
+    report["hedging"]["hedge_delay_ms"] = (policy.delay(args.model) or 0) * 1e3
+    await client.close()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=100, help="calls that seed the hedge policy's latency window")
+    parser.add_argument("--model", default="gpt-4")
+    parser.add_argument("--max-tokens", type=int, default=50)
+    parser.add_argument("--hedge-model", default="", help="model for the duplicate call (default: same model)")
+    parser.add_argument("--hedge-percentile", type=float, default=0.95)
+    parser.add_argument("--hedge-min-delay", type=float, default=0.05)
+    parser.add_argument("--hedge-max-fraction", type=float, default=0.1)
+    parser.add_argument("--llm-url", default="", help="use a running OpenAI-compatible server instead")
+    parser.add_argument("--llm-port", type=int, default=9100)
+    parser.add_argument("--ttft", default="lognormal:600,0.8")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    process = None
+    try:
+        if not args.llm_url:
+            process = start_process([
+                sys.executable, "benchmarks/fake_llm_server.py", "--port", str(args.llm_port),
+                "--ttft", args.ttft, "--tokens-per-second", str(args.tokens_per_second), "--seed", "7"
+            ])
+            args.llm_url = f"http://127.0.0.1:{args.llm_port}/v1"
+            asyncio.run(wait_ready(f"{args.llm_url}/models", 60))
+        report = asyncio.run(compare(args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print(f"{args.requests} calls at concurrency {args.concurrency}, ttft {args.ttft}")
+    print(f"{'mode':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'hedged':>7} {'won':>5} {'errors':>7}")
+    for mode, stats in report.items():
+        print(f"{mode:>12} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} "
+              f"{stats['hedged']:>7} {stats['hedge_wins']:>5} {stats['errors']:>7}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"requests": args.requests, "concurrency": args.concurrency, "ttft": args.ttft,
+                       "modes": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
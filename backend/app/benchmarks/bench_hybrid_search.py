@@ -0,0 +1,171 @@
+"""
+Search latency and exact-term recall of dense-only vs hybrid retrieval.
+
+Builds a seeded synthetic corpus with the prose generator from
+bench_ingestion.py, split with the ingestion settings, and plants a rare
+identifier (a part code such as "QX-4471" or an equation label such as
+"eq. 7.31") in --planted chunks. Chunks are embedded with
+all-mpnet-base-v2 on CPU, upserted into Qdrant (in-memory unless
+--qdrant-url is given) and indexed in a LexicalIndex in a temporary
+directory.
+
+Queries mention a planted identifier plus a few words of its chunk. For
+each query the script times the dense search (Qdrant, threshold 0.25 as
+in production) and the hybrid search (dense + BM25 + RRF), both with the
+query embedding excluded since it is shared, and checks whether the
+planted chunk is in the top --top-k.
+
+--random-vectors replaces the embeddings with seeded random 768-d vectors.
+Qdrant then does the same work per search, so latencies stay comparable,
+but dense recall means nothing and is not reported; hybrid recall then
+measures what the lexical side alone recovers. Use it where the
+embedding model cannot be downloaded. Run from backend/app:
+    python benchmarks/bench_hybrid_search.py [--paragraphs 2000] [--planted 200] [--top-k 10] [--random-vectors]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
+from qdrant_client import QdrantClient  # noqa: E402
+from qdrant_client.http import models as rest  # noqa: E402
+
+from bench_api_load import percentile  # noqa: E402
+from bench_ingestion import sentence  # noqa: E402
+from lexical_index import LexicalIndex, fuse  # noqa: E402
+
+COLLECTION = "bench_hybrid_search"
+DIMENSIONS = 768
+
+
+class RandomVectors:
+    """Stand-in for the embedding model when only search latency is measured"""
+
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+
+    def _vector(self):
+        return [self.rng.gauss(0.0, 1.0) for _ in range(DIMENSIONS)]
+
+    def embed_documents(self, texts):
+        return [self._vector() for _ in texts]
+
+    def embed_query(self, text):
+        return self._vector()
+
+
+def identifier(rng: random.Random) -> str:
+    if rng.random() < 0.5:
+        return f"{rng.choice('QXZKVW')}{rng.choice('QXZKVW')}-{rng.randint(1000, 9999)}"
+    return f"eq. {rng.randint(1, 12)}.{rng.randint(10, 99)}"
+
+
+def build_corpus(args):
+    rng = random.Random(args.seed)
+    text = "\n\n".join(" ".join(sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(args.paragraphs))
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=150, length_function=len, separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    chunks = splitter.split_text(text)
+    queries, used = [], set()
+    for i in rng.sample(range(len(chunks)), min(args.planted, len(chunks))):
+        label = identifier(rng)
+        while label in used:
+            label = identifier(rng)
+        used.add(label)
+        words = chunks[i].split()
+        position = rng.randrange(len(words))
+        chunks[i] = " ".join(words[:position] + [f"({label})"] + words[position:])
+        context = " ".join(rng.sample(words, min(4, len(words))))
+        queries.append((f"What does {label} refer to in {context}?", i))
+    return chunks, queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("--planted", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--lexical-candidates", type=int, default=30)
+    parser.add_argument("--rrf-k", type=int, default=60)
+    parser.add_argument("--qdrant-url", default="")
+    parser.add_argument("--random-vectors", action="store_true", help="latency only: no embedding model")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+
+    chunks, queries = build_corpus(args)
+    metadatas = [{"filename": "synthetic.pdf", "chunk_index": i, "page_number": i // 3} for i in range(len(chunks))]
+    if args.random_vectors:
+        embeddings = RandomVectors(args.seed)
+    else:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2", model_kwargs={"device": "cpu"})
+    vectors = embeddings.embed_documents(chunks)
+
+    client = QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(location=":memory:")
+    client.recreate_collection(COLLECTION, vectors_config=rest.VectorParams(size=len(vectors[0]), distance=rest.Distance.COSINE))
+    for offset in range(0, len(chunks), 256):
+        client.upsert(COLLECTION, points=[
+            rest.PointStruct(id=str(uuid.uuid4()), vector=vectors[i],
+                             payload={"page_content": chunks[i], "metadata": metadatas[i]})
+            for i in range(offset, min(offset + 256, len(chunks)))
+        ], wait=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        lexical_index = LexicalIndex(os.path.join(tmp, "lexical.db"))
+        start = time.perf_counter()
+        lexical_index.index_document("synthetic.pdf", chunks, metadatas)
+        index_seconds = time.perf_counter() - start
+
+        dense_seconds, hybrid_seconds, dense_found, hybrid_found = [], [], 0, 0
+        for question, target in queries:
+            query_vector = embeddings.embed_query(question)
+            start = time.perf_counter()
+            dense = client.search(COLLECTION, query_vector=query_vector, limit=args.top_k,
+                                  score_threshold=None if args.random_vectors else 0.25, with_payload=True)
+            dense_seconds.append(time.perf_counter() - start)
+            dense_found += any(hit.payload["metadata"]["chunk_index"] == target for hit in dense)
+
+            start = time.perf_counter()
+            dense = client.search(COLLECTION, query_vector=query_vector, limit=args.top_k,
+                                  score_threshold=None if args.random_vectors else 0.25, with_payload=True)
+            lexical = lexical_index.search(question, args.lexical_candidates)
+            hybrid = fuse(dense, lexical, args.rrf_k, limit=args.top_k)
+            hybrid_seconds.append(time.perf_counter() - start)
+            hybrid_found += any(hit.payload["metadata"]["chunk_index"] == target for hit in hybrid)
+
+    if not args.qdrant_url:
+        client.delete_collection(COLLECTION)
+    report = {
+        "chunks": len(chunks),
+        "queries": len(queries),
+        "top_k": args.top_k,
+        "random_vectors": args.random_vectors,
+        "lexical_index_seconds": index_seconds,
+        "modes": {},
+    }
+    print(f"{len(chunks)} chunks, {len(queries)} exact-term queries, lexical index built in {index_seconds:.2f}s")
+    print(f"{'mode':>8} {'recall@' + str(args.top_k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for mode, seconds, found in (("dense", dense_seconds, dense_found), ("hybrid", hybrid_seconds, hybrid_found)):
+        row = report["modes"][mode] = {
+            "recall": None if args.random_vectors and mode == "dense" else found / len(queries),
+            "p50_ms": percentile(seconds, 0.50) * 1e3,
+            "p95_ms": percentile(seconds, 0.95) * 1e3,
+        }
+        recall = "n/a" if row["recall"] is None else f"{row['recall']:.1%}"
+        print(f"{mode:>8} {recall:>10} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
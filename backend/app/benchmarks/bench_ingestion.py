@@ -0,0 +1,212 @@
+"""
+Offline ingestion benchmark on synthetic PDFs.
+
+Generates PDFs of --pages pages each (a seeded mix of prose pages and
+table pages, see --table-ratio) and feeds them through the real ingestion
+path, QdrantIndex.insert_into_index_async: extraction, splitting, document
+store write, embedding and upsert. Qdrant is an in-memory QdrantClient
+unless --qdrant-url points at a local server. Each run happens in a fresh
+interpreter so peak RSS is per run.
+
+Reports pages/s and chunks/s end to end, embeddings/s over the embedding
+stage, points/s over the upsert stage and peak RSS. With a local server
+the upsert figure counts points accepted, because uploads use wait=False.
+Every combination of --batch-sizes and --max-workers is measured, and the
+results are written as JSON (--output) for comparison across commits.
+
+Runs on CPU without network access once the embedding model is in the
+local Hugging Face cache. Run from backend/app:
+    python benchmarks/bench_ingestion.py [--pages 10,100,1000] [--batch-sizes 50,100] [--max-workers 4]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    "analysis method result theory model data sample process system function value energy structure "
+    "equation experiment hypothesis variable population market policy history culture language network "
+    "protein cell reaction molecule algorithm memory interface signal frequency pressure temperature "
+    "evidence argument framework principle concept measurement estimate distribution probability error"
+).split()
+
+
+def sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 20))]
+    return " ".join(words).capitalize() + "."
+
+
+def build_pdf(path: str, pages: int, table_ratio: float, seed: int):
+    """Seeded synthetic PDF: prose pages with headings, and table pages of aligned columns"""
+    import fitz
+
+    rng = random.Random(seed)
+    document = fitz.open()
+    for number in range(pages):
+        page = document.new_page()
+        if rng.random() < table_ratio:
+            page.insert_text((72, 72), f"Table {number + 1}. {sentence(rng)}", fontsize=11)
+            columns = rng.randint(3, 6)
+            for row in range(30):
+                y = 100 + row * 20
+                for column in range(columns):
+                    cell = f"{rng.choice(WORDS)} {rng.uniform(0, 1000):.2f}" if row else rng.choice(WORDS).upper()
+                    page.insert_text((72 + column * (460 / columns), y), cell, fontsize=9)
+        else:
+            text = f"Section {number + 1}\n\n" + "\n\n".join(
+                " ".join(sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(rng.randint(4, 7))
+            )
+            page.insert_textbox(fitz.Rect(72, 72, 540, 770), text, fontsize=10)
+    document.save(path)
+    document.close()
+
+
+def run_one(args) -> dict:
+    """Ingest one synthetic PDF in this process and report stage throughput"""
+    import asyncio
+    import resource
+
+    workdir = tempfile.mkdtemp(prefix="bench_ingestion_")
+    # Keep every store the index touches out of the app's data directory
+    os.environ.update({
+        "DOCUMENT_STORE_DIR": os.path.join(workdir, "document_store"),
+        "DOCUMENT_CATALOG_PATH": os.path.join(workdir, "documents.db"),
+        "LEXICAL_INDEX_PATH": os.path.join(workdir, "lexical.db"),
+        "SHARED_STATE_PATH": os.path.join(workdir, "shared_state.db"),
+        "SHARED_STATE_BACKEND": "sqlite",
+        "HF_HUB_OFFLINE": os.environ.get("HF_HUB_OFFLINE", "1"),
+        "TRANSFORMERS_OFFLINE": os.environ.get("TRANSFORMERS_OFFLINE", "1"),
+    })
+    for name in ("QDRANT_HOST", "QDRANT_API_KEY", "OPENAI_API_KEY"):
+        os.environ.setdefault(name, "offline-benchmark")
+    sys.path.insert(0, APP_DIR)
+
+    from qdrant_client import QdrantClient
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    from resources import resources
+    from metrics import stage_seconds
+    from qdrant_engine import qdrant_index
+
+    resources.register("qdrant_client", lambda: QdrantClient(url=args.qdrant_url) if args.qdrant_url else QdrantClient(":memory:"))
+    resources.register("embedding_model", lambda: HuggingFaceEmbeddings(
+        model_name=args.embedding_model, model_kwargs={"device": "cpu"}
+    ))
+    qdrant_index.collection_name = f"bench_ingestion_{os.getpid()}"
+    qdrant_index.embedding_size = len(qdrant_index.embedding_model.embed_query("warm up"))
+
+    path = os.path.join(workdir, f"synthetic_{args.pages}p.pdf")
+    build_pdf(path, args.pages, args.table_ratio, args.seed)
+
+    start = time.perf_counter()
+    asyncio.run(qdrant_index.insert_into_index_async(
+        path, os.path.basename(path), batch_size=args.batch_size, max_workers=args.max_workers, page_count=args.pages
+    ))
+    elapsed = time.perf_counter() - start
+
+    stages = {}
+    for stage in ("extraction", "splitting", "cache_write", "embedding", "upsert"):
+        _, seconds = stage_seconds.total(pipeline="ingestion", stage=stage)
+        stages[stage] = seconds
+    chunks = qdrant_index.document_store.get(os.path.basename(path)).chunk_count
+    points = qdrant_index.qdrant_client.count(qdrant_index.collection_name).count
+    if args.qdrant_url:
+        qdrant_index.qdrant_client.delete_collection(qdrant_index.collection_name)
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        "pages": args.pages,
+        "batch_size": args.batch_size,
+        "max_workers": args.max_workers,
+        "chunks": chunks,
+        "points": points,
+        "seconds": elapsed,
+        "stage_seconds": stages,
+        "pages_per_second": args.pages / elapsed,
+        "chunks_per_second": chunks / elapsed,
+        "embeddings_per_second": chunks / stages["embedding"] if stages["embedding"] else None,
+        "upsert_points_per_second": points / stages["upsert"] if stages["upsert"] else None,
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        "peak_rss_mb": rss / (1024 * 1024 if sys.platform == "darwin" else 1024),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=APP_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", default="10,100,1000")
+    parser.add_argument("--batch-sizes", default="100")
+    parser.add_argument("--max-workers", default="4")
+    parser.add_argument("--table-ratio", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--embedding-model", default="sentence-transformers/all-mpnet-base-v2")
+    parser.add_argument("--qdrant-url", default="", help="local Qdrant server; in-memory client when empty")
+    parser.add_argument("--output", default="", help="JSON results path (default benchmarks/results/ingestion-<commit>.json)")
+    parser.add_argument("--run-one", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--batch-size", type=int, default=100, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        args.pages = int(args.pages)
+        args.max_workers = int(args.max_workers)
+        print(json.dumps(run_one(args)))
+        return
+
+    results = []
+    print(f"{'pages':>6} {'batch':>6} {'workers':>8} {'chunks':>7} {'pages/s':>8} {'chunks/s':>9} "
+          f"{'embed/s':>8} {'upsert/s':>9} {'rss MB':>7}")
+    for pages in (int(p) for p in args.pages.split(",")):
+        for batch_size in (int(b) for b in args.batch_sizes.split(",")):
+            for max_workers in (int(w) for w in args.max_workers.split(",")):
+                command = [
+                    sys.executable, os.path.abspath(__file__), "--run-one",
+                    "--pages", str(pages), "--batch-size", str(batch_size), "--max-workers", str(max_workers),
+                    "--table-ratio", str(args.table_ratio), "--seed", str(args.seed),
+                    "--embedding-model", args.embedding_model, "--qdrant-url", args.qdrant_url,
+                ]
+                completed = subprocess.run(command, cwd=APP_DIR, capture_output=True, text=True)
+                if completed.returncode != 0:
+                    sys.stderr.write(completed.stderr)
+                    sys.exit(f"Run failed: {pages} pages, batch {batch_size}, {max_workers} workers")
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print(f"{pages:>6} {batch_size:>6} {max_workers:>8} {result['chunks']:>7} "
+                      f"{result['pages_per_second']:>8.1f} {result['chunks_per_second']:>9.1f} "
+                      f"{result['embeddings_per_second'] or 0:>8.1f} {result['upsert_points_per_second'] or 0:>9.1f} "
+                      f"{result['peak_rss_mb']:>7.0f}")
+
+    commit = git_commit()
+    output = args.output or os.path.join(APP_DIR, "benchmarks", "results", f"ingestion-{commit}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "benchmark": "ingestion",
+            "commit": commit,
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "embedding_model": args.embedding_model,
+            "qdrant": args.qdrant_url or ":memory:",
+            "table_ratio": args.table_ratio,
+            "seed": args.seed,
+            "results": results,
+        }, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Intent router micro-benchmark and accuracy check.
+
+Run from backend/app:
+    python benchmarks/bench_intent_router.py [--iterations 20000] [--min-accuracy 0.95]
+
+Exits non-zero when accuracy on the labelled query set drops below --min-accuracy,
+so it can be used as a CI gate.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_router import IntentRouter, classify_intent  # noqa: E402
+
+# (query, expected fields) -- only the listed fields are checked
+LABELLED_QUERIES = [
+    ("Generate 10 questions from the PDF", dict(is_generic=True, is_question_generation=True, requested_question_count=10)),
+    ("Generate five multiple choice questions about this pdf", dict(is_generic=True, is_question_generation=True, requested_question_count=5)),
+    ("Show me the questions you generated earlier", dict(is_question_generation=True, requested_question_count=None)),
+    ("Which questions should I generate for the quiz?", dict(is_question_generation=True)),
+    # Question generation needs "generate" and "question" as in the original check
+    ("create five multiple choice questions about this pdf", dict(is_generic=True, is_question_generation=False, requested_question_count=None)),
+    ("Make questions out of the pdf", dict(is_generic=True, is_question_generation=False)),
+    ("Generating questions from chapter 3", dict(is_question_generation=False)),
+    ("generate 3 short answer questions on photosynthesis", dict(is_question_generation=True, requested_question_count=3)),
+    ("Can you generate some exam questions for chapter 2?", dict(is_question_generation=True, requested_question_count=None)),
+    ("List questions from the PDF", dict(is_generic=True)),
+    ("Summarize this PDF", dict(is_generic=True, is_question_generation=False)),
+    ("Give me an overview of the document", dict(is_generic=True)),
+    ("What are the main topics covered?", dict(is_generic=True, question_type="definition")),
+    ("What is this pdf about?", dict(is_generic=True, question_type="definition")),
+    ("What are the key findings of the study?", dict(is_generic=True)),
+    ("What methodology was used in the research?", dict(is_generic=True)),
+    ("Analyze the content of the document", dict(is_generic=True)),
+    ("List all chapters", dict(is_generic=True)),
+    ("What is the research aim?", dict(is_generic=True)),
+    ("What is photosynthesis?", dict(is_generic=False, question_type="definition", main_topic="photosynthesis?")),
+    ("Define entropy", dict(is_generic=False, question_type="definition", main_topic="define entropy")),
+    ("How do vaccines train the immune system?", dict(is_generic=False, question_type="procedure")),
+    ("How to compute the eigenvalues of a matrix", dict(is_generic=False, question_type="procedure")),
+    ("Why is the sky blue?", dict(is_generic=False, question_type="explanation")),
+    ("When was the treaty signed?", dict(is_generic=False, question_type="temporal")),
+    ("Where is the mitochondria located?", dict(is_generic=False, question_type="location")),
+    ("Explain equation 4.2", dict(is_generic=False, question_type="general", is_comparison=False)),
+    ("Compare supervised learning with unsupervised learning", dict(is_comparison=True, is_question_generation=False)),
+    ("What is the difference between TCP and UDP?", dict(is_comparison=True, question_type="definition")),
+    ("How does inflation relate to unemployment?", dict(is_comparison=True)),
+    ("Describe the connection between diet and heart disease", dict(is_comparison=True)),
+    ("What is the impact of climate change on agriculture?", dict(is_comparison=True)),
+    ("Who proposed the theory of relativity?", dict(is_generic=False, question_type="general", is_comparison=False)),
+    ("Section 3.1 lemma proof", dict(is_generic=False, is_question_generation=False, is_comparison=False)),
+]
+
+
+def check_accuracy(router: IntentRouter):
+    """Return (accuracy, failures) over the labelled query set"""
+    failures = []
+    for query, expected in LABELLED_QUERIES:
+        intent = router.classify(query)
+        for field, value in expected.items():
+            actual = getattr(intent, field)
+            if actual != value:
+                failures.append((query, field, value, actual))
+    total_checks = sum(len(expected) for _, expected in LABELLED_QUERIES)
+    return 1 - len(failures) / total_checks, failures
+
+
+def bench_latency(router: IntentRouter, iterations: int):
+    """Measure per-query classification latency in microseconds"""
+    queries = [query for query, _ in LABELLED_QUERIES]
+    samples = []
+    for i in range(iterations):
+        query = queries[i % len(queries)]
+        start = time.perf_counter()
+        router.classify(query)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return {
+        "mean_us": statistics.fmean(samples),
+        "p50_us": samples[len(samples) // 2],
+        "p99_us": samples[int(len(samples) * 0.99)],
+    }
+
+
+def bench_cached(iterations: int) -> float:
+    """Mean latency of the memoized classify_intent entry point in microseconds"""
+    queries = [query for query, _ in LABELLED_QUERIES]
+    start = time.perf_counter()
+    for i in range(iterations):
+        classify_intent(queries[i % len(queries)])
+    return (time.perf_counter() - start) * 1e6 / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--min-accuracy", type=float, default=0.95)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    router = IntentRouter()
+    compile_ms = (time.perf_counter() - start) * 1e3
+
+    accuracy, failures = check_accuracy(router)
+    latency = bench_latency(router, args.iterations)
+    cached_us = bench_cached(args.iterations)
+
+    print(f"Rule compilation: {compile_ms:.2f} ms")
+    print(f"Uncached classify: mean {latency['mean_us']:.1f} us, p50 {latency['p50_us']:.1f} us, p99 {latency['p99_us']:.1f} us")
+    print(f"Cached classify_intent: mean {cached_us:.2f} us")
+    print(f"Accuracy on {len(LABELLED_QUERIES)} labelled queries: {accuracy:.1%}")
+    for query, field, expected, actual in failures:
+        print(f"  MISMATCH {query!r}: {field} expected {expected!r}, got {actual!r}")
+
+    if accuracy < args.min_accuracy:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
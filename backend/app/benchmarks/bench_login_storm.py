@@ -0,0 +1,99 @@
+"""
+Login storm benchmark against a running API.
+
+Registers --users accounts, measures baseline latency of a cheap endpoint,
+then fires all logins at once while probing that endpoint again. Reports
+login p50/p99, 429 rejections and how much the probe endpoint slowed down.
+
+Start the API first (python main.py), then run from backend/app:
+    python benchmarks/bench_login_storm.py --base-url http://localhost:8000 --users 200
+"""
+import argparse
+import asyncio
+import secrets
+import time
+
+import httpx
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return float("nan")
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def probe(client: httpx.AsyncClient, path: str, stop: asyncio.Event, interval: float):
+    """Hit a cheap endpoint repeatedly, returning request latencies in ms"""
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get(path)
+        latencies.append((time.perf_counter() - start) * 1e3)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+async def run(args):
+    run_id = secrets.token_hex(4)
+    credentials = [(f"storm_{run_id}_{i}", secrets.token_urlsafe(12)) for i in range(args.users)]
+
+    limits = httpx.Limits(max_connections=args.users + 10)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=120, limits=limits) as client:
+        # Registration is itself bcrypt-bound; keep it modestly concurrent and retry on 429
+        semaphore = asyncio.Semaphore(8)
+
+        async def register(username, password):
+            async with semaphore:
+                while True:
+                    response = await client.post("/auth/register", json={
+                        "username": username, "email": f"{username}@example.com", "password": password
+                    })
+                    if response.status_code != 429:
+                        return response
+                    await asyncio.sleep(float(response.headers.get("Retry-After", "1")))
+
+        await asyncio.gather(*(register(u, p) for u, p in credentials))
+
+        # Baseline latency of the probe endpoint with no login load
+        stop = asyncio.Event()
+        baseline_task = asyncio.create_task(probe(client, args.probe_path, stop, args.probe_interval))
+        await asyncio.sleep(args.baseline_seconds)
+        stop.set()
+        baseline = await baseline_task
+
+        # Storm: every user logs in at once while the probe keeps running
+        stop = asyncio.Event()
+        storm_probe_task = asyncio.create_task(probe(client, args.probe_path, stop, args.probe_interval))
+        login_latencies, statuses = [], {}
+
+        async def login(username, password):
+            start = time.perf_counter()
+            response = await client.post("/auth/login", json={"username": username, "password": password})
+            login_latencies.append((time.perf_counter() - start) * 1e3)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        storm_start = time.perf_counter()
+        await asyncio.gather(*(login(u, p) for u, p in credentials))
+        storm_seconds = time.perf_counter() - storm_start
+        stop.set()
+        during_storm = await storm_probe_task
+
+    print(f"Logins: {args.users} in {storm_seconds:.2f}s, status counts {statuses}")
+    print(f"Login latency: p50 {percentile(login_latencies, 0.5):.0f} ms, p99 {percentile(login_latencies, 0.99):.0f} ms")
+    print(f"{args.probe_path} idle:  p50 {percentile(baseline, 0.5):.1f} ms, p99 {percentile(baseline, 0.99):.1f} ms")
+    print(f"{args.probe_path} storm: p50 {percentile(during_storm, 0.5):.1f} ms, p99 {percentile(during_storm, 0.99):.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--probe-path", default="/health")
+    parser.add_argument("--probe-interval", type=float, default=0.01)
+    parser.add_argument("--baseline-seconds", type=float, default=3.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""
+Authenticated-request database throughput: per-call connections vs the pooled Database layer.
+
+Simulates concurrent authenticated requests, each doing the session lookup that
+every protected route performs, with a fraction also writing a conversation row.
+
+Run from backend/app:
+    python benchmarks/bench_sqlite_auth.py [--requests 5000] [--concurrency 64] [--write-ratio 0.2]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import Database  # noqa: E402
+
+SESSION_SQL = '''
+    SELECT u.*, s.expires_at
+    FROM users u
+    JOIN user_sessions s ON u.id = s.user_id
+    WHERE s.session_token = ? AND s.expires_at > ? AND u.is_active = TRUE
+'''
+INSERT_CONVERSATION_SQL = "INSERT INTO conversations (user_id, query, response) VALUES (?, ?, ?)"
+
+
+def create_fixture(path: str, users: int):
+    """Create the API schema with one active session per user"""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT UNIQUE NOT NULL, email TEXT UNIQUE NOT NULL,
+            full_name TEXT, hashed_password TEXT NOT NULL, is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE user_sessions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, session_token TEXT NOT NULL UNIQUE,
+            expires_at TIMESTAMP NOT NULL, current_file TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE conversations (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, query TEXT NOT NULL,
+            response TEXT NOT NULL, timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+    ''')
+    expires_at = datetime.utcnow() + timedelta(days=1)
+    tokens = []
+    for i in range(users):
+        conn.execute("INSERT INTO users (username, email, hashed_password) VALUES (?, ?, ?)",
+                     (f"user{i}", f"user{i}@example.com", "x"))
+        token = hashlib.sha256(f"token{i}".encode()).hexdigest()
+        conn.execute("INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (?, ?, ?)",
+                     (i + 1, token, expires_at))
+        tokens.append(token)
+    conn.commit()
+    conn.close()
+    return tokens
+
+
+def baseline_lookup(path: str, token: str):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        row = conn.execute(SESSION_SQL, (token, datetime.utcnow())).fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+def baseline_write(path: str, user_id: int):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(INSERT_CONVERSATION_SQL, (user_id, "q", "r" * 2000))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+async def run_load(handler, tokens, requests: int, concurrency: int):
+    """Drive `requests` calls through `concurrency` workers; report throughput and loop lag"""
+    counter = iter(range(requests))
+    latencies, errors, max_lag = [], 0, 0.0
+    stop = asyncio.Event()
+
+    async def lag_probe():
+        nonlocal max_lag
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.005)
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                await handler(i, random.choice(tokens))
+            except sqlite3.OperationalError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    probe = asyncio.create_task(lag_probe())
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe
+
+    latencies.sort()
+    return {
+        "throughput_rps": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+        "errors": errors,
+        "max_loop_lag_ms": max_lag * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--pool-size", type=int, default=4)
+    args = parser.parse_args()
+
+    write_every = max(1, int(1 / args.write_ratio)) if args.write_ratio > 0 else 0
+
+    # Before: a fresh connection per call, executed directly on the event loop
+    before_path = os.path.join(tempfile.mkdtemp(), "before.db")
+    tokens = create_fixture(before_path, args.users)
+
+    async def before_handler(i, token):
+        user = baseline_lookup(before_path, token)
+        if write_every and i % write_every == 0:
+            baseline_write(before_path, user["id"])
+
+    before = asyncio.run(run_load(before_handler, tokens, args.requests, args.concurrency))
+
+    # After: pooled WAL connections, awaited off the event loop
+    after_path = os.path.join(tempfile.mkdtemp(), "after.db")
+    tokens = create_fixture(after_path, args.users)
+    database = Database(after_path, pool_size=args.pool_size)
+
+    async def after_handler(i, token):
+        user = await database.fetchone(SESSION_SQL, (token, datetime.utcnow()))
+        if write_every and i % write_every == 0:
+            await database.execute(INSERT_CONVERSATION_SQL, (user["id"], "q", "r" * 2000))
+
+    after = asyncio.run(run_load(after_handler, tokens, args.requests, args.concurrency))
+    database.close()
+
+    print(f"{'':>16} {'req/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'max loop lag ms':>16}")
+    for name, result in (("per-call connect", before), ("pooled", after)):
+        print(f"{name:>16} {result['throughput_rps']:>10.0f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+              f"{result['errors']:>7} {result['max_loop_lag_ms']:>16.2f}")
+
+
+if __name__ == "__main__":
+    main()
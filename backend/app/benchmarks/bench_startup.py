@@ -0,0 +1,80 @@
+"""
+Import-time and startup benchmark.
+
+Measures, each in a fresh interpreter:
+  * import time of qdrant_engine and main (should not load models or connect)
+  * which heavy resources are loaded right after import (should be none)
+  * time for resources.warm_up(), per resource
+
+Exits non-zero when an import exceeds --max-import-seconds or loads a
+resource eagerly, so it can gate CI. Needs the API's environment (.env).
+Run from backend/app:
+    python benchmarks/bench_startup.py [--repeats 3] [--max-import-seconds 5] [--skip-warm-up]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_PROBE = '''
+import json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+from resources import resources
+loaded = [name for name, entry in resources.status().items() if entry["loaded"]]
+print(json.dumps({{"seconds": elapsed, "loaded": loaded}}))
+'''
+
+WARM_UP_PROBE = '''
+import json, time
+from resources import resources
+start = time.perf_counter()
+per_resource = resources.warm_up()
+print(json.dumps({"seconds": time.perf_counter() - start, "per_resource": per_resource,
+                  "errors": {n: e["error"] for n, e in resources.status().items() if e["error"]}}))
+'''
+
+
+def run_probe(source: str) -> dict:
+    result = subprocess.run([sys.executable, "-c", source], cwd=APP_DIR, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "probe failed")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", default="resources,qdrant_engine,main")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-import-seconds", type=float, default=5.0)
+    parser.add_argument("--skip-warm-up", action="store_true")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'module':>14} {'best s':>8} {'worst s':>8}  eagerly loaded")
+    for module in args.modules.split(","):
+        runs = [run_probe(IMPORT_PROBE.format(module=module)) for _ in range(args.repeats)]
+        seconds = [run["seconds"] for run in runs]
+        loaded = runs[-1]["loaded"]
+        print(f"{module:>14} {min(seconds):>8.2f} {max(seconds):>8.2f}  {', '.join(loaded) or '-'}")
+        if min(seconds) > args.max_import_seconds or loaded:
+            failed = True
+
+    if not args.skip_warm_up:
+        warm_up = run_probe(WARM_UP_PROBE)
+        print(f"warm_up: {warm_up['seconds']:.2f}s")
+        for name, seconds in sorted(warm_up["per_resource"].items(), key=lambda item: -item[1]):
+            print(f"  {name:>18} {seconds:>8.2f}s")
+        for name, error in warm_up["errors"].items():
+            print(f"  {name:>18} failed: {error}")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
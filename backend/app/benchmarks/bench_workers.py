@@ -0,0 +1,141 @@
+"""
+Throughput of the API as the number of uvicorn workers grows, plus a
+cross-worker consistency check.
+
+For each worker count the script starts `uvicorn main:app --workers N`,
+logs in one user and drives --requests authenticated requests at --path
+with --concurrency clients. It then logs out and replays the old cookie
+on fresh connections, so the requests land on every worker; all of them
+must be rejected once the shared session epoch has propagated.
+
+Needs the API's environment (.env, Qdrant, models). Run from backend/app:
+    python benchmarks/bench_workers.py --workers 1,2,4 [--path /auth/profile] [--requests 5000]
+Pass --env SHARED_STATE_BACKEND=redis to exercise the networked backend
+against a local Redis.
+"""
+import argparse
+import asyncio
+import os
+import secrets
+import subprocess
+import sys
+import time
+
+import httpx
+
+
+def start_server(workers: int, port: int, extra_env: dict) -> subprocess.Popen:
+    env = {**os.environ, **extra_env, "API_WORKERS": str(workers)}
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        env=env
+    )
+
+
+async def wait_ready(base_url: str, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise RuntimeError(f"Server at {base_url} did not become healthy within {timeout}s")
+
+
+async def login(client: httpx.AsyncClient) -> httpx.Cookies:
+    username, password = f"bench_{secrets.token_hex(4)}", secrets.token_urlsafe(12)
+    await client.post("/auth/register", json={
+        "username": username, "email": f"{username}@example.com", "password": password,
+        "full_name": "Bench User"
+    })
+    response = await client.post("/auth/login", json={"username": username, "password": password})
+    response.raise_for_status()
+    return response.cookies
+
+
+async def drive(base_url: str, path: str, cookies, requests: int, concurrency: int):
+    latencies, failures = [], 0
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies, limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal failures
+            for _ in counter:
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append(time.perf_counter() - start)
+                failures += response.status_code != 200
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2] * 1e3,
+        "p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3,
+        "failures": failures,
+    }
+
+
+async def stale_session_hits(base_url: str, cookies, probes: int, settle: float) -> int:
+    """Log out, wait for the epoch to propagate, then count workers that still accept the cookie"""
+    async with httpx.AsyncClient(base_url=base_url, cookies=cookies) as client:
+        await client.post("/auth/logout")
+    await asyncio.sleep(settle)
+    accepted = 0
+    for _ in range(probes):
+        # A new client per probe means a new connection, spread across workers
+        async with httpx.AsyncClient(base_url=base_url, cookies=cookies) as client:
+            accepted += (await client.get("/auth/profile")).status_code == 200
+    return accepted
+
+
+async def run_one(args, workers: int, extra_env: dict):
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = start_server(workers, args.port, extra_env)
+    try:
+        await wait_ready(base_url, args.startup_timeout)
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            cookies = await login(client)
+        # Warm every worker's caches before measuring
+        await drive(base_url, args.path, cookies, min(args.requests, 500), args.concurrency)
+        result = await drive(base_url, args.path, cookies, args.requests, args.concurrency)
+        result["stale_sessions"] = await stale_session_hits(base_url, cookies, args.probes, args.settle)
+        return result
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--path", default="/auth/profile")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--probes", type=int, default=32)
+    parser.add_argument("--settle", type=float, default=1.5, help="seconds to wait after logout (> SESSION_SYNC_INTERVAL_SECONDS)")
+    parser.add_argument("--startup-timeout", type=float, default=180.0)
+    parser.add_argument("--env", action="append", default=[], help="extra KEY=VALUE for the server")
+    args = parser.parse_args()
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    results = {}
+    for workers in (int(w) for w in args.workers.split(",")):
+        results[workers] = asyncio.run(run_one(args, workers, extra_env))
+
+    baseline = results[min(results)]["rps"]
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'failures':>9} {'stale sessions':>15}")
+    for workers, result in results.items():
+        print(f"{workers:>8} {result['rps']:>10.0f} {result['rps'] / baseline:>7.2f}x {result['p50_ms']:>8.2f} "
+              f"{result['p99_ms']:>8.2f} {result['failures']:>9} {result['stale_sessions']:>15}")
+
+
+if __name__ == "__main__":
+    main()
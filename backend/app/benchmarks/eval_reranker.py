@@ -0,0 +1,150 @@
+"""
+Offline evaluation of two-stage retrieval (dense candidates + cross-encoder).
+
+It compares what production used to send to the LLM, the top --dense-k
+dense hits above 0.25 cosine, with --candidates dense hits reranked down
+to --rerank-k. For each setup it reports the share of questions whose
+answer-bearing chunk reaches the prompt (answer recall), MRR, mean prompt
+tokens of the kept chunks and reranking latency.
+
+Questions come from --questions, a JSONL file of {"question", "answer"}
+where the answer is a span copied from --pdf. Without them the script
+builds a seeded synthetic corpus and asks known-item questions: a target
+sentence with words dropped and shuffled. That is only a smoke test of
+the machinery; use real questions to judge quality. Chunks are split with
+the ingestion settings and embedded with all-mpnet-base-v2 on CPU, with
+no Qdrant needed. Run from backend/app:
+    python benchmarks/eval_reranker.py [--questions qa.jsonl --pdf doc.pdf] [--candidates 30] [--rerank-k 4]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from langchain.text_splitter import RecursiveCharacterTextSplitter  # noqa: E402
+from langchain_community.embeddings import HuggingFaceEmbeddings  # noqa: E402
+from sentence_transformers import CrossEncoder  # noqa: E402
+
+from bench_api_load import percentile  # noqa: E402
+from bench_ingestion import sentence  # noqa: E402
+from conversation_memory import count_tokens  # noqa: E402
+from reranker import Reranker  # noqa: E402
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+def split(text: str):
+    splitter = RecursiveCharacterTextSplitter(
+        chunk_size=1000, chunk_overlap=150, length_function=len, separators=["\n\n", "\n", ". ", " ", ""]
+    )
+    return splitter.split_text(text)
+
+
+def load_dataset(args):
+    if args.questions:
+        from langchain_community.document_loaders import PDFMinerLoader
+        text = "\n\n".join(doc.page_content for doc in PDFMinerLoader(args.pdf).load())
+        with open(args.questions) as f:
+            qa = [json.loads(line) for line in f if line.strip()]
+        return split(text), [(item["question"], normalize(item["answer"])) for item in qa]
+
+    rng = random.Random(args.seed)
+    text = "\n\n".join(" ".join(sentence(rng) for _ in range(rng.randint(3, 6))) for _ in range(args.paragraphs))
+    chunks = split(text)
+    questions = []
+    for _ in range(args.synthetic_questions):
+        target = rng.choice([s for s in re.split(r"(?<=\.)\s+", rng.choice(chunks)) if len(s.split()) >= 8])
+        words = target.rstrip(".").split()
+        kept = rng.sample(words, max(4, int(len(words) * 0.6)))
+        questions.append((" ".join(kept) + "?", normalize(target)))
+    return chunks, questions
+
+
+def evaluate(name, kept_lists, relevant_lists, chunks, seconds=None):
+    recall, reciprocal_ranks, tokens = 0, [], []
+    for kept, relevant in zip(kept_lists, relevant_lists):
+        ranks = [rank for rank, i in enumerate(kept, 1) if i in relevant]
+        recall += bool(ranks)
+        reciprocal_ranks.append(1 / ranks[0] if ranks else 0.0)
+        tokens.append(sum(count_tokens(chunks[i]) for i in kept))
+    report = {
+        "answer_recall": recall / len(kept_lists),
+        "mrr": sum(reciprocal_ranks) / len(reciprocal_ranks),
+        "prompt_tokens": sum(tokens) / len(tokens),
+    }
+    if seconds:
+        report["rerank_p50_ms"] = percentile(seconds, 0.50) * 1e3
+        report["rerank_p95_ms"] = percentile(seconds, 0.95) * 1e3
+    print(f"{name:>18} {report['answer_recall']:>8.1%} {report['mrr']:>6.3f} {report['prompt_tokens']:>9.0f} "
+          f"{report.get('rerank_p50_ms', 0):>8.1f} {report.get('rerank_p95_ms', 0):>8.1f}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default="")
+    parser.add_argument("--questions", default="", help="JSONL of {question, answer} about --pdf")
+    parser.add_argument("--paragraphs", type=int, default=300)
+    parser.add_argument("--synthetic-questions", type=int, default=200)
+    parser.add_argument("--dense-k", type=int, default=10)
+    parser.add_argument("--candidates", type=int, default=30)
+    parser.add_argument("--rerank-k", type=int, default=4)
+    parser.add_argument("--rerank-model", default="cross-encoder/ms-marco-MiniLM-L-6-v2")
+    parser.add_argument("--budget-ms", type=float, default=300.0)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=5)
+    parser.add_argument("--output", default="")
+    args = parser.parse_args()
+    if bool(args.pdf) != bool(args.questions):
+        parser.error("--pdf and --questions go together")
+
+    chunks, questions = load_dataset(args)
+    embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2", model_kwargs={"device": "cpu"})
+    chunk_vectors = np.array(embeddings.embed_documents(chunks))
+    chunk_vectors /= np.linalg.norm(chunk_vectors, axis=1, keepdims=True)
+    normalized_chunks = [normalize(chunk) for chunk in chunks]
+
+    model = CrossEncoder(args.rerank_model, device="cpu")
+    reranker = Reranker(lambda: model, top_k=args.rerank_k, batch_size=args.batch_size,
+                        budget_seconds=args.budget_ms / 1000)
+    reranker.rerank("warm up", chunks[:args.batch_size], str)
+
+    relevant, dense_kept, reranked_kept, rerank_seconds = [], [], [], []
+    for question, answer in questions:
+        relevant.append({i for i, chunk in enumerate(normalized_chunks) if answer in chunk})
+        query_vector = np.array(embeddings.embed_query(question))
+        scores = chunk_vectors @ (query_vector / np.linalg.norm(query_vector))
+        ranked = [int(i) for i in np.argsort(-scores) if scores[i] >= 0.25]
+        dense_kept.append(ranked[:args.dense_k])
+        start = time.perf_counter()
+        reranked = reranker.rerank(question, ranked[:args.candidates], lambda i: chunks[i])
+        rerank_seconds.append(time.perf_counter() - start)
+        reranked_kept.append([i for i, _ in reranked])
+
+    answerable = sum(bool(r) for r in relevant)
+    print(f"{len(chunks)} chunks, {len(questions)} questions ({answerable} with the answer in a chunk)")
+    print(f"{'setup':>18} {'recall':>8} {'mrr':>6} {'tokens':>9} {'p50 ms':>8} {'p95 ms':>8}")
+    report = {
+        "chunks": len(chunks),
+        "questions": len(questions),
+        f"dense_top{args.dense_k}": evaluate(f"dense top {args.dense_k}", dense_kept, relevant, chunks),
+        f"rerank_{args.candidates}_to_{args.rerank_k}": evaluate(
+            f"rerank {args.candidates}->{args.rerank_k}", reranked_kept, relevant, chunks, rerank_seconds
+        ),
+        "budget_exhausted": reranker.budget_exhausted,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
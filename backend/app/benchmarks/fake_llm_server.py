@@ -0,0 +1,155 @@
+"""
+Local OpenAI-compatible stand-in for load tests.
+
+Serves POST /v1/chat/completions (plain and streamed as server-sent events)
+and GET /v1/models. Each request waits for a sampled time-to-first-token,
+then emits tokens at --tokens-per-second. --error-rate makes some requests
+fail with 500 or 429 so retry paths get exercised.
+
+Latency distributions take the form kind:params, in milliseconds:
+    fixed:800              always 800 ms
+    uniform:200,1500       uniform between 200 and 1500 ms
+    lognormal:600,0.5      median 600 ms, sigma 0.5 (long right tail)
+
+Point the API at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1 (any
+OPENAI_API_KEY is accepted). Run from backend/app:
+    python benchmarks/fake_llm_server.py [--port 9100] [--ttft lognormal:600,0.5] [--tokens-per-second 40]
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import secrets
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+WORDS = (
+    "the model answers questions about the document with clear structure examples and references "
+    "drawn from each section including definitions analysis and applications of key concepts"
+).split()
+
+
+def parse_distribution(spec: str):
+    """Sampler in seconds for a fixed:/uniform:/lognormal: spec given in milliseconds"""
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0] / 1000
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1]) / 1000
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda: random.lognormvariate(math.log(median), sigma) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="Fake LLM server")
+    sample_ttft = parse_distribution(args.ttft)
+    stats = {"requests": 0, "streamed": 0, "errors": 0, "tokens": 0}
+
+    def completion_tokens(body: dict) -> int:
+        requested = body.get("max_tokens") or args.output_tokens
+        return max(1, min(requested, args.output_tokens))
+
+    def token(i: int) -> str:
+        return WORDS[i % len(WORDS)] + " "
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": name, "object": "model"} for name in ("gpt-4", "gpt-4o", "gpt-4o-mini")]}
+
+    @app.get("/stats")
+    async def server_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if random.random() < args.error_rate:
+            stats["errors"] += 1
+            status = random.choice((429, 500))
+            return JSONResponse({"error": {"message": "injected failure", "type": "fake_error"}}, status_code=status)
+
+        completion_id = f"chatcmpl-{secrets.token_hex(8)}"
+        model = body.get("model", "gpt-4o")
+        n_tokens = completion_tokens(body)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+        interval = 1.0 / args.tokens_per_second
+        stats["tokens"] += n_tokens
+        await asyncio.sleep(sample_ttft())
+
+        if not body.get("stream"):
+            await asyncio.sleep(interval * (n_tokens - 1))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(token(i) for i in range(n_tokens)).strip()},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens,
+                          "total_tokens": prompt_tokens + n_tokens},
+            }
+
+        stats["streamed"] += 1
+
+        async def events():
+            def chunk(delta: dict, finish_reason=None) -> str:
+                return "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }) + "\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for i in range(n_tokens):
+                if i:
+                    await asyncio.sleep(interval)
+                yield chunk({"content": token(i)})
+            yield chunk({}, finish_reason="stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens,
+                              "total_tokens": prompt_tokens + n_tokens},
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--ttft", default="lognormal:600,0.5", help="time-to-first-token distribution (ms)")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--output-tokens", type=int, default=300, help="upper bound on tokens per completion")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+    if args.seed is not None:
+        random.seed(args.seed)
+    parse_distribution(args.ttft)  # fail fast on a bad spec
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,148 @@ class Settings(BaseSettings):
     qdrant_host: str = Field(..., env="QDRANT_HOST")
     qdrant_api_key: str = Field(..., env="QDRANT_API_KEY")
     openai_api_key: str = Field(..., env="OPENAI_API_KEY")
+    # OpenAI-compatible endpoint for every LLM call (e.g. the local fake server used
+    # for load tests, http://localhost:9100/v1); empty uses the OpenAI API
+    openai_base_url: str = Field("", env="OPENAI_BASE_URL")
+
+    # Document text store (full text kept once on disk, hot documents cached in memory)
+    document_store_dir: str = Field("app/document_store", env="DOCUMENT_STORE_DIR")
+    document_store_memory_mb: int = Field(256, env="DOCUMENT_STORE_MEMORY_MB")
+    document_catalog_path: str = Field("app/database/documents.db", env="DOCUMENT_CATALOG_PATH")
+
+    # SQLite connection pool for the API database
+    db_pool_size: int = Field(4, env="DB_POOL_SIZE")
+
+    # In-memory cache of authenticated sessions
+    session_cache_max_entries: int = Field(10000, env="SESSION_CACHE_MAX_ENTRIES")
+    session_cache_ttl_seconds: float = Field(300.0, env="SESSION_CACHE_TTL_SECONDS")
+
+    # Password hashing (bcrypt cost factor, worker pool size) and login concurrency cap
+    bcrypt_rounds: int = Field(12, env="BCRYPT_ROUNDS")
+    password_hash_workers: int = Field(2, env="PASSWORD_HASH_WORKERS")
+    login_max_concurrency: int = Field(16, env="LOGIN_MAX_CONCURRENCY")
+
+    # Conversation write-behind queue; "strict" waits for a FULL-synchronous commit
+    conversation_write_durability: str = Field("relaxed", env="CONVERSATION_WRITE_DURABILITY")
+    conversation_queue_max_size: int = Field(10000, env="CONVERSATION_QUEUE_MAX_SIZE")
+    conversation_batch_size: int = Field(200, env="CONVERSATION_BATCH_SIZE")
+    conversation_flush_interval_ms: int = Field(50, env="CONVERSATION_FLUSH_INTERVAL_MS")
+
+    # Rolling conversation memory (summary + last turn) prepended to /comprehensive-query prompts
+    conversation_memory_budget_tokens: int = Field(1200, env="CONVERSATION_MEMORY_BUDGET_TOKENS")
+    conversation_summary_max_tokens: int = Field(400, env="CONVERSATION_SUMMARY_MAX_TOKENS")
+    conversation_summary_model: str = Field("gpt-4o-mini", env="CONVERSATION_SUMMARY_MODEL")
+
+    # State shared by the API workers of one node: "sqlite" or "redis" (a local or
+    # nearby Redis). users.db, DOCUMENT_CATALOG_PATH and LEXICAL_INDEX_PATH are WAL-mode
+    # SQLite files on local disk, so all workers must run on the same node
+    api_workers: int = Field(1, env="API_WORKERS")
+    shared_state_backend: str = Field("sqlite", env="SHARED_STATE_BACKEND")
+    shared_state_path: str = Field("app/database/shared_state.db", env="SHARED_STATE_PATH")
+    redis_url: str = Field("redis://localhost:6379/0", env="REDIS_URL")
+    session_sync_interval_seconds: float = Field(1.0, env="SESSION_SYNC_INTERVAL_SECONDS")
+
+    # Startup warm-up gating /ready: load models and clients, run a representative
+    # embedding batch and open the LLM clients' connections. WARM_UP_LLM_PING adds one
+    # paid one-token completion per worker process
+    warm_up_resources: bool = Field(True, env="WARM_UP_RESOURCES")
+    warm_up_embedding_batch_size: int = Field(50, env="WARM_UP_EMBEDDING_BATCH_SIZE")
+    warm_up_llm_ping: bool = Field(False, env="WARM_UP_LLM_PING")
+
+    # Request tracing: requests slower than the threshold are logged with their span
+    # tree; set OTLP_ENDPOINT (e.g. http://localhost:4318) to export every trace
+    trace_slow_request_seconds: float = Field(5.0, env="TRACE_SLOW_REQUEST_SECONDS")
+    trace_slow_log_size: int = Field(100, env="TRACE_SLOW_LOG_SIZE")
+    otlp_endpoint: str = Field("", env="OTLP_ENDPOINT")
+    otlp_service_name: str = Field("questgen-api", env="OTLP_SERVICE_NAME")
+
+    # Event-loop lag sampling; in debug mode a watchdog also logs the stack of any
+    # callback that holds the loop longer than the block threshold
+    loop_lag_interval_seconds: float = Field(0.1, env="LOOP_LAG_INTERVAL_SECONDS")
+    loop_block_threshold_seconds: float = Field(0.25, env="LOOP_BLOCK_THRESHOLD_SECONDS")
+    loop_monitor_debug: bool = Field(False, env="LOOP_MONITOR_DEBUG")
+
+    # Admission control per pool and per worker process: concurrent slots, queue length,
+    # longest queue wait.
+    # Interactive = query endpoints, ingestion = uploads, background = summaries
+    admission_interactive_concurrency: int = Field(16, env="ADMISSION_INTERACTIVE_CONCURRENCY")
+    admission_interactive_queue: int = Field(64, env="ADMISSION_INTERACTIVE_QUEUE")
+    admission_interactive_max_wait_seconds: float = Field(10.0, env="ADMISSION_INTERACTIVE_MAX_WAIT_SECONDS")
+    admission_ingestion_concurrency: int = Field(2, env="ADMISSION_INGESTION_CONCURRENCY")
+    admission_ingestion_queue: int = Field(8, env="ADMISSION_INGESTION_QUEUE")
+    admission_ingestion_max_wait_seconds: float = Field(30.0, env="ADMISSION_INGESTION_MAX_WAIT_SECONDS")
+    admission_background_concurrency: int = Field(4, env="ADMISSION_BACKGROUND_CONCURRENCY")
+    admission_background_queue: int = Field(256, env="ADMISSION_BACKGROUND_QUEUE")
+    admission_background_max_wait_seconds: float = Field(60.0, env="ADMISSION_BACKGROUND_MAX_WAIT_SECONDS")
+
+    # Hybrid retrieval: a BM25 index (SQLite FTS5) built at ingestion is searched next to
+    # Qdrant and the two rankings are merged by reciprocal rank fusion (HYBRID_RRF_K)
+    hybrid_search_enabled: bool = Field(True, env="HYBRID_SEARCH_ENABLED")
+    lexical_index_path: str = Field("app/database/lexical.db", env="LEXICAL_INDEX_PATH")
+    hybrid_lexical_candidates: int = Field(30, env="HYBRID_LEXICAL_CANDIDATES")
+    hybrid_rrf_k: int = Field(60, env="HYBRID_RRF_K")
+
+    # Two-stage retrieval: fetch RERANK_CANDIDATES hits from Qdrant, rescore them with
+    # a CPU cross-encoder within RERANK_BUDGET_MS and keep the best RERANK_TOP_K.
+    # Off until benchmarks/eval_reranker.py shows no loss in answer recall on real questions
+    rerank_enabled: bool = Field(False, env="RERANK_ENABLED")
+    rerank_model: str = Field("cross-encoder/ms-marco-MiniLM-L-6-v2", env="RERANK_MODEL")
+    rerank_candidates: int = Field(30, env="RERANK_CANDIDATES")
+    rerank_top_k: int = Field(4, env="RERANK_TOP_K")
+    rerank_batch_size: int = Field(16, env="RERANK_BATCH_SIZE")
+    rerank_budget_ms: float = Field(300.0, env="RERANK_BUDGET_MS")
+    rerank_cache_size: int = Field(20000, env="RERANK_CACHE_SIZE")
+
+    # Retrieved context post-processing: merge adjacent/overlapping chunks and drop
+    # repeated sentences; optionally keep only the sentences closest to the query
+    context_compression_enabled: bool = Field(True, env="CONTEXT_COMPRESSION_ENABLED")
+    context_dedupe_threshold: float = Field(0.85, env="CONTEXT_DEDUPE_THRESHOLD")
+    context_select_sentences: bool = Field(False, env="CONTEXT_SELECT_SENTENCES")
+    context_keep_ratio: float = Field(0.6, env="CONTEXT_KEEP_RATIO")
+
+    # Model routing: lookups with short prompts go to the small model; question
+    # generation, synthesis, long prompts and LARGE_FORMAT_STYLES go to the large one.
+    # MODEL_PRICES is "model:input:output,..." in USD per million tokens.
+    model_router_enabled: bool = Field(True, env="MODEL_ROUTER_ENABLED")
+    model_router_small_model: str = Field("gpt-4o-mini", env="MODEL_ROUTER_SMALL_MODEL")
+    model_router_large_model: str = Field("gpt-4o", env="MODEL_ROUTER_LARGE_MODEL")
+    model_router_small_max_prompt_tokens: int = Field(6000, env="MODEL_ROUTER_SMALL_MAX_PROMPT_TOKENS")
+    model_router_small_question_types: str = Field("definition,temporal,location", env="MODEL_ROUTER_SMALL_QUESTION_TYPES")
+    model_router_large_format_styles: str = Field("", env="MODEL_ROUTER_LARGE_FORMAT_STYLES")
+    model_router_default_tier: str = Field("large", env="MODEL_ROUTER_DEFAULT_TIER")
+    model_prices: str = Field("gpt-4o:2.5:10,gpt-4o-mini:0.15:0.6,gpt-4:30:60", env="MODEL_PRICES")
+
+    # Request deadline (0 = none); clients may shorten it with X-Request-Timeout.
+    # LLM calls may be hedged: once the primary runs past the given percentile of
+    # recent latencies, a duplicate goes to LLM_HEDGE_MODEL (same model when empty).
+    request_deadline_seconds: float = Field(120.0, env="REQUEST_DEADLINE_SECONDS")
+    llm_hedge_enabled: bool = Field(False, env="LLM_HEDGE_ENABLED")
+    llm_hedge_percentile: float = Field(0.95, env="LLM_HEDGE_PERCENTILE")
+    llm_hedge_min_delay_seconds: float = Field(1.0, env="LLM_HEDGE_MIN_DELAY_SECONDS")
+    llm_hedge_initial_delay_seconds: float = Field(8.0, env="LLM_HEDGE_INITIAL_DELAY_SECONDS")
+    llm_hedge_model: str = Field("", env="LLM_HEDGE_MODEL")
+    llm_hedge_max_fraction: float = Field(0.1, env="LLM_HEDGE_MAX_FRACTION")
+    # Threads per process for hedged LangChain calls (a hedged call holds up to two);
+    # calls that are not hedged run on the request's own executor thread
+    llm_hedge_pool_size: int = Field(32, env="LLM_HEDGE_POOL_SIZE")
+
+    # Per-user limits on LLM endpoints: request and LLM-token buckets, plus daily and
+    # monthly token quotas (0 = unlimited). Requests reserve an estimate up front
+    # that is reconciled with actual usage afterwards. Buckets live in each worker, so
+    # their rates and bursts are split over the API_WORKERS processes; quotas
+    # are re-synced from the shared usage ledger.
+    rate_limit_requests_per_minute: float = Field(20.0, env="RATE_LIMIT_REQUESTS_PER_MINUTE")
+    rate_limit_request_burst: int = Field(10, env="RATE_LIMIT_REQUEST_BURST")
+    rate_limit_llm_tokens_per_minute: float = Field(40000.0, env="RATE_LIMIT_LLM_TOKENS_PER_MINUTE")
+    rate_limit_llm_token_burst: int = Field(60000, env="RATE_LIMIT_LLM_TOKEN_BURST")
+    rate_limit_daily_token_quota: int = Field(0, env="RATE_LIMIT_DAILY_TOKEN_QUOTA")
+    rate_limit_monthly_token_quota: int = Field(0, env="RATE_LIMIT_MONTHLY_TOKEN_QUOTA")
+    rate_limit_prompt_estimate_tokens: int = Field(4000, env="RATE_LIMIT_PROMPT_ESTIMATE_TOKENS")
+    rate_limit_query_estimate_tokens: int = Field(6000, env="RATE_LIMIT_QUERY_ESTIMATE_TOKENS")
+    rate_limit_sync_interval_seconds: float = Field(60.0, env="RATE_LIMIT_SYNC_INTERVAL_SECONDS")
+
+    # Comma-separated usernames allowed on /admin endpoints
+    admin_usernames: str = Field("", env="ADMIN_USERNAMES")
 
     class Config:
         env_file = ".env"
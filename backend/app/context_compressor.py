@@ -0,0 +1,161 @@
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import re
+
+from conversation_memory import count_tokens
+from metrics import registry
+
+context_compression_ratio = registry.histogram(
+    "questgen_context_compression_ratio", "Compressed / raw prompt tokens of retrieved context",
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0), context_labels=True
+)
+
+_SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+(?=[A-Z0-9(\["])|\n\s*\n')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were what which who "
+    "why how when where with does do did can about into".split()
+)
+
+
+@dataclass
+class Passage:
+    """Adjacent retrieved chunks of one document, stitched into a single block"""
+    filename: str
+    first_chunk: int
+    last_chunk: int
+    score: float
+    text: str
+    pages: List = field(default_factory=list)
+    source_numbers: List[int] = field(default_factory=list)  # 1-based positions in the sources list
+
+
+def _words(text: str) -> List[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def _stitch(left: str, right: str, min_overlap: int, max_overlap: int) -> str:
+    """Join two consecutive chunks, dropping the splitter's overlap between them"""
+    for size in range(min(len(left), len(right), max_overlap), min_overlap - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    # The splitter trims whitespace at chunk edges, so look for the overlap ignoring it
+    stripped = right.lstrip()
+    for size in range(min(len(left), len(stripped), max_overlap), min_overlap - 1, -1):
+        if left.rstrip().endswith(stripped[:size]):
+            return left.rstrip() + stripped[size:]
+    return left + "\n" + right
+
+
+class ContextCompressor:
+    """
+    Shrinks retrieved chunks before they go into a prompt. It merges
+    adjacent and overlapping chunks of the same document into one passage
+    and drops sentences that repeat one already kept, either exactly or
+    nearly (shingle Jaccard >= dedupe_threshold). With select_sentences on,
+    it also keeps only the sentences that best match the query: query-term
+    overlap weighted by the chunk's retrieval score, which is already
+    computed. Every retrieved source keeps a header in the output, so the
+    answer can still cite it.
+    """
+
+    def __init__(self, enabled: bool = True, dedupe_threshold: float = 0.85, select_sentences: bool = False,
+                 keep_ratio: float = 0.6, min_overlap: int = 20, max_overlap: int = 400):
+        self.enabled = enabled
+        self.dedupe_threshold = dedupe_threshold
+        self.select_sentences = select_sentences
+        self.keep_ratio = keep_ratio
+        self.min_overlap = min_overlap
+        self.max_overlap = max_overlap
+
+    def merge(self, hits: List[Tuple[str, Dict, float]]) -> List[Passage]:
+        """hits are (text, metadata, score) in source order; returns passages, best first"""
+        ordered = sorted(
+            enumerate(hits, 1),
+            key=lambda item: (item[1][1].get("filename", ""), item[1][1].get("chunk_index", 0))
+        )
+        passages: List[Passage] = []
+        for number, (text, metadata, score) in ordered:
+            filename = metadata.get("filename", "Unknown")
+            chunk_index = metadata.get("chunk_index", 0)
+            page = metadata.get("page_number", "Unknown")
+            last = passages[-1] if passages else None
+            if last is not None and last.filename == filename and chunk_index - last.last_chunk <= 1:
+                if chunk_index != last.last_chunk:
+                    last.text = _stitch(last.text, text, self.min_overlap, self.max_overlap)
+                last.last_chunk = chunk_index
+                last.score = max(last.score, score)
+                last.source_numbers.append(number)
+                if page not in last.pages:
+                    last.pages.append(page)
+            else:
+                passages.append(Passage(filename, chunk_index, chunk_index, score, text, [page], [number]))
+        return sorted(passages, key=lambda passage: passage.score, reverse=True)
+
+    def _dedupe(self, passages: List[Passage]) -> List[List[str]]:
+        seen_exact = set()
+        seen_shingles: List[frozenset] = []
+        kept = []
+        for passage in passages:
+            sentences = []
+            for sentence in _SENTENCE_SPLIT_RE.split(passage.text):
+                sentence = sentence.strip()
+                words = _words(sentence)
+                if not words:
+                    continue
+                key = " ".join(words)
+                if key in seen_exact:
+                    continue
+                seen_exact.add(key)
+                if len(words) >= 6:
+                    shingles = frozenset(zip(words, words[1:], words[2:]))
+                    if any(len(shingles & other) / len(shingles | other) >= self.dedupe_threshold
+                           for other in seen_shingles):
+                        continue
+                    seen_shingles.append(shingles)
+                sentences.append(sentence)
+            kept.append(sentences)
+        return kept
+
+    def _select(self, query: str, passages: List[Passage], sentences: List[List[str]]) -> List[List[str]]:
+        terms = {word for word in _words(query) if word not in STOP_WORDS}
+        scored = []
+        for p, (passage, passage_sentences) in enumerate(zip(passages, sentences)):
+            for s, sentence in enumerate(passage_sentences):
+                words = set(_words(sentence))
+                overlap = len(terms & words) / len(terms) if terms else 0.0
+                scored.append((passage.score * (0.5 + overlap), p, s))
+        budget = max(len(passages), int(len(scored) * self.keep_ratio))
+        keep = {(p, s) for _, p, s in sorted(scored, reverse=True)[:budget]}
+        # Each passage keeps its best sentence so its sources stay cited
+        for p, passage_sentences in enumerate(sentences):
+            if passage_sentences and not any((p, s) in keep for s in range(len(passage_sentences))):
+                best = max((item for item in scored if item[1] == p), key=lambda item: item[0])
+                keep.add((best[1], best[2]))
+        return [
+            [sentence for s, sentence in enumerate(passage_sentences) if (p, s) in keep]
+            for p, passage_sentences in enumerate(sentences)
+        ]
+
+    def compress(self, query: str, hits: List[Tuple[str, Dict, float]],
+                 raw_context: Optional[str] = None) -> Tuple[str, Dict]:
+        """Prompt context for the hits, plus token counts before and after"""
+        passages = self.merge(hits)
+        sentences = self._dedupe(passages)
+        if self.select_sentences:
+            sentences = self._select(query, passages, sentences)
+
+        blocks = []
+        for passage, passage_sentences in zip(passages, sentences):
+            numbers = ", ".join(str(number) for number in sorted(passage.source_numbers))
+            pages = ", ".join(str(page) for page in passage.pages)
+            header = f"[Source {numbers}] {passage.filename}, p. {pages}"
+            # A passage whose sentences all appeared above is still listed, so it can be cited
+            blocks.append(header + "\n" + " ".join(passage_sentences) if passage_sentences else header + " (repeats text above)")
+        context = "\n\n".join(blocks)
+
+        raw_tokens = count_tokens(raw_context if raw_context is not None else "\n".join(text for text, _, _ in hits))
+        tokens = count_tokens(context)
+        if raw_tokens:
+            context_compression_ratio.observe(tokens / raw_tokens)
+        return context, {"raw_context_tokens": raw_tokens, "context_tokens": tokens, "passages": len(blocks)}
@@ -0,0 +1,156 @@
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable
+from xml.sax.saxutils import escape
+import csv
+import io
+import json
+import tempfile
+import zipfile
+
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Characters that are invalid in XML 1.0 or are C1 controls, removed in one str.translate pass
+_INVALID_XML_CHARS = dict.fromkeys(
+    [cp for cp in range(0x20) if cp not in (0x09, 0x0A)]  # C0 controls except tab/newline; \r is dropped
+    + list(range(0x7F, 0xA0))                              # DEL and C1 controls
+    + list(range(0xD800, 0xE000))                          # lone surrogates
+    + [0xFFFE, 0xFFFF]
+)
+
+
+def clean_export_text(text: str) -> str:
+    """Remove null bytes and control characters that are not XML-compatible"""
+    if not text:
+        return ""
+    return text.translate(_INVALID_XML_CHARS).strip()
+
+
+async def export_jsonl(rows: AsyncIterator[Dict], header: Dict) -> AsyncIterator[bytes]:
+    async for row in rows:
+        yield (json.dumps({
+            "id": row["id"],
+            "timestamp": row["timestamp"],
+            "query": row["query"],
+            "response": row["response"],
+        }, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def export_markdown(rows: AsyncIterator[Dict], header: Dict) -> AsyncIterator[bytes]:
+    yield (
+        "# Conversation History\n\n"
+        f"- Generated on: {header['generated_at']}\n"
+        f"- User: {header['user_name']}\n"
+        f"- Total Conversations: {header['total']}\n\n"
+    ).encode("utf-8")
+    number = 0
+    async for row in rows:
+        number += 1
+        yield (
+            f"## Conversation {number}\n\n"
+            f"*Time: {row['timestamp']}*\n\n"
+            f"**Query:** {clean_export_text(row['query'])}\n\n"
+            f"**Response:**\n\n{clean_export_text(row['response'])}\n\n---\n\n"
+        ).encode("utf-8")
+
+
+async def export_csv(rows: AsyncIterator[Dict], header: Dict) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(["id", "timestamp", "query", "response"])
+    async for row in rows:
+        writer.writerow([row["id"], row["timestamp"], clean_export_text(row["query"]), clean_export_text(row["response"])])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+# Minimal WordprocessingML package. document.xml is written incrementally into the
+# zip, so memory stays bounded instead of growing with a python-docx object tree.
+_DOCX_CONTENT_TYPES = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>
+</Types>'''
+_DOCX_RELS = '''<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>
+</Relationships>'''
+_DOCX_DOCUMENT_START = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>')
+_DOCX_DOCUMENT_END = '<w:sectPr/></w:body></w:document>'
+
+
+def _docx_run(text: str, bold: bool = False, size: int = 0) -> str:
+    properties = ("<w:b/>" if bold else "") + (f'<w:sz w:val="{size}"/>' if size else "")
+    properties = f"<w:rPr>{properties}</w:rPr>" if properties else ""
+    lines = escape(text).split("\n")
+    body = "<w:br/>".join(f'<w:t xml:space="preserve">{line}</w:t>' for line in lines)
+    return f"<w:r>{properties}{body}</w:r>"
+
+
+def _docx_paragraph(*runs: str, center: bool = False) -> str:
+    properties = '<w:pPr><w:jc w:val="center"/></w:pPr>' if center else ""
+    return f"<w:p>{properties}{''.join(runs)}</w:p>"
+
+
+def _docx_conversation(number: int, row: Dict) -> str:
+    return "".join((
+        _docx_paragraph(_docx_run(f"Conversation {number}", bold=True, size=32)),
+        _docx_paragraph(_docx_run(f"Time: {row['timestamp']}")),
+        _docx_paragraph(_docx_run("Query: ", bold=True), _docx_run(clean_export_text(row["query"]))),
+        _docx_paragraph(_docx_run("Response: ", bold=True), _docx_run(clean_export_text(row["response"]))),
+        _docx_paragraph(_docx_run("-" * 50)),
+    ))
+
+
+def _read_chunks(handle) -> Iterable[bytes]:
+    handle.seek(0)
+    while True:
+        chunk = handle.read(EXPORT_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def export_docx(rows: AsyncIterator[Dict], header: Dict) -> AsyncIterator[bytes]:
+    with tempfile.TemporaryFile() as spool:
+        with zipfile.ZipFile(spool, "w", compression=zipfile.ZIP_DEFLATED) as package:
+            package.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+            package.writestr("_rels/.rels", _DOCX_RELS)
+            with package.open("word/document.xml", "w") as document:
+                document.write(_DOCX_DOCUMENT_START.encode("utf-8"))
+                document.write("".join((
+                    _docx_paragraph(_docx_run("Conversation History", bold=True, size=48), center=True),
+                    _docx_paragraph(_docx_run(f"Generated on: {header['generated_at']}")),
+                    _docx_paragraph(_docx_run(f"User: {header['user_name']}")),
+                    _docx_paragraph(_docx_run(f"Total Conversations: {header['total']}")),
+                    _docx_paragraph(_docx_run("=" * 50)),
+                )).encode("utf-8"))
+                number = 0
+                async for row in rows:
+                    number += 1
+                    document.write(_docx_conversation(number, row).encode("utf-8"))
+                document.write(_DOCX_DOCUMENT_END.encode("utf-8"))
+        for chunk in _read_chunks(spool):
+            yield chunk
+
+
+# format -> (exporter, media type); the format name doubles as the file extension
+EXPORT_FORMATS = {
+    "docx": (export_docx, "application/vnd.openxmlformats-officedocument.wordprocessingml.document"),
+    "jsonl": (export_jsonl, "application/x-ndjson"),
+    "md": (export_markdown, "text/markdown; charset=utf-8"),
+    "csv": (export_csv, "text/csv; charset=utf-8"),
+}
+
+
+def export_header(user_name: str, total: int) -> Dict:
+    return {
+        "generated_at": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        "user_name": clean_export_text(user_name),
+        "total": total,
+    }
@@ -0,0 +1,194 @@
+from functools import lru_cache
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import logging
+import time
+
+from db import Database
+
+# Number of raw turns the old prompt prepended; used to report savings against it
+TRANSCRIPT_TURNS = 5
+
+SELECT_MEMORY_SQL = "SELECT * FROM conversation_memory WHERE user_id = ? AND document = ?"
+UPSERT_MEMORY_SQL = '''
+    INSERT INTO conversation_memory
+        (user_id, document, summary, last_query, last_response, turn_count, recent_turn_tokens, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, document) DO UPDATE SET
+        summary = excluded.summary,
+        last_query = excluded.last_query,
+        last_response = excluded.last_response,
+        turn_count = excluded.turn_count,
+        recent_turn_tokens = excluded.recent_turn_tokens,
+        updated_at = excluded.updated_at
+'''
+
+# summarizer(user_id, previous_summary, query, response, max_tokens) -> new summary;
+# the user id lets the summarizer bill its LLM call to the user whose conversation it is
+Summarizer = Callable[[int, str, str, str, int], Awaitable[str]]
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logging.warning(f"tiktoken unavailable, estimating tokens from length: {e}")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0 or not text:
+        return ""
+    encoding = _encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def extractive_summary(previous_summary: str, query: str, response: str, max_tokens: int) -> str:
+    """LLM-free fallback: append the question and the opening of the answer, keeping the newest text"""
+    answer = response.strip().split("\n\n", 1)[0]
+    entry = f"- Q: {query.strip()} A: {truncate_to_tokens(answer, 80)}"
+    combined = f"{previous_summary}\n{entry}".strip() if previous_summary else entry
+    while count_tokens(combined) > max_tokens and "\n" in combined:
+        combined = combined.split("\n", 1)[1]
+    return truncate_to_tokens(combined, max_tokens)
+
+
+class ConversationMemory:
+    """
+    Per-user, per-document conversation memory: a running summary plus the most
+    recent exchange. When a new exchange arrives, the previous one is folded into
+    the summary in the background, so a prompt never carries more than
+    `budget_tokens` of history.
+    """
+
+    def __init__(self, db: Database, summarizer: Optional[Summarizer] = None,
+                 budget_tokens: int = 1200, summary_max_tokens: int = 400):
+        self.db = db
+        self.summarizer = summarizer
+        self.budget_tokens = budget_tokens
+        self.summary_max_tokens = summary_max_tokens
+        # (user, document) -> [lock, holders and waiters]; dropped when idle so it stays bounded
+        self._locks: Dict[Tuple[int, str], list] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.prompts = 0
+        self.prompt_tokens = 0
+        self.transcript_tokens = 0
+        self.updates = 0
+        self.summarizer_failures = 0
+
+    async def build_context(self, user_id: int, document: str) -> Tuple[str, Dict]:
+        """Render memory for a prompt within the token budget, with token accounting"""
+        memory = await self.db.fetchone(SELECT_MEMORY_SQL, (user_id, document))
+        if not memory:
+            return "", {"prompt_tokens": 0, "transcript_tokens": 0, "saved_tokens": 0}
+
+        summary = truncate_to_tokens(memory["summary"] or "", min(self.summary_max_tokens, self.budget_tokens))
+        remaining = self.budget_tokens - count_tokens(summary)
+        last_query = truncate_to_tokens(memory["last_query"] or "", remaining // 4)
+        last_response = truncate_to_tokens(memory["last_response"] or "", remaining - count_tokens(last_query))
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation:\n{summary}")
+        if last_query:
+            parts.append(f"Most recent exchange:\nQ: {last_query}\nA: {last_response}")
+        # Headers count against the budget too
+        context = truncate_to_tokens("\n\n".join(parts), self.budget_tokens)
+
+        prompt_tokens = count_tokens(context)
+        transcript_tokens = sum(json.loads(memory["recent_turn_tokens"] or "[]"))
+        self.prompts += 1
+        self.prompt_tokens += prompt_tokens
+        self.transcript_tokens += transcript_tokens
+        return context, {
+            "prompt_tokens": prompt_tokens,
+            "transcript_tokens": transcript_tokens,
+            "saved_tokens": max(0, transcript_tokens - prompt_tokens),
+        }
+
+    async def update(self, user_id: int, document: str, query: str, response: str):
+        """Make (query, response) the most recent turn, summarizing the turn it replaces"""
+        key = (user_id, document)
+        entry = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await self._update_locked(key, query, response)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def _update_locked(self, key: Tuple[int, str], query: str, response: str):
+        """Body of update(), run while holding the (user, document) lock"""
+        user_id, document = key
+        memory = await self.db.fetchone(SELECT_MEMORY_SQL, key) or {}
+        summary = memory.get("summary") or ""
+        if memory.get("last_query"):
+            summary = await self._summarize(user_id, summary, memory["last_query"], memory["last_response"] or "")
+
+        recent_turn_tokens: List[int] = json.loads(memory.get("recent_turn_tokens") or "[]")
+        recent_turn_tokens = (recent_turn_tokens + [count_tokens(f"Q: {query}\nA: {response}")])[-TRANSCRIPT_TURNS:]
+
+        await self.db.execute(UPSERT_MEMORY_SQL, (
+            user_id, document, summary, query, response,
+            (memory.get("turn_count") or 0) + 1, json.dumps(recent_turn_tokens), time.time()
+        ))
+        self.updates += 1
+
+    def schedule_update(self, user_id: int, document: str, query: str, response: str):
+        """Update memory in the background; failures are logged, never raised to the request"""
+        task = asyncio.create_task(self._update_logged(user_id, document, query, response))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update_logged(self, *args):
+        try:
+            await self.update(*args)
+        except Exception as e:
+            logging.error(f"Error updating conversation memory: {e}")
+
+    async def _summarize(self, user_id: int, summary: str, query: str, response: str) -> str:
+        if self.summarizer is not None:
+            try:
+                updated = await self.summarizer(user_id, summary, query, response, self.summary_max_tokens)
+                return truncate_to_tokens(updated.strip(), self.summary_max_tokens)
+            except Exception as e:
+                self.summarizer_failures += 1
+                logging.warning(f"Conversation summarizer failed, using extractive summary: {e}")
+        return extractive_summary(summary, query, response, self.summary_max_tokens)
+
+    async def close(self):
+        """Wait for pending background updates"""
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            "budget_tokens": self.budget_tokens,
+            "prompts": self.prompts,
+            "updates": self.updates,
+            "pending_updates": len(self._tasks),
+            "summarizer_failures": self.summarizer_failures,
+            "prompt_tokens": self.prompt_tokens,
+            "transcript_tokens": self.transcript_tokens,
+            "saved_tokens": max(0, self.transcript_tokens - self.prompt_tokens),
+        }
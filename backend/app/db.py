@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+import asyncio
+import base64
+import json
+import logging
+import sqlite3
+import threading
+
+# Applied to every pooled connection. WAL lets readers run alongside the writer,
+# and synchronous=NORMAL is durable across application crashes in WAL mode.
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA foreign_keys=ON",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=134217728",
+)
+
+
+def encode_cursor(*values) -> str:
+    """Opaque keyset-pagination cursor for the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    try:
+        return tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class Database:
+    """
+    Async access to SQLite through a small pool of long-lived connections.
+
+    Each pool thread owns one connection, so statements run off the event loop
+    and prepared statements are reused from the connection's statement cache.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, busy_timeout: float = 5.0, cached_statements: int = 256):
+        self.path = path
+        self.pool_size = pool_size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="sqlite")
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                self.path,
+                timeout=self.busy_timeout,
+                cached_statements=self.cached_statements,
+                check_same_thread=False
+            )
+            conn.row_factory = sqlite3.Row
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn(connection, *args) on a pool thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args)
+
+    def run_sync(self, fn: Callable[..., Any], *args) -> Any:
+        """Blocking variant of run() for startup code and worker threads"""
+        return self._executor.submit(self._call, fn, args).result()
+
+    def _call(self, fn: Callable[..., Any], args: tuple) -> Any:
+        return fn(self._connection(), *args)
+
+    async def fetchone(self, sql: str, params: Sequence = ()) -> Optional[Dict]:
+        def _fetchone(conn):
+            row = conn.execute(sql, params).fetchone()
+            return dict(row) if row else None
+        return await self.run(_fetchone)
+
+    async def fetchall(self, sql: str, params: Sequence = ()) -> List[Dict]:
+        def _fetchall(conn):
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        return await self.run(_fetchall)
+
+    async def execute(self, sql: str, params: Sequence = ()) -> sqlite3.Cursor:
+        """Execute a single write statement in its own transaction"""
+        def _execute(conn):
+            with conn:
+                return conn.execute(sql, params)
+        return await self.run(_execute)
+
+    async def executemany(self, sql: str, seq_of_params: Iterable[Sequence]) -> int:
+        """Execute a statement for every parameter set in one transaction"""
+        def _executemany(conn):
+            with conn:
+                return conn.executemany(sql, seq_of_params).rowcount
+        return await self.run(_executemany)
+
+    def queue_depth(self) -> int:
+        """Calls waiting for a pool thread"""
+        return self._executor._work_queue.qsize()
+
+    def close(self):
+        """Stop the pool threads and close every connection"""
+        self._executor.shutdown(wait=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logging.warning(f"Error closing database connection: {e}")
+            self._connections.clear()
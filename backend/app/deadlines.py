@@ -0,0 +1,291 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import asyncio
+import threading
+import time
+
+from metrics import in_context, registry
+
+T = TypeVar("T")
+
+deadline_exceeded = registry.counter(
+    "questgen_deadline_exceeded_total", "Requests abandoned because their deadline passed", labelnames=("stage",)
+)
+llm_hedges = registry.counter(
+    "questgen_llm_hedges_total", "Hedged LLM calls by which attempt finished first (primary, hedge)",
+    labelnames=("winner",)
+)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's deadline passes before a stage can finish"""
+
+    def __init__(self, stage: str):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+
+
+def set_deadline(seconds: float):
+    """Give the current request `seconds` from now, never extending a deadline already set"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    _deadline.set(deadline if current is None else min(current, deadline))
+
+
+def current_deadline() -> Optional[float]:
+    """The request's deadline as a time.monotonic() value, or None"""
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the deadline (None without one)"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def check_deadline(stage: str):
+    """Give up before starting `stage` if the request has no time left"""
+    left = remaining()
+    if left is not None and left <= 0:
+        deadline_exceeded.inc(stage=stage)
+        raise DeadlineExceeded(stage)
+
+
+class DeadlineMiddleware:
+    """
+    Pure ASGI middleware starting each request's deadline. Clients may ask
+    for a tighter one with an X-Request-Timeout header (seconds).
+    """
+
+    def __init__(self, app, default_seconds: float):
+        self.app = app
+        self.default_seconds = default_seconds
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        seconds = self.default_seconds or None
+        header = dict(scope.get("headers") or []).get(b"x-request-timeout")
+        if header:
+            try:
+                requested = float(header)
+                if requested > 0:
+                    seconds = min(seconds, requested) if seconds else requested
+            except ValueError:
+                pass
+        token = _deadline.set(time.monotonic() + seconds if seconds else None)
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+class HedgePolicy:
+    """
+    When to send a duplicate LLM call. The hedge goes out once the primary
+    has run past the given percentile of recent completion times for its
+    model. Until enough samples exist, initial_delay is used instead. Hedges
+    are rate-limited to max_fraction of calls by a small credit bucket, so a
+    slow provider does not get twice the load.
+
+    Blocking hedged calls run their attempts on a pool of pool_size threads,
+    so at most pool_size attempts are in flight per process; calls that are
+    not hedged run on the caller's thread.
+    """
+
+    def __init__(self, enabled: bool, percentile: float = 0.95, min_delay: float = 1.0,
+                 initial_delay: float = 8.0, hedge_model: str = "", max_fraction: float = 0.1,
+                 window: int = 500, min_samples: int = 20, pool_size: int = 32):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self.hedge_model = hedge_model
+        self.max_fraction = max_fraction
+        self.window = window
+        self.min_samples = min_samples
+        self.pool_size = pool_size
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._latencies: Dict[str, deque] = {}
+        self._credit = 1.0
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def record(self, model: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(model, deque(maxlen=self.window)).append(seconds)
+
+    def delay(self, model: str) -> Optional[float]:
+        """Seconds to wait for the primary before hedging; None when this call may not hedge"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            samples = sorted(self._latencies.get(model, ()))
+        if len(samples) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, samples[min(len(samples) - 1, int(len(samples) * self.percentile))])
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="llm-hedge")
+            return self._executor
+
+    def _start(self):
+        with self._lock:
+            self.calls += 1
+            self._credit = min(10.0, self._credit + self.max_fraction)
+
+    def _may_hedge(self) -> bool:
+        with self._lock:
+            if self._credit < 1:
+                return False
+            self._credit -= 1
+            self.hedged += 1
+            return True
+
+    def _finish(self, winner: str):
+        llm_hedges.inc(winner=winner)
+        if winner == "hedge":
+            with self._lock:
+                self.hedge_wins += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            models = list(self._latencies)
+        return {
+            "enabled": self.enabled,
+            "pool_size": self.pool_size,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_seconds": {model: self.delay(model) for model in models} if self.enabled else {},
+        }
+
+
+def _wait_budget(timeout: Optional[float]) -> Optional[float]:
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(0.0, left if timeout is None else min(timeout, left))
+
+
+def _time_left() -> bool:
+    left = remaining()
+    return left is None or left > 0
+
+
+def request_timeout(minimum: float = 0.1) -> Optional[float]:
+    """Per-request timeout for a client call made now: the time left, or None without a deadline"""
+    left = remaining()
+    return None if left is None else max(minimum, left)
+
+
+async def hedged(call: Callable[[str], Awaitable[T]], model: str, policy: HedgePolicy,
+                 stage: str = "llm_call") -> T:
+    """
+    Await call(model) within the request deadline. Once the policy's delay
+    passes (or the primary fails early) also start call(hedge model), take
+    whichever succeeds first and cancel the other.
+    """
+    attempts: Dict[asyncio.Future, tuple] = {}
+
+    def launch(name: str, attempt_model: str):
+        attempts[asyncio.ensure_future(call(attempt_model))] = (name, attempt_model, time.monotonic())
+
+    delay = policy.delay(model)
+    policy._start()
+    launch("primary", model)
+    hedge_pending, hedge_sent = delay is not None, False
+    error = None
+    try:
+        while attempts:
+            timeout = delay if hedge_pending else None
+            done, _ = await asyncio.wait(attempts, timeout=_wait_budget(timeout), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name, attempt_model, started = attempts.pop(task)
+                if task.exception() is None:
+                    policy.record(attempt_model, time.monotonic() - started)
+                    if hedge_sent:
+                        policy._finish(name)
+                    return task.result()
+                error = task.exception()
+            if not done and not _time_left():
+                deadline_exceeded.inc(stage=stage)
+                raise DeadlineExceeded(stage)
+            if hedge_pending and _time_left():
+                hedge_pending = False
+                if not policy._may_hedge():
+                    continue
+                hedge_sent = True
+                launch("hedge", policy.hedge_model or model)
+        raise error
+    finally:
+        for task in attempts:
+            task.cancel()
+
+
+def hedged_sync(call: Callable[[str, threading.Event], T], model: str, policy: HedgePolicy,
+                stage: str = "llm_call") -> T:
+    """
+    Blocking counterpart of hedged() for LangChain calls. Hedged attempts
+    run on the policy's thread pool; call(model, cancelled) should stop early
+    once `cancelled` is set, and should pass request_timeout() to its client
+    so a stalled stream gives its thread back at the deadline, because a
+    thread cannot be interrupted. A call that may not hedge runs on the
+    caller's thread and relies on that timeout alone.
+    """
+    delay = policy.delay(model)
+    if delay is None:
+        try:
+            return call(model, threading.Event())
+        except Exception as e:
+            if not _time_left():
+                deadline_exceeded.inc(stage=stage)
+                raise DeadlineExceeded(stage) from e
+            raise
+
+    attempts = {}
+
+    def launch(name: str, attempt_model: str):
+        cancelled = threading.Event()
+        future = policy.executor.submit(in_context(call, attempt_model, cancelled))
+        attempts[future] = (name, attempt_model, time.monotonic(), cancelled)
+
+    policy._start()
+    launch("primary", model)
+    hedge_pending, hedge_sent = delay is not None, False
+    error = None
+    try:
+        while attempts:
+            timeout = delay if hedge_pending else None
+            done, _ = wait(attempts, timeout=_wait_budget(timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                name, attempt_model, started, _ = attempts.pop(future)
+                if future.exception() is None:
+                    policy.record(attempt_model, time.monotonic() - started)
+                    if hedge_sent:
+                        policy._finish(name)
+                    return future.result()
+                error = future.exception()
+            if not done and not _time_left():
+                deadline_exceeded.inc(stage=stage)
+                raise DeadlineExceeded(stage)
+            if hedge_pending and _time_left():
+                hedge_pending = False
+                if not policy._may_hedge():
+                    continue
+                hedge_sent = True
+                launch("hedge", policy.hedge_model or model)
+        raise error
+    finally:
+        for future, (_, _, _, cancelled) in attempts.items():
+            cancelled.set()
+            future.cancel()
@@ -0,0 +1,195 @@
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from db import decode_cursor, encode_cursor
+
+DOCUMENT_STATUSES = ("uploaded", "indexing", "indexed", "failed")
+
+
+def normalize_document_name(filename: str) -> str:
+    """Case-insensitive lookup key for a document name"""
+    return " ".join(filename.lower().split())
+
+
+def file_content_hash(filepath: str) -> str:
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class DocumentCatalog:
+    """
+    Persistent SQLite catalog of uploaded documents. Every lookup the API
+    needs (most recent, by name, by content hash, per-owner listings) is
+    served from an index instead of scanning in-memory caches or the
+    documents directory.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    filename TEXT NOT NULL UNIQUE,
+                    normalized_name TEXT NOT NULL,
+                    owner_id INTEGER,
+                    content_hash TEXT,
+                    uploaded_at REAL NOT NULL,
+                    page_count INTEGER,
+                    chunk_count INTEGER,
+                    size_bytes INTEGER,
+                    status TEXT NOT NULL DEFAULT 'uploaded',
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_owner ON documents (owner_id, uploaded_at, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_uploaded ON documents (uploaded_at, id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (content_hash)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_name ON documents (normalized_name)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents (status, uploaded_at, id)")
+
+    def register(self, filename: str, owner_id: Optional[int] = None, content_hash: Optional[str] = None,
+                 size_bytes: Optional[int] = None, page_count: Optional[int] = None,
+                 status: str = "uploaded", uploaded_at: Optional[float] = None) -> Dict:
+        """Insert or refresh a document entry"""
+        now = time.time()
+        uploaded_at = uploaded_at or now
+        with self._lock, self._conn:
+            self._conn.execute('''
+                INSERT INTO documents (filename, normalized_name, owner_id, content_hash, uploaded_at,
+                                       page_count, size_bytes, status, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(filename) DO UPDATE SET
+                    owner_id = COALESCE(excluded.owner_id, owner_id),
+                    content_hash = COALESCE(excluded.content_hash, content_hash),
+                    uploaded_at = excluded.uploaded_at,
+                    page_count = COALESCE(excluded.page_count, page_count),
+                    size_bytes = COALESCE(excluded.size_bytes, size_bytes),
+                    status = excluded.status,
+                    updated_at = excluded.updated_at
+            ''', (filename, normalize_document_name(filename), owner_id, content_hash, uploaded_at,
+                  page_count, size_bytes, status, now))
+        return self.get(filename)
+
+    def update_status(self, filename: str, status: str, chunk_count: Optional[int] = None) -> bool:
+        with self._lock, self._conn:
+            cursor = self._conn.execute('''
+                UPDATE documents SET status = ?, chunk_count = COALESCE(?, chunk_count), updated_at = ?
+                WHERE filename = ?
+            ''', (status, chunk_count, time.time(), filename))
+            return cursor.rowcount > 0
+
+    def get(self, filename: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM documents WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def find(self, name: str) -> Optional[Dict]:
+        """
+        Resolve a user-supplied document name: exact filename, then
+        case-insensitive name, then the first case-insensitive prefix match.
+        """
+        document = self.get(name)
+        if document:
+            return document
+        normalized = normalize_document_name(name)
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT * FROM documents WHERE normalized_name = ?
+                ORDER BY uploaded_at DESC LIMIT 1
+            ''', (normalized,)).fetchone()
+            if row is None and normalized:
+                # Range scan on the name index instead of a LIKE/substring table scan
+                row = self._conn.execute('''
+                    SELECT * FROM documents WHERE normalized_name >= ? AND normalized_name < ?
+                    ORDER BY normalized_name LIMIT 1
+                ''', (normalized, normalized + "\uffff")).fetchone()
+        return dict(row) if row else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT * FROM documents WHERE content_hash = ?
+                ORDER BY uploaded_at DESC LIMIT 1
+            ''', (content_hash,)).fetchone()
+        return dict(row) if row else None
+
+    def most_recent(self, status: str = "indexed") -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute('''
+                SELECT * FROM documents WHERE status = ?
+                ORDER BY uploaded_at DESC, id DESC LIMIT 1
+            ''', (status,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, owner_id: Optional[int] = None, limit: Optional[int] = 50,
+             cursor: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """Newest-first page of documents with an opaque cursor for the next page (limit None: all)"""
+        clauses, params = [], []
+        if owner_id is not None:
+            clauses.append("owner_id = ?")
+            params.append(owner_id)
+        if cursor:
+            uploaded_at, document_id = decode_cursor(cursor)
+            clauses.append("(uploaded_at, id) < (?, ?)")
+            params.extend([uploaded_at, document_id])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(f'''
+                SELECT * FROM documents {where}
+                ORDER BY uploaded_at DESC, id DESC LIMIT ?
+            ''', (*params, -1 if limit is None else limit + 1)).fetchall()
+        documents = [dict(row) for row in rows[:limit]]
+        next_cursor = None
+        if limit is not None and len(rows) > limit:
+            last = documents[-1]
+            next_cursor = encode_cursor(last["uploaded_at"], last["id"])
+        return documents, next_cursor
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def remove(self, filename: str) -> bool:
+        with self._lock, self._conn:
+            return self._conn.execute("DELETE FROM documents WHERE filename = ?", (filename,)).rowcount > 0
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents")
+
+    def backfill(self, documents_dir: str) -> int:
+        """Register PDFs already on disk that predate the catalog"""
+        if not os.path.isdir(documents_dir):
+            return 0
+        added = 0
+        for filename in os.listdir(documents_dir):
+            if not filename.endswith(".pdf") or self.get(filename):
+                continue
+            file_path = os.path.join(documents_dir, filename)
+            self.register(
+                filename,
+                size_bytes=os.path.getsize(file_path),
+                uploaded_at=os.path.getmtime(file_path)
+            )
+            added += 1
+        if added:
+            logging.info(f"Document catalog backfilled with {added} existing files")
+        return added
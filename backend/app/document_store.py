@@ -0,0 +1,364 @@
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import base64
+import hashlib
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+
+from shared_state import SharedState
+from metrics import record_cache_lookup
+
+# Overlaps shorter than this are treated as coincidence, not splitter overlap
+MIN_CHUNK_OVERLAP = 20
+# Upper bound on how far back we look for a chunk's overlap with the previous one
+MAX_CHUNK_OVERLAP = 400
+# Shared-state version marker of a document deleted by any worker
+REMOVED_VERSION = "removed"
+
+
+@dataclass
+class StoredDocument:
+    """Compact representation of one indexed document"""
+    filename: str
+    timestamp: float
+    text_path: str
+    text_bytes: int
+    chunk_offsets: array  # byte offset of every chunk inside the text file
+    chunk_lengths: array  # byte length of every chunk
+    metadata_table: List[dict]  # distinct metadata dicts
+    metadata_index: array  # per-chunk index into metadata_table
+    resident: Optional[bytes] = field(default=None, repr=False)
+    mapped: Optional[mmap.mmap] = field(default=None, repr=False)  # opened on the first cold read
+
+    @property
+    def chunk_count(self) -> int:
+        return len(self.chunk_offsets)
+
+    @property
+    def index_bytes(self) -> int:
+        return sum(a.itemsize * len(a) for a in (self.chunk_offsets, self.chunk_lengths, self.metadata_index))
+
+
+def merge_chunks(chunks: List[str]):
+    """
+    Rebuild a single normalized text from overlapping chunks.
+    Returns (utf-8 text, chunk byte offsets, chunk byte lengths).
+    """
+    parts: List[bytes] = []
+    offsets = array('Q')
+    lengths = array('I')
+    text_tail = ""
+    position = 0
+
+    for chunk in chunks:
+        encoded = chunk.encode("utf-8")
+        # The earliest position where the tail continues into this chunk gives the longest overlap
+        overlap = 0
+        probe = chunk[:MIN_CHUNK_OVERLAP]
+        candidate = text_tail.find(probe) if len(probe) == MIN_CHUNK_OVERLAP else -1
+        while candidate != -1:
+            size = len(text_tail) - candidate
+            if size <= len(chunk) and chunk.startswith(text_tail[candidate:]):
+                overlap = size
+                break
+            candidate = text_tail.find(probe, candidate + 1)
+
+        separator = ""
+        if overlap:
+            overlap_bytes = len(chunk[:overlap].encode("utf-8"))
+            offsets.append(position - overlap_bytes)
+            new_part = encoded[overlap_bytes:]
+        else:
+            if parts:
+                separator = " "
+                parts.append(b" ")
+                position += 1
+            offsets.append(position)
+            new_part = encoded
+
+        lengths.append(len(encoded))
+        parts.append(new_part)
+        position += len(new_part)
+        # The tail mirrors the end of the merged text, separator included, so later offsets stay exact
+        text_tail = (text_tail + separator + chunk[overlap:])[-MAX_CHUNK_OVERLAP:]
+
+    return b"".join(parts), offsets, lengths
+
+
+class DocumentStore:
+    """
+    Document text store that keeps each document's text once on disk and
+    represents chunks as (offset, length) pairs into it. Recently used
+    documents stay resident in memory up to a byte budget; colder ones are
+    evicted (least recently used first) and served from a memory-mapped file.
+
+    With a shared state, every put/remove publishes a document version so other
+    workers on the node drop stale copies and reload from storage_dir.
+    """
+
+    def __init__(self, storage_dir: str, memory_budget_bytes: int,
+                 shared_state: Optional[SharedState] = None, version_check_interval: float = 0.5):
+        self.storage_dir = storage_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.shared_state = shared_state
+        self.version_check_interval = version_check_interval
+        self._documents: "OrderedDict[str, StoredDocument]" = OrderedDict()
+        self._version_checked: Dict[str, float] = {}
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+        os.makedirs(self.storage_dir, exist_ok=True)
+
+    def _paths(self, filename: str):
+        key = hashlib.sha1(filename.encode("utf-8")).hexdigest()
+        base = os.path.join(self.storage_dir, key)
+        return f"{base}.txt", f"{base}.json"
+
+    def put(self, filename: str, chunks: List[str], metadatas: List[dict], timestamp: float = None) -> StoredDocument:
+        """Store a document's chunks, writing its merged text through to disk"""
+        timestamp = timestamp or time.time()
+        text, offsets, lengths = merge_chunks(chunks)
+
+        metadata_table: List[dict] = []
+        metadata_lookup: Dict[str, int] = {}
+        metadata_index = array('I')
+        for metadata in metadatas:
+            key = json.dumps(metadata, sort_keys=True, default=str)
+            if key not in metadata_lookup:
+                metadata_lookup[key] = len(metadata_table)
+                metadata_table.append(metadata)
+            metadata_index.append(metadata_lookup[key])
+
+        text_path, manifest_path = self._paths(filename)
+        self._atomic_write(text_path, text)
+        manifest = {
+            "filename": filename,
+            "timestamp": timestamp,
+            "text_bytes": len(text),
+            "chunk_offsets": base64.b64encode(offsets.tobytes()).decode("ascii"),
+            "chunk_lengths": base64.b64encode(lengths.tobytes()).decode("ascii"),
+            "metadata_table": metadata_table,
+            "metadata_index": base64.b64encode(metadata_index.tobytes()).decode("ascii"),
+        }
+        manifest_bytes = json.dumps(manifest, default=str).encode("utf-8")
+        self._atomic_write(manifest_path, manifest_bytes)
+        if self.shared_state is not None:
+            self.shared_state.set(f"document_version:{filename}", repr(timestamp))
+
+        document = StoredDocument(
+            filename=filename,
+            timestamp=timestamp,
+            text_path=text_path,
+            text_bytes=len(text),
+            chunk_offsets=offsets,
+            chunk_lengths=lengths,
+            metadata_table=metadata_table,
+            metadata_index=metadata_index,
+        )
+
+        with self._lock:
+            self._drop(filename)
+            self._documents[filename] = document
+            self._version_checked[filename] = time.monotonic()
+            self._make_resident(document, text)
+
+        logging.info(
+            f"Stored {filename}: {len(chunks)} chunks, {len(text):,} text bytes "
+            f"(raw chunks {sum(lengths):,} bytes)"
+        )
+        return document
+
+    def get(self, filename: str) -> Optional[StoredDocument]:
+        """Look up a document, loading its manifest from disk if it is not known yet"""
+        with self._lock:
+            document = self._documents.get(filename)
+            version = self._shared_version(filename, document)
+            if version == REMOVED_VERSION:
+                self._drop(filename)
+                return None
+            if document is not None and version is not None and repr(document.timestamp) != version:
+                # Replaced by another worker since we loaded it
+                self._drop(filename)
+                document = None
+            if document is None:
+                document = self._load_manifest(filename)
+                if document is None:
+                    return None
+                self._documents[filename] = document
+            self._documents.move_to_end(filename)
+            return document
+
+    def _shared_version(self, filename: str, document: Optional[StoredDocument]) -> Optional[str]:
+        """Published version of a document, checked at most every version_check_interval for known ones"""
+        if self.shared_state is None:
+            return None
+        now = time.monotonic()
+        if document is not None and now - self._version_checked.get(filename, 0.0) < self.version_check_interval:
+            return None
+        self._version_checked[filename] = now
+        return self.shared_state.get(f"document_version:{filename}")
+
+    def __contains__(self, filename: str) -> bool:
+        return self.get(filename) is not None
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def filenames(self) -> List[str]:
+        with self._lock:
+            return list(self._documents.keys())
+
+    def full_text(self, filename: str) -> str:
+        """Return the document text, promoting it to resident memory"""
+        with self._lock:
+            document = self.get(filename)
+            if document is None:
+                return ""
+            record_cache_lookup("document_text", document.resident is not None)
+            if document.resident is None:
+                self._make_resident(document, self._read_range(document, 0, document.text_bytes))
+            return document.resident.decode("utf-8", errors="replace")
+
+    def chunk(self, filename: str, index: int) -> str:
+        """Return one chunk without loading a cold document into memory"""
+        with self._lock:
+            document = self.get(filename)
+            if document is None:
+                raise KeyError(filename)
+            start, length = document.chunk_offsets[index], document.chunk_lengths[index]
+            if document.resident is not None:
+                data = document.resident[start:start + length]
+            else:
+                data = self._read_range(document, start, length)
+        return data.decode("utf-8", errors="replace")
+
+    def chunks(self, filename: str) -> List[str]:
+        document = self.get(filename)
+        if document is None:
+            return []
+        return [self.chunk(filename, i) for i in range(document.chunk_count)]
+
+    def chunk_metadata(self, filename: str, index: int) -> dict:
+        document = self.get(filename)
+        if document is None:
+            raise KeyError(filename)
+        return document.metadata_table[document.metadata_index[index]]
+
+    def remove(self, filename: str) -> bool:
+        """Forget a document and delete its files"""
+        with self._lock:
+            self._drop(filename)
+            self._version_checked.pop(filename, None)
+        if self.shared_state is not None:
+            self.shared_state.set(f"document_version:{filename}", REMOVED_VERSION)
+        removed = False
+        for path in self._paths(filename):
+            if os.path.exists(path):
+                os.remove(path)
+                removed = True
+        return removed
+
+    def clear(self):
+        """Forget every document and delete all stored files"""
+        with self._lock:
+            for filename in list(self._documents.keys()):
+                self.remove(filename)
+            self._documents.clear()
+            self._resident_bytes = 0
+
+    def memory_usage(self) -> Dict:
+        """Report resident and on-disk size per document"""
+        with self._lock:
+            documents = {
+                filename: {
+                    "timestamp": document.timestamp,
+                    "chunks": document.chunk_count,
+                    "text_bytes": document.text_bytes,
+                    "raw_chunk_bytes": sum(document.chunk_lengths),
+                    "index_bytes": document.index_bytes,
+                    "metadata_entries": len(document.metadata_table),
+                    "resident": document.resident is not None,
+                    "resident_bytes": len(document.resident) if document.resident is not None else 0,
+                }
+                for filename, document in self._documents.items()
+            }
+            return {
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "resident_bytes": self._resident_bytes,
+                "documents": documents,
+            }
+
+    def _make_resident(self, document: StoredDocument, text: bytes):
+        if document.resident is None:
+            self._resident_bytes += len(text)
+        document.resident = text
+        self._documents.move_to_end(document.filename)
+        self._evict()
+
+    def _evict(self):
+        """Drop resident text of the least recently used documents until within budget"""
+        for filename, document in self._documents.items():
+            if self._resident_bytes <= self.memory_budget_bytes:
+                break
+            # Never evict the most recently used document, even if it alone exceeds the budget
+            if filename == next(reversed(self._documents)):
+                break
+            if document.resident is not None:
+                self._resident_bytes -= len(document.resident)
+                document.resident = None
+                logging.info(f"Evicted {filename} from memory ({document.text_bytes:,} bytes)")
+
+    def _drop(self, filename: str):
+        document = self._documents.pop(filename, None)
+        if document is not None and document.resident is not None:
+            self._resident_bytes -= len(document.resident)
+        if document is not None and document.mapped is not None:
+            document.mapped.close()
+            document.mapped = None
+
+    def _read_range(self, document: StoredDocument, start: int, length: int) -> bytes:
+        if length == 0:
+            return b""
+        if document.mapped is None:
+            # One mapping per loaded document, kept until it is dropped; the file is only replaced
+            # through _atomic_write, which leaves this mapping on the old contents
+            with open(document.text_path, "rb") as f:
+                document.mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return document.mapped[start:start + length]
+
+    def _load_manifest(self, filename: str) -> Optional[StoredDocument]:
+        text_path, manifest_path = self._paths(filename)
+        if not (os.path.exists(manifest_path) and os.path.exists(text_path)):
+            return None
+        try:
+            with open(manifest_path, "rb") as f:
+                manifest = json.loads(f.read())
+            offsets, lengths, metadata_index = array('Q'), array('I'), array('I')
+            offsets.frombytes(base64.b64decode(manifest["chunk_offsets"]))
+            lengths.frombytes(base64.b64decode(manifest["chunk_lengths"]))
+            metadata_index.frombytes(base64.b64decode(manifest["metadata_index"]))
+            return StoredDocument(
+                filename=manifest["filename"],
+                timestamp=manifest["timestamp"],
+                text_path=text_path,
+                text_bytes=manifest["text_bytes"],
+                chunk_offsets=offsets,
+                chunk_lengths=lengths,
+                metadata_table=manifest["metadata_table"],
+                metadata_index=metadata_index,
+            )
+        except Exception as e:
+            logging.error(f"Error loading stored document {filename}: {str(e)}")
+            return None
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+import re
+
+
+@dataclass(frozen=True)
+class QueryIntent:
+    """Structured routing decision for a single user query"""
+    is_generic: bool
+    is_question_generation: bool
+    requested_question_count: Optional[int]
+    is_comparison: bool
+    question_type: str
+    main_topic: str
+
+
+class IntentRouter:
+    """Compile every routing rule once and classify a query in a single pass"""
+
+    GENERIC_PATTERNS = [
+        # Question generation patterns
+        r'generate.*questions?.*(?:from|out of|about).*pdf',
+        r'create.*questions?.*(?:from|out of|about).*pdf',
+        r'make.*questions?.*(?:from|out of|about).*pdf',
+        r'list.*questions?.*(?:from|out of|about).*pdf',
+        r'(?:give|show).*questions?.*(?:from|out of|about).*pdf',
+        r'\d+\s+questions?.*(?:from|about|out of).*pdf',
+
+        # Main topic/content patterns
+        r'what.*(?:are|is).*(?:main|key|primary|important).*(?:topics?|subjects?|themes?|points?|ideas?|concepts?)',
+        r'what.*(?:are|is).*(?:main|key|primary|important).*(?:questions?|issues?|problems?)',
+        r'(?:main|key|primary|important).*(?:topics?|subjects?|themes?|points?|ideas?|concepts?)',
+        r'(?:main|key|primary|important).*(?:questions?|issues?|problems?)',
+
+        # Summary patterns
+        r'summarize.*(?:the|this).*pdf',
+        r'(?:give|provide).*summary.*(?:of|about).*pdf',
+        r'what.*(?:is|are).*(?:the|this).*pdf.*about',
+        r'(?:overview|summary).*(?:of|about).*(?:the|this).*pdf',
+
+        # Content analysis patterns
+        r'analyze.*(?:the|this).*pdf',
+        r'(?:analyze|examine).*(?:content|document)',
+        r'what.*(?:does|do).*(?:the|this).*pdf.*(?:discuss|cover|contain)',
+        r'(?:content|contents).*(?:of|in).*(?:the|this).*pdf',
+
+        # All/everything patterns
+        r'(?:all|everything).*(?:about|in).*(?:the|this).*pdf',
+        r'(?:complete|full|entire).*(?:content|analysis|overview)',
+
+        # Chapter/section patterns
+        r'(?:list|show|give).*(?:all|every).*(?:chapters?|sections?|parts?)',
+        r'what.*(?:chapters?|sections?|parts?).*(?:are|does).*(?:the|this).*pdf.*(?:have|contain)',
+
+        # Research/study patterns
+        r'research.*(?:questions?|objectives?|goals?)',
+        r'(?:study|research).*(?:focus|aim|purpose)',
+        r'(?:objectives?|goals?|aims?).*(?:of|in).*(?:the|this).*(?:study|research|paper)',
+
+        # Methodology patterns
+        r'(?:methodology|methods?).*(?:used|employed|applied)',
+        r'(?:how|what).*(?:methodology|methods?).*(?:was|were).*(?:used|employed)',
+
+        # Findings/results patterns
+        r'(?:findings|results|conclusions?).*(?:of|in).*(?:the|this).*(?:study|research|paper)',
+        r'what.*(?:findings|results|conclusions?).*(?:does|do).*(?:the|this).*(?:study|research|paper)',
+
+        # General content patterns
+        r'(?:discuss|cover|explain|describe).*(?:in|within).*(?:the|this).*pdf',
+        r'what.*(?:is|are).*(?:discussed|covered|explained|described).*(?:in|within).*(?:the|this).*pdf'
+    ]
+
+    GENERIC_KEYWORDS = [
+        'summarize', 'overview', 'summary', 'analyze', 'analysis', 'content', 'contents',
+        'main points', 'key points', 'important points', 'main topics', 'key topics',
+        'main ideas', 'key ideas', 'main concepts', 'key concepts', 'all about',
+        'everything about', 'complete analysis', 'full analysis', 'entire content',
+        'whole document', 'research questions', 'study objectives', 'research objectives',
+        'generate questions', 'create questions', 'make questions', 'list questions'
+    ]
+
+    COMPARISON_PATTERNS = [
+        r'compare.*with', r'analyze.*relationship', r'what.*difference',
+        r'how.*relate', r'connection.*between', r'impact.*of'
+    ]
+
+    # Same as the original `"generate" in query and "question" in query` check: both
+    # substrings, in either order ("generated questions" counts, "create questions" does not)
+    QUESTION_GENERATION_PATTERN = r'^(?=.*generate)(?=.*question)'
+
+    # Ordered by priority: the first type whose phrases occur in the query wins
+    QUESTION_TYPE_RULES = [
+        ("definition", ['what is', 'what are', 'define']),
+        ("procedure", ['how to', 'how do', 'how can']),
+        ("explanation", ['why', 'because', 'reason']),
+        ("temporal", ['when', 'date', 'time']),
+        ("location", ['where', 'location']),
+    ]
+
+    NUMBER_WORDS = {
+        'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+        'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'fifteen': 15,
+        'twenty': 20, 'thirty': 30, 'fifty': 50
+    }
+
+    STOP_WORDS = {'what', 'how', 'why', 'when', 'where', 'who', 'is', 'are', 'the', 'a', 'an'}
+
+    def __init__(self):
+        self._generic_re = re.compile('|'.join(f'(?:{p})' for p in self.GENERIC_PATTERNS))
+        self._generic_keyword_re = re.compile('|'.join(re.escape(k) for k in self.GENERIC_KEYWORDS))
+        self._comparison_re = re.compile('|'.join(f'(?:{p})' for p in self.COMPARISON_PATTERNS))
+        self._question_generation_re = re.compile(self.QUESTION_GENERATION_PATTERN, re.DOTALL)
+        self._question_count_re = re.compile(
+            r'\b(\d{1,3}|' + '|'.join(self.NUMBER_WORDS) + r')\s+(?:[\w-]+\s+){0,3}?questions?\b'
+        )
+        # One alternation with a named group per type; every hit is collected in a single scan
+        self._question_type_re = re.compile('|'.join(
+            f'(?P<{name}>' + '|'.join(re.escape(phrase) for phrase in phrases) + ')'
+            for name, phrases in self.QUESTION_TYPE_RULES
+        ))
+        self._question_type_priority = [name for name, _ in self.QUESTION_TYPE_RULES]
+
+    def classify(self, query: str) -> QueryIntent:
+        """Classify a query into a structured intent"""
+        query_lower = query.lower().strip()
+
+        is_question_generation = bool(self._question_generation_re.search(query_lower))
+        requested_question_count = None
+        if is_question_generation:
+            count_match = self._question_count_re.search(query_lower)
+            if count_match:
+                token = count_match.group(1)
+                requested_question_count = int(token) if token.isdigit() else self.NUMBER_WORDS[token]
+
+        is_generic = bool(
+            self._generic_re.search(query_lower) or self._generic_keyword_re.search(query_lower)
+        )
+
+        return QueryIntent(
+            is_generic=is_generic,
+            is_question_generation=is_question_generation,
+            requested_question_count=requested_question_count,
+            is_comparison=bool(self._comparison_re.search(query_lower)),
+            question_type=self._classify_question_type(query_lower),
+            main_topic=self._extract_main_topic(query_lower)
+        )
+
+    def _classify_question_type(self, query_lower: str) -> str:
+        """Pick the highest-priority question type found in the query"""
+        matched = {match.lastgroup for match in self._question_type_re.finditer(query_lower)}
+        for name in self._question_type_priority:
+            if name in matched:
+                return name
+        return "general"
+
+    def _extract_main_topic(self, query_lower: str) -> str:
+        """Return the first three non-stop-word keywords of the query"""
+        keywords = [word for word in query_lower.split() if word not in self.STOP_WORDS and len(word) > 2]
+        return ' '.join(keywords[:3])
+
+
+intent_router = IntentRouter()
+
+
+@lru_cache(maxsize=1024)
+def classify_intent(query: str) -> QueryIntent:
+    """Classify a query, reusing the result when the same query is routed again"""
+    return intent_router.classify(query)
@@ -0,0 +1,192 @@
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from metrics import registry
+
+hybrid_candidates = registry.counter(
+    "questgen_hybrid_candidates_total", "Fused retrieval candidates by the retrievers that found them",
+    labelnames=("found_by",)
+)
+
+# Kept out of lexical queries; exact terms, equation names and numbers are what BM25 is for
+STOP_WORDS = frozenset(
+    "a an and are as at be by can did do does for from has have how in is it its of on or that the this to "
+    "was were what when where which who why with about into explain describe tell me please".split()
+)
+_TERM_RE = re.compile(r"\w+(?:[.\-']\w+)*")
+
+
+@dataclass
+class LexicalHit:
+    text: str
+    metadata: Dict
+    score: float  # BM25, higher is better
+
+
+@dataclass
+class FusedCandidate:
+    """A chunk found by either retriever, shaped like a Qdrant hit (payload, score)"""
+    payload: Dict
+    score: Optional[float]  # dense cosine; None when only the lexical index found the chunk
+    fused_score: float = 0.0  # RRF, scaled so that first in both lists is 1.0
+    dense_rank: Optional[int] = None
+    lexical_rank: Optional[int] = None
+    lexical_score: Optional[float] = None
+
+
+def _chunk_key(metadata: Dict) -> Tuple[str, int]:
+    return metadata.get("filename", ""), metadata.get("chunk_index", 0)
+
+
+def build_match_query(query: str, max_terms: int = 32) -> str:
+    """FTS5 MATCH expression: OR of the query's quoted terms (quoting keeps FTS syntax out of user text)"""
+    terms = []
+    for term in _TERM_RE.findall(query.lower()):
+        if term not in STOP_WORDS and term not in terms:
+            terms.append(term)
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms[:max_terms])
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Hashable]], k: int = 60) -> Dict[Hashable, float]:
+    """RRF: each list adds 1 / (k + rank) for every key it ranks (rank from 1)"""
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return fused
+
+
+def fuse(dense: Sequence, lexical: Sequence[LexicalHit], k: int = 60,
+         limit: Optional[int] = None) -> List[FusedCandidate]:
+    """
+    Merge dense hits (objects with .payload and .score, best first) and
+    lexical hits by reciprocal rank fusion on (filename, chunk_index).
+    Ranks are fused rather than scores, since cosine and BM25 are not on
+    comparable scales.
+    """
+    candidates: Dict[Tuple[str, int], FusedCandidate] = {}
+    for rank, result in enumerate(dense, 1):
+        key = _chunk_key(result.payload.get("metadata", {}))
+        if key not in candidates:
+            candidates[key] = FusedCandidate(result.payload, result.score, dense_rank=rank)
+    for rank, hit in enumerate(lexical, 1):
+        key = _chunk_key(hit.metadata)
+        candidate = candidates.get(key)
+        if candidate is None:
+            candidate = candidates[key] = FusedCandidate({"page_content": hit.text, "metadata": hit.metadata}, None)
+        if candidate.lexical_rank is None:
+            candidate.lexical_rank = rank
+            candidate.lexical_score = hit.score
+
+    dense_keys = [key for key, candidate in candidates.items() if candidate.dense_rank is not None]
+    lexical_keys = [key for key, candidate in candidates.items() if candidate.lexical_rank is not None]
+    dense_keys.sort(key=lambda key: candidates[key].dense_rank)
+    lexical_keys.sort(key=lambda key: candidates[key].lexical_rank)
+    fused = reciprocal_rank_fusion([dense_keys, lexical_keys], k)
+    best = 2.0 / (k + 1)
+    found_by = {"dense": 0, "lexical": 0, "both": 0}
+    for key, candidate in candidates.items():
+        candidate.fused_score = fused[key] / best
+        if candidate.dense_rank and candidate.lexical_rank:
+            found_by["both"] += 1
+        else:
+            found_by["dense" if candidate.dense_rank else "lexical"] += 1
+    for label, count in found_by.items():
+        if count:
+            hybrid_candidates.inc(count, found_by=label)
+    ranked = sorted(
+        candidates.values(),
+        key=lambda candidate: (candidate.fused_score, candidate.score if candidate.score is not None else -1.0),
+        reverse=True
+    )
+    return ranked[:limit] if limit else ranked
+
+
+class LexicalIndex:
+    """
+    On-disk BM25 index of chunk text, kept in an SQLite FTS5 table next to
+    the dense vectors. It is updated one document at a time: re-indexing a
+    file replaces its rows, and removing it deletes them. Searches rank
+    with FTS5's built-in bm25().
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5(
+                    text,
+                    filename UNINDEXED,
+                    chunk_index UNINDEXED,
+                    metadata UNINDEXED,
+                    tokenize = 'unicode61 remove_diacritics 2'
+                )
+            ''')
+            # UNINDEXED FTS columns cannot be looked up by value; this maps documents to their rows
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS chunk_documents (
+                    chunk_rowid INTEGER PRIMARY KEY,
+                    filename TEXT NOT NULL
+                )
+            ''')
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_documents_filename ON chunk_documents (filename)")
+
+    def _delete(self, filename: str) -> int:
+        deleted = self._conn.execute('''
+            DELETE FROM chunks WHERE rowid IN (SELECT chunk_rowid FROM chunk_documents WHERE filename = ?)
+        ''', (filename,)).rowcount
+        self._conn.execute("DELETE FROM chunk_documents WHERE filename = ?", (filename,))
+        return deleted
+
+    def index_document(self, filename: str, texts: List[str], metadatas: List[Dict]) -> int:
+        """Replace the document's chunks in one transaction"""
+        with self._lock, self._conn:
+            self._delete(filename)
+            for i, (text, metadata) in enumerate(zip(texts, metadatas)):
+                rowid = self._conn.execute(
+                    "INSERT INTO chunks (text, filename, chunk_index, metadata) VALUES (?, ?, ?, ?)",
+                    (text, filename, metadata.get("chunk_index", i), json.dumps(metadata))
+                ).lastrowid
+                self._conn.execute("INSERT INTO chunk_documents (chunk_rowid, filename) VALUES (?, ?)", (rowid, filename))
+        return len(texts)
+
+    def remove_document(self, filename: str) -> int:
+        with self._lock, self._conn:
+            return self._delete(filename)
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM chunk_documents")
+
+    def search(self, query: str, limit: int = 30) -> List[LexicalHit]:
+        match = build_match_query(query)
+        if not match:
+            return []
+        with self._lock:
+            rows = self._conn.execute('''
+                SELECT text, metadata, bm25(chunks) AS rank FROM chunks
+                WHERE chunks MATCH ?
+                ORDER BY rank LIMIT ?
+            ''', (match, limit)).fetchall()
+        # bm25() is negated so that better matches sort first
+        return [LexicalHit(text, json.loads(metadata), -rank) for text, metadata, rank in rows]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            chunks, documents = self._conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT filename) FROM chunk_documents"
+            ).fetchone()
+        return {"chunks": chunks, "documents": documents}
@@ -0,0 +1,154 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from metrics import registry
+
+loop_lag_seconds = registry.histogram(
+    "questgen_event_loop_lag_seconds", "Delay between when the loop sampler was due to wake and when it ran",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+loop_blocks = registry.counter(
+    "questgen_event_loop_blocked_total", "Times one callback held the event loop past the block threshold"
+)
+
+
+def _percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class LoopMonitor:
+    """
+    Samples event-loop lag: a task sleeps `interval` seconds and records how
+    late it wakes up. In debug mode a watchdog thread also notices when the
+    loop has not run the sampler for `block_threshold` seconds, and logs the
+    loop thread's stack with the path of the request being served, which
+    points at the blocking call itself.
+    """
+
+    def __init__(self, interval: float = 0.1, block_threshold: float = 0.25, debug: bool = False,
+                 window: int = 3000, recent_blocks: int = 20):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.debug = debug
+        self._samples = deque(maxlen=window)
+        self._recent_blocks = deque(maxlen=recent_blocks)
+        self._request_paths: Dict[asyncio.Task, str] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._heartbeat = time.monotonic()
+        self.blocked = 0
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.create_task(self._sample())
+        if self.debug:
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def _sample(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - start - self.interval)
+            self._heartbeat = time.monotonic()
+            self._samples.append(lag)
+            loop_lag_seconds.observe(lag)
+            if lag >= self.block_threshold:
+                loop_blocks.inc()
+                self.blocked += 1
+                if self.debug:
+                    logging.warning(f"Event loop was blocked for {lag * 1000:.0f}ms")
+
+    def _watch(self):
+        reported = False
+        while not self._stopping.wait(self.block_threshold / 4):
+            stalled = time.monotonic() - self._heartbeat - self.interval
+            if stalled < self.block_threshold:
+                reported = False
+                continue
+            if reported:
+                continue
+            reported = True
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "(loop thread not found)"
+            task = asyncio.current_task(self._loop)
+            path = self._request_paths.get(task, "background") if task is not None else "loop callback"
+            self._recent_blocks.append({
+                "detected_at": time.time(),
+                "stalled_ms": round(stalled * 1000, 1),
+                "path": path,
+                "task": task.get_name() if task is not None else None,
+                "stack": stack,
+            })
+            logging.warning(f"Event loop blocked for {stalled * 1000:.0f}ms+ while serving {path}:\n{stack}")
+
+    @contextmanager
+    def track_request(self, path: str):
+        """Attribute loop stalls in the current task to a request path"""
+        task = asyncio.current_task()
+        self._request_paths[task] = path
+        try:
+            yield
+        finally:
+            self._request_paths.pop(task, None)
+
+    async def stop(self):
+        self._stopping.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+
+    def recent_blocks(self) -> List[Dict]:
+        return list(self._recent_blocks)[::-1]
+
+    def stats(self) -> Dict:
+        samples = list(self._samples)
+        return {
+            "interval_seconds": self.interval,
+            "block_threshold_seconds": self.block_threshold,
+            "debug": self.debug,
+            "samples": len(samples),
+            "lag_p50_ms": _percentile(samples, 0.50) * 1000,
+            "lag_p95_ms": _percentile(samples, 0.95) * 1000,
+            "lag_p99_ms": _percentile(samples, 0.99) * 1000,
+            "lag_max_ms": max(samples, default=0.0) * 1000,
+            "blocked": self.blocked,
+        }
+
+
+class LoopMonitorMiddleware:
+    """
+    Pure ASGI middleware tagging each request's task with its path. Unlike
+    BaseHTTPMiddleware it does not hand the request to a child task, so the
+    handler runs in the task it registers.
+    """
+
+    def __init__(self, app, monitor: LoopMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        with self.monitor.track_request(f"{scope.get('method', '')} {scope.get('path', '')}"):
+            return await self.app(scope, receive, send)
@@ -7,7 +7,7 @@ import uvicorn # type: ignore
 import os
 import fitz  # PyMuPDF
 import logging
-from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
 from fastapi import FastAPI, HTTPException, Depends, Request, Response, Cookie, status, File, UploadFile # type: ignore
 import asyncio
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
@@ -16,21 +16,33 @@ from functools import partial
 import time
 import sqlite3
 from datetime import datetime, timedelta
-from passlib.context import CryptContext
 from contextlib import asynccontextmanager
 import tempfile
 import shutil
 import gc
 import re
 import random
-from docx import Document
-from docx.shared import Inches
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.shared import OxmlElement, qn
 import io
 
 
-from qdrant_engine import QdrantIndex
+from qdrant_engine import qdrant_index
+from resources import resources
+from warmup import build_warm_up
+from intent_router import classify_intent
+from db import Database, decode_cursor, encode_cursor
+from session_cache import SessionCache
+from write_behind import WriteBehindQueue
+from conversation_memory import ConversationMemory, count_tokens
+from conversation_export import EXPORT_FORMATS, export_header
+from password_hashing import PasswordHasher, ConcurrencyLimiter, ConcurrencyLimitExceeded
+import metrics
+from tracing import OTLPHttpExporter, Tracer, span
+from loop_monitor import LoopMonitor, LoopMonitorMiddleware
+from admission import AdmissionController, AdmissionRejected
+from deadlines import DeadlineExceeded, DeadlineMiddleware, check_deadline, current_deadline, hedged
+from rate_limit import (CREATE_LLM_USAGE_SQL, INSERT_LLM_USAGE_SQL, LLM_USAGE_INDEXES, RateLimited,
+                        UsageScope, UserRateLimiter, report_llm_usage)
+from metrics import executor_queue_depth, in_context, llm_ttft_seconds, set_request_labels, stage_seconds, stage_timer
 from config import settings
 import os
 import sqlite3
@@ -45,9 +57,6 @@ from fastapi import FastAPI, HTTPException, Depends, Request, Response, status
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
-from passlib.context import CryptContext
-from docx import Document
-from docx.enum.text import WD_ALIGN_PARAGRAPH
 
 # Logging Configuration
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -58,11 +67,24 @@ SECRET_KEY = getattr(settings, '772jbCe6yK1dqYViLbp5twgUkAIXncCR', "00UlaD9ESbxH
 SESSION_EXPIRE_MINUTES = 1440  # 24 hours
 COOKIE_NAME = "session_token"
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing runs on a bounded worker pool; login/register concurrency is capped
+password_hasher = PasswordHasher(rounds=settings.bcrypt_rounds, max_workers=settings.password_hash_workers)
+auth_limiter = ConcurrencyLimiter(settings.login_max_concurrency)
 
 # Database Configuration
 DATABASE_PATH = "app/database/users.db"
+db = Database(DATABASE_PATH, pool_size=settings.db_pool_size)
+
+# State every worker must agree on (session invalidations, most recent PDF, document versions)
+shared_state = qdrant_index.shared_state
+
+# Authenticated sessions keyed by token hash, so most requests skip the auth query
+session_cache = SessionCache(
+    max_entries=settings.session_cache_max_entries,
+    ttl_seconds=settings.session_cache_ttl_seconds,
+    shared_state=shared_state,
+    sync_interval=settings.session_sync_interval_seconds
+)
 
 # Pydantic Models
 class UserCreate(BaseModel):
@@ -96,6 +118,13 @@ class ComprehensiveQuery(BaseModel):
     generate_comprehensive: bool = True
     max_tokens: int = 2000
 
+# History reads filter by user and order newest first; the rowid (id) is appended
+# to every index, so both also cover the (timestamp, id) keyset tie-break.
+CONVERSATION_INDEXES = {
+    "idx_conversations_user_timestamp": "CREATE INDEX IF NOT EXISTS idx_conversations_user_timestamp ON conversations (user_id, timestamp)",
+    "idx_conversations_timestamp": "CREATE INDEX IF NOT EXISTS idx_conversations_timestamp ON conversations (timestamp)",
+}
+
 def check_and_migrate_database():
     """Check if database schema needs migration and update if necessary"""
     conn = sqlite3.connect(DATABASE_PATH)
@@ -132,6 +161,14 @@ def check_and_migrate_database():
             ''')
             needs_commit = True
 
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'conversations'")
+        existing_indexes = {row[0] for row in cursor.fetchall()}
+        for index_name, create_sql in CONVERSATION_INDEXES.items():
+            if index_name not in existing_indexes:
+                logging.info(f"{index_name} index missing, creating it...")
+                cursor.execute(create_sql)
+                needs_commit = True
+
         if needs_commit:
             conn.commit()
             logging.info("Database schema updated successfully")
@@ -204,6 +241,27 @@ def init_database():
         )
     ''')
     
+    # Rolling per-user, per-document conversation memory
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS conversation_memory (
+            user_id INTEGER NOT NULL,
+            document TEXT NOT NULL,
+            summary TEXT NOT NULL DEFAULT '',
+            last_query TEXT,
+            last_response TEXT,
+            turn_count INTEGER NOT NULL DEFAULT 0,
+            recent_turn_tokens TEXT NOT NULL DEFAULT '[]',
+            updated_at REAL,
+            PRIMARY KEY (user_id, document),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    
+    # LLM token usage ledger, one row per metered request
+    cursor.execute(CREATE_LLM_USAGE_SQL)
+    for create_index_sql in LLM_USAGE_INDEXES:
+        cursor.execute(create_index_sql)
+    
     conn.commit()
     conn.close()
     logging.info("Database initialized successfully")
@@ -211,174 +269,59 @@ def init_database():
     # Run migration check after initialization
     check_and_migrate_database()
     
-def update_current_file_for_session(session_token: str, filename: str):
-    conn = get_db_connection()
-    cursor = conn.cursor()
+async def update_current_file_for_session(session_token: str, filename: str):
+    """Update the current working PDF file for the session."""
     try:
         token_hash = hash_session_token(session_token)
-        cursor.execute('''
-            UPDATE user_sessions SET current_file = ?
-            WHERE session_token = ?
-        ''', (filename, token_hash))
-        conn.commit()
-    finally:
-        conn.close()
+        await db.execute(UPDATE_CURRENT_FILE_SQL, (filename, token_hash))
+        session_cache.update(token_hash, current_file=filename)
+        logging.info(f"Session updated with current_file = {filename}")
+    except Exception as e:
+        logging.error(f"Failed to update current file for session: {str(e)}")
 
-def get_current_file_for_session(session_token: str) -> Optional[str]:
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        token_hash = hash_session_token(session_token)
-        cursor.execute('''
-            SELECT current_file FROM user_sessions
-            WHERE session_token = ?
-        ''', (token_hash,))
-        result = cursor.fetchone()
-        return result[0] if result and result[0] else None
-    finally:
-        conn.close()
+async def get_current_file_for_session(session_token: str) -> Optional[str]:
+    token_hash = hash_session_token(session_token)
+    # Read through to the database: another worker may have changed it, and cached sessions
+    # are not invalidated on current-file changes
+    result = await db.fetchone(SELECT_CURRENT_FILE_SQL, (token_hash,))
+    return result["current_file"] if result and result["current_file"] else None
 
     
 def classify_question_type(query: str) -> str:
     """Classify the type of question being asked."""
-    query_lower = query.lower()
-    if any(word in query_lower for word in ['what is', 'what are', 'define']):
-        return "definition"
-    elif any(word in query_lower for word in ['how to', 'how do', 'how can']):
-        return "procedure"
-    elif any(word in query_lower for word in ['why', 'because', 'reason']):
-        return "explanation"
-    elif any(word in query_lower for word in ['when', 'date', 'time']):
-        return "temporal"
-    elif any(word in query_lower for word in ['where', 'location']):
-        return "location"
-    else:
-        return "general"
-
+    return classify_intent(query).question_type
 
-def create_user_session(user_id: int) -> str:
-    """Create a new session for the user"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # Generate a secure random session token
-        session_token = secrets.token_urlsafe(32)
-        
-        # Calculate expiration time (assuming SESSION_EXPIRE_MINUTES is defined)
-        SESSION_EXPIRE_MINUTES = 1440  # 24 hours, adjust as needed
-        expires_at = datetime.now() + timedelta(minutes=SESSION_EXPIRE_MINUTES)
-        
-        # Insert new session
-        cursor.execute('''
-            INSERT INTO user_sessions (user_id, session_token, expires_at)
-            VALUES (?, ?, ?)
-        ''', (user_id, session_token, expires_at))
-        
-        conn.commit()
-        logging.info(f"Created session for user {user_id}")
-        return session_token
-        
-    except sqlite3.IntegrityError as e:
-        logging.error(f"Session creation error: {e}")
-        # If token collision (very unlikely), generate a new one
-        conn.close()
-        return create_user_session(user_id)
-    except Exception as e:
-        logging.error(f"Unexpected error creating session: {e}")
-        raise
-    finally:
-        conn.close()
 
-def get_user_from_session(session_token: str):
-    """Get user data from session token"""
-    print("session token is here ",  session_token)
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            SELECT u.id, u.username, u.email, u.full_name, u.is_active, u.created_at
-            FROM users u
-            JOIN user_sessions s ON u.id = s.user_id
-            WHERE s.session_token = ? 
-            AND s.expires_at > CURRENT_TIMESTAMP
-        ''', (session_token,))
-        
-        user = cursor.fetchone()
-        print("USer is here ", user)
-        if user:
-            return dict(user)
-        return None
-        
-    except Exception as e:
-        logging.error(f"Error getting user from session: {e}")
-        return None
-    finally:
-        conn.close()
-
-def cleanup_expired_sessions():
-    """Remove expired sessions"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute('''
-            DELETE FROM user_sessions 
-            WHERE expires_at < CURRENT_TIMESTAMP
-        ''')
-        
-        deleted_count = cursor.rowcount
-        conn.commit()
-        
-        if deleted_count > 0:
-            logging.info(f"Cleaned up {deleted_count} expired sessions")
-            
-    except Exception as e:
-        logging.error(f"Error cleaning up sessions: {e}")
-    finally:
-        conn.close()
-
-def delete_user_session(session_token: str):
+async def delete_user_session(session_token: str):
     """Delete a specific session (for logout)"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.cursor()
-    
     try:
-        cursor.execute('''
-            DELETE FROM user_sessions 
-            WHERE session_token = ?
-        ''', (session_token,))
-        
-        conn.commit()
+        await invalidate_session(session_token)
         logging.info("Session deleted successfully")
-        
     except Exception as e:
         logging.error(f"Error deleting session: {e}")
-    finally:
-        conn.close()
 
 # Add this to your main.py startup
-def startup_database():
+async def startup_database():
     """Initialize database and run migrations on startup"""
     init_database()
-    cleanup_expired_sessions()  # Clean up any expired sessions on startup
-
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    await cleanup_expired_sessions()  # Clean up any expired sessions on startup
 
 # Password utilities
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify password against hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     """Hash password"""
-    return pwd_context.hash(password)
+    return await password_hasher.hash(password)
+
+def auth_rate_limited() -> HTTPException:
+    """Fast rejection used when the password hashing pool is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+        detail="Too many concurrent sign-in attempts. Please retry shortly.",
+        headers={"Retry-After": "1"}
+    )
 
 # Session utilities
 def create_session_token() -> str:
@@ -393,255 +336,300 @@ def verify_session_token(token: str, stored_hash: str) -> bool:
     """Verify session token against stored hash"""
     return hash_session_token(token) == stored_hash
 
+# SQL used on the request path. Kept as constants so every pooled connection
+# reuses the same prepared statements from its statement cache.
+SELECT_USER_BY_SESSION_SQL = '''
+    SELECT u.*, s.expires_at, s.current_file
+    FROM users u
+    JOIN user_sessions s ON u.id = s.user_id
+    WHERE s.session_token = ? AND s.expires_at > ? AND u.is_active = TRUE
+'''
+SELECT_CURRENT_FILE_SQL = "SELECT current_file FROM user_sessions WHERE session_token = ?"
+UPDATE_CURRENT_FILE_SQL = "UPDATE user_sessions SET current_file = ? WHERE session_token = ?"
+INSERT_SESSION_SQL = "INSERT INTO user_sessions (user_id, session_token, expires_at) VALUES (?, ?, ?)"
+DELETE_SESSION_SQL = "DELETE FROM user_sessions WHERE session_token = ?"
+DELETE_USER_SESSIONS_SQL = "DELETE FROM user_sessions WHERE user_id = ?"
+DELETE_EXPIRED_SESSIONS_SQL = "DELETE FROM user_sessions WHERE expires_at < ?"
+SELECT_USER_BY_USERNAME_SQL = "SELECT * FROM users WHERE username = ?"
+INSERT_CONVERSATION_SQL = "INSERT INTO conversations (user_id, query, response) VALUES (?, ?, ?)"
+SELECT_USER_CONVERSATIONS_SQL = '''
+    SELECT query, response, timestamp FROM conversations
+    WHERE user_id = ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+SELECT_ALL_CONVERSATIONS_SQL = '''
+    SELECT query, response, timestamp FROM conversations
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+COUNT_USER_CONVERSATIONS_SQL = "SELECT COUNT(*) AS total FROM conversations WHERE user_id = ?"
+SELECT_CONVERSATION_PAGE_SQL = '''
+    SELECT id, query, response, timestamp FROM conversations
+    WHERE user_id = ?
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+SELECT_CONVERSATION_PAGE_AFTER_SQL = '''
+    SELECT id, query, response, timestamp FROM conversations
+    WHERE user_id = ? AND (timestamp, id) < (?, ?)
+    ORDER BY timestamp DESC, id DESC
+    LIMIT ?
+'''
+
 # Database operations
-def create_user(user_data: UserCreate) -> dict:
+async def create_user(user_data: UserCreate) -> dict:
     """Create a new user in database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
+    # Hash password before taking a database connection
+    hashed_password = await get_password_hash(user_data.password)
+
+    def _create_user(conn):
+        cursor = conn.cursor()
         # Check if user already exists
-        cursor.execute("SELECT id FROM users WHERE username = ? OR email = ?", 
+        cursor.execute("SELECT id FROM users WHERE username = ? OR email = ?",
                       (user_data.username, user_data.email))
         if cursor.fetchone():
-            raise HTTPException(
-                status_code=400,
-                detail="Username or email already registered"
-            )
-        
-        # Hash password and create user
-        hashed_password = get_password_hash(user_data.password)
-        cursor.execute('''
-            INSERT INTO users (username, email, full_name, hashed_password)
-            VALUES (?, ?, ?, ?)
-        ''', (user_data.username, user_data.email, user_data.full_name, hashed_password))
-        
+            return None
+
+        with conn:
+            cursor.execute('''
+                INSERT INTO users (username, email, full_name, hashed_password)
+                VALUES (?, ?, ?, ?)
+            ''', (user_data.username, user_data.email, user_data.full_name, hashed_password))
         user_id = cursor.lastrowid
-        conn.commit()
-        
+
         # Fetch created user
         cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
-        user = cursor.fetchone()
-        
-        return dict(user)
-        
+        return dict(cursor.fetchone())
+
+    try:
+        user = await db.run(_create_user)
     except sqlite3.IntegrityError:
+        user = None
+
+    if user is None:
         raise HTTPException(
             status_code=400,
             detail="Username or email already registered"
         )
-    finally:
-        conn.close()
+    return user
 
-def authenticate_user(username: str, password: str):
+async def authenticate_user(username: str, password: str):
     """Authenticate user credentials"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
-        
-        if not user:
-            return False
-        
-        if not verify_password(password, user['hashed_password']):
-            return False
-        
-        return dict(user)
-        
-    finally:
-        conn.close()
+    user = await db.fetchone(SELECT_USER_BY_USERNAME_SQL, (username,))
+
+    if not user:
+        return False
+
+    if not await verify_password(password, user['hashed_password']):
+        return False
+
+    return user
 
-def get_user_by_username(username: str):
+async def get_user_by_username(username: str):
     """Get user by username"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("SELECT * FROM users WHERE username = ? AND is_active = TRUE", (username,))
-        user = cursor.fetchone()
-        return dict(user) if user else None
-    finally:
-        conn.close()
+    return await db.fetchone("SELECT * FROM users WHERE username = ? AND is_active = TRUE", (username,))
 
-def create_user_session(user_id: int) -> str:
+async def create_user_session(user_id: int) -> str:
     """Create a new session for user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        # Generate session token
-        session_token = create_session_token()
-        token_hash = hash_session_token(session_token)
-        expires_at = datetime.utcnow() + timedelta(minutes=SESSION_EXPIRE_MINUTES)
-        
-        # Store session in database
-        cursor.execute('''
-            INSERT INTO user_sessions (user_id, session_token, expires_at)
-            VALUES (?, ?, ?)
-        ''', (user_id, token_hash, expires_at))
-        conn.commit()
-        
-        return session_token
-        
-    finally:
-        conn.close()
+    # Generate session token
+    session_token = create_session_token()
+    token_hash = hash_session_token(session_token)
+    expires_at = datetime.utcnow() + timedelta(minutes=SESSION_EXPIRE_MINUTES)
+
+    # Store session in database
+    await db.execute(INSERT_SESSION_SQL, (user_id, token_hash, expires_at))
+    return session_token
 
-def get_user_by_session(session_token: str):
+async def get_user_by_session(session_token: str):
     """Get user by session token"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        token_hash = hash_session_token(session_token)
-        
-        cursor.execute('''
-            SELECT u.*, s.expires_at
-            FROM users u
-            JOIN user_sessions s ON u.id = s.user_id
-            WHERE s.session_token = ? AND s.expires_at > ? AND u.is_active = TRUE
-        ''', (token_hash, datetime.utcnow()))
-        
-        result = cursor.fetchone()
-        return dict(result) if result else None
-        
-    finally:
-        conn.close()
+    token_hash = hash_session_token(session_token)
+    user = session_cache.get(token_hash)
+    if user is not None:
+        return user
+    generation = session_cache.generation
+    user = await db.fetchone(SELECT_USER_BY_SESSION_SQL, (token_hash, datetime.utcnow()))
+    if user:
+        session_cache.put(token_hash, user, generation)
+    return user
 
-def invalidate_session(session_token: str):
+async def invalidate_session(session_token: str):
     """Invalidate a session"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+    token_hash = hash_session_token(session_token)
+    # Delete first: a concurrent lookup that read the row before this bumps the cache generation
+    # and so cannot re-cache it
+    cursor = await db.execute(DELETE_SESSION_SQL, (token_hash,))
+    session_cache.invalidate(token_hash)
+    return cursor.rowcount > 0
+
+async def invalidate_all_user_sessions(user_id: int):
+    """Invalidate all sessions for a user"""
+    cursor = await db.execute(DELETE_USER_SESSIONS_SQL, (user_id,))
+    session_cache.invalidate_user(user_id)
+    return cursor.rowcount
+
+# Conversation rows are batched by a background flusher instead of one transaction per response
+conversation_writer = WriteBehindQueue(
+    db,
+    INSERT_CONVERSATION_SQL,
+    max_size=settings.conversation_queue_max_size,
+    batch_size=settings.conversation_batch_size,
+    flush_interval=settings.conversation_flush_interval_ms / 1000,
+    durability=settings.conversation_write_durability
+)
+
+# Per-user request/LLM-token buckets and quotas; usage rows are written behind
+usage_writer = WriteBehindQueue(
+    db,
+    INSERT_LLM_USAGE_SQL,
+    max_size=settings.conversation_queue_max_size,
+    batch_size=settings.conversation_batch_size,
+    flush_interval=settings.conversation_flush_interval_ms / 1000
+)
+# Each worker process holds its own buckets; split the configured limits between them
+worker_processes = max(1, settings.api_workers)
+rate_limiter = UserRateLimiter(
+    usage_writer,
+    requests_per_minute=settings.rate_limit_requests_per_minute / worker_processes,
+    request_burst=max(1, settings.rate_limit_request_burst // worker_processes),
+    llm_tokens_per_minute=settings.rate_limit_llm_tokens_per_minute / worker_processes,
+    llm_token_burst=max(1, settings.rate_limit_llm_token_burst // worker_processes),
+    daily_token_quota=settings.rate_limit_daily_token_quota,
+    monthly_token_quota=settings.rate_limit_monthly_token_quota
+)
+
+def rate_limited(e: RateLimited) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e),
+                         headers={"Retry-After": str(e.retry_after)})
+
+def reserve_llm_tokens(usage: UsageScope, estimated_tokens: int):
+    """Take the request's estimated LLM tokens from the user's bucket and quotas"""
     try:
-        token_hash = hash_session_token(session_token)
-        cursor.execute("DELETE FROM user_sessions WHERE session_token = ?", (token_hash,))
-        conn.commit()
-        return cursor.rowcount > 0
-    finally:
-        conn.close()
+        rate_limiter.reserve(usage, estimated_tokens)
+    except RateLimited as e:
+        raise rate_limited(e)
+
+# Separate concurrency budgets so uploads and background summaries can't starve queries
+admission = AdmissionController()
+for pool_name in ("interactive", "ingestion", "background"):
+    admission.add_pool(
+        pool_name,
+        max_concurrency=getattr(settings, f"admission_{pool_name}_concurrency"),
+        max_queue=getattr(settings, f"admission_{pool_name}_queue"),
+        max_wait_seconds=getattr(settings, f"admission_{pool_name}_max_wait_seconds")
+    )
 
-def invalidate_all_user_sessions(user_id: int):
-    """Invalidate all sessions for a user"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+def admission_slot(pool_name: str):
+    """Route dependency holding a slot in an admission pool for the whole request"""
+    async def dependency():
+        pool = admission.pool(pool_name)
+        try:
+            admitted_at = await pool.acquire(current_deadline())
+        except AdmissionRejected as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+        try:
+            yield
+        finally:
+            pool.release(admitted_at)
+    return dependency
+
+async def summarize_exchange(user_id: int, previous_summary: str, query: str, response: str, max_tokens: int) -> str:
+    """Fold one Q/A exchange into the running conversation summary, billing the call to the user"""
+    client = resources.get("openai_async_client")
+    model = settings.conversation_summary_model
+    messages = [
+        {"role": "system", "content": (
+            "You maintain a concise running summary of a study conversation about a document. "
+            "Keep topics covered, facts established and questions already generated. "
+            f"Reply with the updated summary only, at most {max_tokens} tokens."
+        )},
+        {"role": "user", "content": (
+            f"Current summary:\n{previous_summary or '(empty)'}\n\n"
+            f"New exchange:\nQ: {query}\nA: {response}"
+        )}
+    ]
+    route = qdrant_index.model_router.fixed(model, "conversation_summary")
+    # Counted in the user's ledger, quotas and token bucket like their requests, but never refused
+    usage = rate_limiter.open_background(user_id, "conversation_memory")
     try:
-        cursor.execute("DELETE FROM user_sessions WHERE user_id = ?", (user_id,))
-        conn.commit()
-        return cursor.rowcount
+        # A rejection surfaces as a summarizer failure, which falls back to the extractive summary
+        async with admission.pool("background").slot():
+            start = time.perf_counter()
+            result = await client.chat.completions.create(
+                model=model,
+                messages=messages,
+                max_tokens=max_tokens,
+                temperature=0.0
+            )
+            seconds = time.perf_counter() - start
+        summary = result.choices[0].message.content
+        if result.usage is not None:
+            tokens = (result.usage.prompt_tokens, result.usage.completion_tokens)
+        else:
+            tokens = (sum(count_tokens(message["content"]) for message in messages), count_tokens(summary or ""))
+        report_llm_usage(model, *tokens)
+        qdrant_index.model_router.record(route, model, seconds, *tokens)
     finally:
-        conn.close()
+        await rate_limiter.close(usage)
+    return summary
+
+# Summary + last turn per (user, document), replacing the raw last-5 transcript in prompts
+conversation_memory = ConversationMemory(
+    db,
+    summarizer=summarize_exchange,
+    budget_tokens=settings.conversation_memory_budget_tokens,
+    summary_max_tokens=settings.conversation_summary_max_tokens
+)
 
 # Add this function to store conversations
-def store_conversation(user_id: int, query: str, response: str):
-    """Store conversation in database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def store_conversation(user_id: int, query: str, response: str):
+    """Queue a conversation for the write-behind flusher"""
     try:
-        cursor.execute('''
-            INSERT INTO conversations (user_id, query, response)
-            VALUES (?, ?, ?)
-        ''', (user_id, query, response))
-        conn.commit()
+        await conversation_writer.submit((user_id, query, response))
     except Exception as e:
         logging.error(f"Error storing conversation: {str(e)}")
-    finally:
-        conn.close()
         
 # Add this function to get conversation history
-def get_conversation_history(user_id: int = None, limit: int = 100):
+async def get_conversation_history(user_id: int = None, limit: int = 100):
     """Get conversation history from database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     try:
         if user_id:
-            cursor.execute('''
-                SELECT query, response, timestamp FROM conversations 
-                WHERE user_id = ? 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (user_id, limit))
-        else:
-            cursor.execute('''
-                SELECT query, response, timestamp FROM conversations 
-                ORDER BY timestamp DESC 
-                LIMIT ?
-            ''', (limit,))
-        
-        conversations = cursor.fetchall()
-        return [dict(conv) for conv in conversations]
+            return await db.fetchall(SELECT_USER_CONVERSATIONS_SQL, (user_id, limit))
+        return await db.fetchall(SELECT_ALL_CONVERSATIONS_SQL, (limit,))
     except Exception as e:
         logging.error(f"Error getting conversation history: {str(e)}")
         return []
-    finally:
-        conn.close()
 
-# Function to create Word document with conversations
-def create_conversation_document(conversations: list, user_name: str = "User"):
-    """Create a Word document with conversation history"""
-    doc = Document()
-    
-    # Add title
-    title = doc.add_heading('Conversation History', 0)
-    title.alignment = WD_ALIGN_PARAGRAPH.CENTER
-    
-    # Add metadata
-    doc.add_paragraph(f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    doc.add_paragraph(f"User: {user_name}")
-    doc.add_paragraph(f"Total Conversations: {len(conversations)}")
-    doc.add_paragraph("=" * 50)
-    
-    # Add each conversation
-    for i, conv in enumerate(conversations, 1):
-        # Add conversation number
-        conv_heading = doc.add_heading(f'Conversation {i}', level=1)
-        
-        # Add timestamp
-        timestamp = conv.get('timestamp', 'Unknown')
-        if isinstance(timestamp, str):
-            try:
-                timestamp = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            except:
-                pass
-        
-        doc.add_paragraph(f"Time: {timestamp}")
-        
-        # Add query
-        query_para = doc.add_paragraph()
-        query_run = query_para.add_run("Query: ")
-        query_run.bold = True
-        cleaned_query = clean_text_for_docx(conv.get('query', 'No query available'))
-        query_para.add_run(cleaned_query)
-        # query_para.add_run(conv.get('query', 'No query available'))
-        
-        # Add response
-        response_para = doc.add_paragraph()
-        response_run = response_para.add_run("Response: ")
-        response_run.bold = True
-        cleaned_response = clean_text_for_docx(conv.get('response', 'No response available'))
-        response_para.add_run(cleaned_response)
-        
-        # Add separator
-        doc.add_paragraph("-" * 50)
-    
-    return doc
-
-def cleanup_expired_sessions():
+async def get_conversation_page(user_id: int, limit: int = 20, cursor: Optional[str] = None):
+    """Newest-first page of a user's conversations with an opaque cursor for the next page"""
+    if cursor:
+        timestamp, conversation_id = decode_cursor(cursor)
+        rows = await db.fetchall(SELECT_CONVERSATION_PAGE_AFTER_SQL, (user_id, timestamp, conversation_id, limit + 1))
+    else:
+        rows = await db.fetchall(SELECT_CONVERSATION_PAGE_SQL, (user_id, limit + 1))
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["timestamp"], rows[-1]["id"])
+    return rows, next_cursor
+
+async def iter_user_conversations(user_id: int, limit: int, page_size: int = 200):
+    """Yield a user's conversations newest first, one keyset page in memory at a time"""
+    cursor = None
+    remaining = limit
+    while remaining > 0:
+        rows, cursor = await get_conversation_page(user_id, min(page_size, remaining), cursor)
+        for row in rows:
+            yield row
+        remaining -= len(rows)
+        if not cursor:
+            return
+
+async def cleanup_expired_sessions():
     """Clean up expired sessions"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    try:
-        cursor.execute("DELETE FROM user_sessions WHERE expires_at < ?", (datetime.utcnow(),))
-        conn.commit()
-        logging.info(f"Cleaned up {cursor.rowcount} expired sessions")
-    finally:
-        conn.close()
+    cursor = await db.execute(DELETE_EXPIRED_SESSIONS_SQL, (datetime.utcnow(),))
+    logging.info(f"Cleaned up {cursor.rowcount} expired sessions")
 
 # Dependency for protected routes
 async def get_current_user(session_token: str = Cookie(None, alias=COOKIE_NAME)):
@@ -654,7 +642,7 @@ async def get_current_user(session_token: str = Cookie(None, alias=COOKIE_NAME))
             detail="No session token found"
         )
     
-    user = get_user_by_session(session_token)
+    user = await get_user_by_session(session_token)
     if not user:
         print("no user with session found")
         raise HTTPException(
@@ -663,6 +651,26 @@ async def get_current_user(session_token: str = Cookie(None, alias=COOKIE_NAME))
         )
     
     return user
+
+ADMIN_USERNAMES = {name.strip() for name in settings.admin_usernames.split(",") if name.strip()}
+
+async def get_admin_user(current_user: dict = Depends(get_current_user)):
+    """Current user, if listed in ADMIN_USERNAMES"""
+    if current_user["username"] not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin access required")
+    return current_user
+
+async def llm_usage_scope(request: Request, current_user: dict = Depends(get_current_user)):
+    """Route dependency applying the user's request limit and metering LLM usage for the request"""
+    try:
+        usage = rate_limiter.open(current_user["id"], request.url.path)
+    except RateLimited as e:
+        raise rate_limited(e)
+    try:
+        yield usage
+    finally:
+        await rate_limiter.close(usage)
+
 # Optional dependency for routes that can work with or without auth
 async def get_current_user_optional(request: Request):
     """Get current user if authenticated, None otherwise"""
@@ -676,7 +684,7 @@ async def periodic_cleanup():
     """Periodic cleanup of expired sessions"""
     while True:
         try:
-            cleanup_expired_sessions()
+            await cleanup_expired_sessions()
             # Sleep for 1 hour
             await asyncio.sleep(3600)
         except Exception as e:
@@ -692,20 +700,45 @@ async def start_periodic_cleanup():
 async def lifespan(app: FastAPI):
     # Startup
     init_database()
-    cleanup_expired_sessions()
-    cleanup_old_files()
+    await cleanup_expired_sessions()
+    await cleanup_old_files()
+    qdrant_index.document_catalog.backfill(os.path.join("app", "documents"))
+    conversation_writer.start()
+    usage_writer.start()
+    await rate_limiter.sync(db)
+    loop_monitor.start()
+    # Warm models and connections in the background; /health answers meanwhile, /ready waits for it
+    if settings.warm_up_resources:
+        warm_up_task = asyncio.create_task(warm_up.run_async())
+    else:
+        warm_up.skip()
+        warm_up_task = None
     
     # Start the periodic cleanup task
     cleanup_task = asyncio.create_task(periodic_cleanup())
+    usage_sync_task = asyncio.create_task(rate_limiter.run_sync(db, settings.rate_limit_sync_interval_seconds))
     
     yield
     
     # Shutdown - cancel the cleanup task
-    cleanup_task.cancel()
-    try:
-        await cleanup_task
-    except asyncio.CancelledError:
-        pass
+    if warm_up_task is not None and not warm_up_task.done():
+        warm_up.stop()
+        await asyncio.gather(warm_up_task, return_exceptions=True)
+    for task in (cleanup_task, usage_sync_task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    await loop_monitor.stop()
+    # Finish memory updates and flush queued conversations before the pool goes away
+    await conversation_memory.close()
+    await conversation_writer.close()
+    await usage_writer.close()
+    db.close()
+    password_hasher.close()
+    shared_state.close()
+    tracer.close()
             
 app = FastAPI(
     title="DrQA Backend API with Authentication",
@@ -729,8 +762,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Load the Qdrant index
-qdrant_index = QdrantIndex(settings.qdrant_host, settings.qdrant_api_key, False)
+# Event-loop lag sampler; its middleware tags each request's task with the path
+loop_monitor = LoopMonitor(
+    interval=settings.loop_lag_interval_seconds,
+    block_threshold=settings.loop_block_threshold_seconds,
+    debug=settings.loop_monitor_debug
+)
+app.add_middleware(LoopMonitorMiddleware, monitor=loop_monitor)
+
+# Starts each request's deadline around CORS, the loop monitor and the routes, so every stage
+# below sees it. Only the tracing middleware registered next (the last added runs first) wraps it
+app.add_middleware(DeadlineMiddleware, default_seconds=settings.request_deadline_seconds)
+
+# Request tracing with a slow-request log and an optional OTLP collector
+tracer = Tracer(
+    slow_threshold_seconds=settings.trace_slow_request_seconds,
+    slow_log_size=settings.trace_slow_log_size,
+    exporter=OTLPHttpExporter(settings.otlp_endpoint, settings.otlp_service_name) if settings.otlp_endpoint else None
+)
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Root span per request, opened outside every other middleware; pipeline stages open child spans"""
+    with tracer.trace(f"{request.method} {request.url.path}", **{"http.method": request.method, "http.target": request.url.path}) as root:
+        response = await call_next(request)
+        root.set_attribute("http.status_code", response.status_code)
+        return response
+
+# Startup warm-up plan: embedding batches, Qdrant round trip, LLM clients
+warm_up = build_warm_up(
+    qdrant_index,
+    embedding_batch_size=settings.warm_up_embedding_batch_size,
+    ping_llms=settings.warm_up_llm_ping
+)
 
 # Ensure the documents directory exists
 os.makedirs(os.path.join("app", "documents"), exist_ok=True)
@@ -738,11 +802,18 @@ os.makedirs(os.path.join("app", "documents"), exist_ok=True)
 # Global process pool for CPU-intensive tasks
 process_pool = ProcessPoolExecutor(max_workers=mp.cpu_count())
 
+# Work waiting for a thread in each long-lived pool, read on every /metrics scrape
+executor_queue_depth.track(db.queue_depth, executor="sqlite")
+executor_queue_depth.track(password_hasher.queue_depth, executor="bcrypt")
+executor_queue_depth.track(lambda: conversation_writer.stats()["queue_depth"], executor="conversation_writer")
+executor_queue_depth.track(lambda: conversation_memory.stats()["pending_updates"], executor="conversation_memory")
+
 @app.post("/auth/register", response_model=UserResponse)
 async def register(user_data: UserCreate):
     """Register a new user"""
     try:
-        user = create_user(user_data)
+        with auth_limiter.slot():
+            user = await create_user(user_data)
         return UserResponse(
             id=str(user['id']),
             username=user['username'],
@@ -751,6 +822,8 @@ async def register(user_data: UserCreate):
             is_active=user['is_active'],
             created_at=datetime.fromisoformat(user['created_at'])
         )
+    except ConcurrencyLimitExceeded:
+        raise auth_rate_limited()
     except Exception as e:
         if "already registered" in str(e):
             raise e
@@ -760,116 +833,56 @@ async def register(user_data: UserCreate):
 @app.on_event("startup")
 async def startup_event():
     """Initialize database and clean up expired sessions on startup"""
-    startup_database()
+    await startup_database()
     logging.info("Application started successfully")
 
 
-# Updated download-file route
 @app.get("/download-conversations")
 async def download_conversations(
-    user_id: int = None,
-    limit: int = 100,
+    format: str = "docx",
+    user_id: Optional[int] = None,
+    limit: Optional[int] = None,
     current_user: dict = Depends(get_current_user)
 ):
-    """Download conversation history as Word document"""
+    """Stream the current user's conversation history as docx, jsonl, md or csv"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format. Use one of: {', '.join(EXPORT_FORMATS)}")
+    if user_id is not None and user_id != current_user["id"]:
+        raise HTTPException(status_code=403, detail="You can only export your own conversations")
+
     try:
-        # Get conversation history
-        conversations = get_conversation_history(user_id, limit)
-        
-        if not conversations:
+        total = (await db.fetchone(COUNT_USER_CONVERSATIONS_SQL, (current_user["id"],)))["total"]
+        if limit is not None:
+            total = min(total, max(0, limit))
+        if not total:
             raise HTTPException(status_code=404, detail="No conversations found")
-        
-        # Determine user name
-        user_name = "Anonymous"
-        if current_user:
-            user_name = current_user.get('username', 'User')
-        
-        # Create Word document
-        doc = create_conversation_document(conversations, user_name)
-        
-        # Save to memory buffer
-        buffer = io.BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-        
-        # Generate filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"conversation_history_{timestamp}.docx"
-        
-        # Create streaming response
-        def generate():
-            yield buffer.read()
-        
-        return StreamingResponse(
-            io.BytesIO(buffer.read()),
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-        
-    except Exception as e:
-        logging.error(f"Error downloading conversations: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error generating document: {str(e)}")
 
+        exporter, media_type = EXPORT_FORMATS[format]
+        header = export_header(current_user.get("username", "User"), total)
+        rows = iter_user_conversations(current_user["id"], limit=total)
 
-
-# Updated download-file route
-@app.get("/download-conversations")
-async def download_conversations(
-    request: Request,
-    user_id: int = None,
-    limit: int = 100
-):
-    """Download conversation history as Word document"""
-    try:
-        # Get current user if authenticated
-        current_user = await get_current_user(request)
-        
-        # If user_id is not provided and user is authenticated, use current user's ID
-        if user_id is None and current_user:
-            user_id = current_user['id']
-        
-        # Get conversation history
-        conversations = get_conversation_history(user_id, limit)
-        
-        if not conversations:
-            raise HTTPException(status_code=404, detail="No conversations found")
-        
-        # Determine user name
-        user_name = "Anonymous"
-        if current_user:
-            user_name = current_user.get('username', 'User')
-        
-        # Create Word document
-        doc = create_conversation_document(conversations, user_name)
-        
-        # Save to memory buffer
-        buffer = io.BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-        
-        # Generate filename
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"conversation_history_{timestamp}.docx"
-        
-        # Return streaming response
+        filename = f"conversation_history_{timestamp}.{format}"
         return StreamingResponse(
-            io.BytesIO(buffer.read()),
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+            exporter(rows, header),
+            media_type=media_type,
             headers={"Content-Disposition": f"attachment; filename={filename}"}
         )
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Error downloading conversations: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error generating document: {str(e)}")
-
+        raise HTTPException(status_code=500, detail=f"Error generating export: {str(e)}")
 
 
-# Updated login endpoint
+# Login endpoint
 @app.post("/auth/login", response_model=LoginResponse)
 async def login(user_credentials: UserLogin, response: Response):
     """Authenticate user and set session cookie"""
     try:
-        user = authenticate_user(user_credentials.username, user_credentials.password)
+        with auth_limiter.slot():
+            user = await authenticate_user(user_credentials.username, user_credentials.password)
         
         if not user:
             raise HTTPException(
@@ -878,8 +891,7 @@ async def login(user_credentials: UserLogin, response: Response):
             )
         
         # Create session
-        print('user_id  ', user['id'])
-        session_token = create_user_session(user['id'])
+        session_token = await create_user_session(user['id'])
         
         # Set cookie
         response.set_cookie(
@@ -903,6 +915,10 @@ async def login(user_credentials: UserLogin, response: Response):
             )
         )
         
+    except ConcurrencyLimitExceeded:
+        raise auth_rate_limited()
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Login error: {e}")
         raise HTTPException(
@@ -911,6 +927,20 @@ async def login(user_credentials: UserLogin, response: Response):
         )
         
         
+@app.get("/conversations")
+async def list_conversations(
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Conversation history of the current user, newest first, keyset paginated"""
+    limit = max(1, min(limit, 100))
+    try:
+        conversations, next_cursor = await get_conversation_page(current_user["id"], limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"conversations": conversations, "next_cursor": next_cursor}
+
 @app.get("/auth/profile", response_model=UserResponse)
 async def get_profile(current_user: dict = Depends(get_current_user)):
     """Get current user profile"""
@@ -929,7 +959,7 @@ async def logout(request: Request, response: Response):
     session_token = request.cookies.get(COOKIE_NAME)
     
     if session_token:
-        invalidate_session(session_token)
+        await invalidate_session(session_token)
     
     # Clear cookie
     response.delete_cookie(key=COOKIE_NAME)
@@ -946,30 +976,12 @@ async def test_upload():
     """Test endpoint to verify API is working"""
     return {"message": "Upload endpoint is accessible", "status": "ok"}
 
-def update_current_file_for_session(session_token: str, filename: str):
-    """Update the current working PDF file for the session."""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    try:
-        token_hash = hash_session_token(session_token)
-        cursor.execute('''
-            UPDATE user_sessions
-            SET current_file = ?
-            WHERE session_token = ?
-        ''', (filename, token_hash))
-        conn.commit()
-        logging.info(f"Session updated with current_file = {filename}")
-    except Exception as e:
-        logging.error(f"Failed to update current file for session: {str(e)}")
-    finally:
-        conn.close()
-
-
 # File Upload Route
-@app.post("/upload-file")
+@app.post("/upload-file", dependencies=[Depends(admission_slot("ingestion"))])
 async def upload_file(request: Request, file: UploadFile = File(...)):
     """Upload PDF file, validate it, index it, and set it as current working file in session."""
     try:
+        set_request_labels(endpoint="/upload-file")
         logging.info(f"Received file upload request: {file.filename}")
         
         if not file or not file.filename:
@@ -1000,21 +1012,35 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
             content = await file.read()
             buffer.write(content)
 
-        # Validate metadata (optional)
-        if 'validate_and_fix_pdf_metadata' in globals():
-            validate_and_fix_pdf_metadata(file_path)
+        def validate_pdf() -> int:
+            # Validate metadata (optional)
+            if 'validate_and_fix_pdf_metadata' in globals():
+                validate_and_fix_pdf_metadata(file_path)
+
+            with fitz.open(file_path) as pdf_doc:
+                return pdf_doc.page_count
+
+        with stage_timer("ingestion", "validation"):
+            # PDF parsing is CPU-bound; keep it off the event loop
+            page_count = await asyncio.get_running_loop().run_in_executor(None, validate_pdf)
+
+        session_token = request.cookies.get(COOKIE_NAME)
+        owner = await get_user_by_session(session_token) if session_token else None
 
         # Index with Qdrant
         if 'qdrant_index' in globals():
-            await qdrant_index.insert_into_index_async(file_path, new_filename)
+            await qdrant_index.insert_into_index_async(
+                file_path, new_filename,
+                owner_id=owner["id"] if owner else None,
+                page_count=page_count
+            )
         else:
             raise HTTPException(status_code=500, detail="Qdrant index not initialized")
 
         # Set this file as current_file for the user session
-        session_token = request.cookies.get(COOKIE_NAME)
         if not session_token:
             raise HTTPException(status_code=401, detail="No session token found. Please login first.")
-        update_current_file_for_session(session_token, new_filename)
+        await update_current_file_for_session(session_token, new_filename)
 
         return {
             "message": f"File '{new_filename}' uploaded, indexed, and set as active.",
@@ -1045,11 +1071,12 @@ async def upload_info():
         "endpoint": "/upload-file"
     }
 
-@app.post("/comprehensive-query")
+@app.post("/comprehensive-query", dependencies=[Depends(llm_usage_scope), Depends(admission_slot("interactive"))])
 async def comprehensive_query(
     input_query: ComprehensiveQuery,
     request: Request,
-    current_user: dict = Depends(get_current_user)
+    current_user: dict = Depends(get_current_user),
+    usage: UsageScope = Depends(llm_usage_scope)
 ):
     """
     Enhanced query endpoint that provides comprehensive responses,
@@ -1057,44 +1084,55 @@ async def comprehensive_query(
     """
     try:
         start_time = time.time()
+        set_request_labels(endpoint="/comprehensive-query", format_style="comprehensive")
+        reserve_llm_tokens(usage, settings.rate_limit_prompt_estimate_tokens + input_query.max_tokens)
 
-        # Step 1: Retrieve previous conversations
-        conversations = get_conversation_history(user_id=current_user["id"], limit=5)
-        conversation_history = "\n".join([f"Q: {conv['query']}\nA: {conv['response']}" for conv in conversations])
-
-        # Step 2: Determine the current working file from session
+        # Step 1: Determine the current working file from session
         session_token = request.cookies.get(COOKIE_NAME)
-        current_file = get_current_file_for_session(session_token) if session_token else None
+        with span("get_current_file_for_session"):
+            current_file = await get_current_file_for_session(session_token) if session_token else None
 
         if not current_file:
             raise HTTPException(status_code=400, detail="No active file found. Please upload or select a file.")
 
+        # Step 2: Conversation memory for this user and file (summary + last turn, token-bounded)
+        with stage_timer("query", "memory_context"):
+            conversation_history, memory_usage = await conversation_memory.build_context(current_user["id"], current_file)
+
         # Step 3: Load PDF context from the current file (if enabled)
         pdf_context = ""
         pdf_sources = []
 
         if input_query.use_pdf_context:
+            check_deadline("pdf_context")
             try:
-                full_context = qdrant_index._get_specific_pdf_content(current_file)
+                with stage_timer("query", "pdf_context"):
+                    # Reads shared state, the catalog and possibly the mapped text file
+                    full_context = await asyncio.get_running_loop().run_in_executor(
+                        None, in_context(qdrant_index._get_specific_pdf_content, current_file)
+                    )
                 pdf_context = full_context[:12000]  # truncate if necessary
                 logging.info(f"Loaded context from current file '{current_file}' ({len(pdf_context)} characters)")
             except Exception as e:
                 logging.warning(f"Could not load context from current file: {str(e)}")
 
         # Step 4: Combine all context elements for AI prompt
-        full_prompt_context = f"Previous Conversations:\n{conversation_history}\n\nCurrent Query: {input_query.query}\n"
+        full_prompt_context = f"Conversation Memory:\n{conversation_history}\n\nCurrent Query: {input_query.query}\n"
         if pdf_context:
             full_prompt_context += f"\nPDF Context from {current_file}:\n{pdf_context}"
 
         # Step 5: Generate the comprehensive AI response
-        comprehensive_response = await generate_comprehensive_response(
-            query=input_query.query,
-            pdf_context=full_prompt_context,
-            max_tokens=input_query.max_tokens
-        )
+        with span("generate_comprehensive_response", max_tokens=input_query.max_tokens):
+            comprehensive_response = await generate_comprehensive_response(
+                query=input_query.query,
+                pdf_context=full_prompt_context,
+                max_tokens=input_query.max_tokens
+            )
 
-        # Step 6: Store query and response
-        store_conversation(current_user["id"], input_query.query, comprehensive_response)
+        # Step 6: Store query and response, then fold it into memory in the background
+        with span("store_conversation"):
+            await store_conversation(current_user["id"], input_query.query, comprehensive_response)
+        conversation_memory.schedule_update(current_user["id"], current_file, input_query.query, comprehensive_response)
 
         # Step 7: Build the response payload
         final_response = {
@@ -1104,24 +1142,26 @@ async def comprehensive_query(
             "pdf_context_used": bool(pdf_context),
             "response_time": time.time() - start_time,
             "timestamp": time.time(),
+            "memory_tokens": memory_usage,
         }
 
         # Optional: Extract insights
         if pdf_context:
-            final_response["combined_insights"] = await combine_pdf_and_ai_insights(
-                input_query.query, pdf_context, comprehensive_response
-            )
+            with span("combine_pdf_and_ai_insights"):
+                final_response["combined_insights"] = await combine_pdf_and_ai_insights(
+                    input_query.query, pdf_context, comprehensive_response
+                )
 
         return final_response
 
-    except HTTPException:
+    except (HTTPException, DeadlineExceeded):
         raise
     except Exception as e:
         logging.error(f"Error in comprehensive query: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Query processing failed: {str(e)}")
 
-@app.post("/query")
-async def query_index(input_query: UserQuery, request: Request):
+@app.post("/query", dependencies=[Depends(llm_usage_scope), Depends(admission_slot("interactive"))])
+async def query_index(input_query: UserQuery, request: Request, usage: UsageScope = Depends(llm_usage_scope)):
     """
     Standard query endpoint with enhanced response formatting - Protected Route
     Requires valid session cookie for authentication
@@ -1136,7 +1176,7 @@ async def query_index(input_query: UserQuery, request: Request):
             )
         
         # Validate session token
-        user = get_user_by_session(session_token)
+        user = await get_user_by_session(session_token)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1144,25 +1184,15 @@ async def query_index(input_query: UserQuery, request: Request):
             )
         
         # Log the authenticated query
+        set_request_labels(endpoint="/query")
+        reserve_llm_tokens(usage, settings.rate_limit_query_estimate_tokens)
         logging.info(f"Received query from user {user['username']} (ID: {user['id']}): {input_query.query}")
         
-        # If query_and_generate_response is async, await it
-        # If it's sync, you might want to run it in a thread pool for better performance
-        try:
-            # Try async first
-            result = await qdrant_index.query_and_generate_response(query=input_query.query)
-        except TypeError:
-            # If it's not async, run in thread pool to avoid blocking
-            import asyncio
-            from concurrent.futures import ThreadPoolExecutor
-            
-            loop = asyncio.get_event_loop()
-            with ThreadPoolExecutor() as executor:
-                result = await loop.run_in_executor(
-                    executor, 
-                    qdrant_index.query_and_generate_response, 
-                    input_query.query
-                )
+        # The pipeline is synchronous; run it once, off the event loop
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, in_context(qdrant_index.query_and_generate_response, input_query.query)
+        )
         
         if isinstance(result, tuple) and len(result) >= 2:
             generated_response, relevant_docs = result[0], result[1]
@@ -1184,79 +1214,40 @@ async def query_index(input_query: UserQuery, request: Request):
             "user_id": str(user['id'])  # Optional: include user context
         }
     
-    except HTTPException:
-        # Re-raise HTTP exceptions (authentication errors)
+    except (HTTPException, DeadlineExceeded):
+        # Re-raise HTTP exceptions (authentication errors) and timeouts
         raise
     except Exception as e:
         logging.error(f"Query processing error for user {user.get('username', 'unknown') if 'user' in locals() else 'unauthenticated'}: {str(e)}")
         raise HTTPException(status_code=500, detail="Error processing the query.")
 
 
-@app.post("/auth/login", response_model=LoginResponse)
-async def login(user_credentials: UserLogin, response: Response):
-    """Authenticate user and set session cookie"""
-    user = authenticate_user(user_credentials.username, user_credentials.password)
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect username or password"
-        )
-    
-    # Create session
-    session_token = create_user_session(user['id'])
-    
-    # Set cookie
-    response.set_cookie(
-        key=COOKIE_NAME,
-        value=session_token,
-        max_age=SESSION_EXPIRE_MINUTES * 60,  # Convert to seconds
-        httponly=True,  # Prevent XSS attacks
-        secure=False,   # Set to True for HTTPS in production
-        samesite="lax"  # CSRF protection
-    )
-    
-    return LoginResponse(
-        message="Login successful",
-        user=UserResponse(
-            id=str(user['id']),
-            username=user['username'],
-            email=user['email'],
-            full_name=user['full_name'],
-            is_active=user['is_active'],
-            created_at=datetime.fromisoformat(user['created_at'])
-        )
-    )
-
 @app.post("/auth/logout")
 async def logout(response: Response, session_token: str = Cookie(None, alias=COOKIE_NAME)):
     """Logout user and clear session"""
     if session_token:
-        delete_user_session(session_token)
+        await delete_user_session(session_token)
     
     response.delete_cookie(key=COOKIE_NAME)
     return {"message": "Logged out successfully"}
 
 # Alternative version if you know query_and_generate_response is sync
-@app.post("/query-sync")
-async def query_index_sync(input_query: UserQuery):
+@app.post("/query-sync", dependencies=[Depends(llm_usage_scope), Depends(admission_slot("interactive"))])
+async def query_index_sync(input_query: UserQuery, current_user: dict = Depends(get_current_user),
+                           usage: UsageScope = Depends(llm_usage_scope)):
     """
-    Query endpoint optimized for sync query_and_generate_response method
+    Query endpoint optimized for sync query_and_generate_response method - Protected Route
     """
     try:
-        logging.info(f"Received query: {input_query.query}")
+        set_request_labels(endpoint="/query-sync")
+        reserve_llm_tokens(usage, settings.rate_limit_query_estimate_tokens)
+        logging.info(f"Received query from user {current_user['username']}: {input_query.query}")
         
         # Run sync method in thread pool to avoid blocking the event loop
-        import asyncio
-        from concurrent.futures import ThreadPoolExecutor
-        
-        loop = asyncio.get_event_loop()
-        with ThreadPoolExecutor() as executor:
-            result = await loop.run_in_executor(
-                executor, 
-                qdrant_index.query_and_generate_response, 
-                input_query.query
-            )
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, in_context(qdrant_index.query_and_generate_response, input_query.query)
+        )
         
         if isinstance(result, tuple) and len(result) >= 2:
             generated_response, relevant_docs = result[0], result[1]
@@ -1280,6 +1271,8 @@ async def query_index_sync(input_query: UserQuery):
             "timestamp": datetime.utcnow().isoformat()
         }
 
+    except (HTTPException, DeadlineExceeded):
+        raise
     except Exception as e:
         logging.error(f"Query processing error: {str(e)}")
         raise HTTPException(status_code=500, detail="Error processing the query.")
@@ -1328,7 +1321,7 @@ async def remove_file(filename: str, request: Request):
             )
         
         # Validate session token
-        user = get_user_by_session(session_token)
+        user = await get_user_by_session(session_token)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1364,7 +1357,7 @@ async def download_file(filename: str, request: Request):
         )
     
     # Validate session token
-    user = get_user_by_session(session_token)
+    user = await get_user_by_session(session_token)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1383,7 +1376,7 @@ async def download_file(filename: str, request: Request):
     )
 
 @app.get("/list-files")
-async def list_files(request: Request):
+async def list_files(request: Request, limit: Optional[int] = None, cursor: Optional[str] = None, mine: bool = False):
     try:
         # Check for authentication cookie
         session_token = request.cookies.get(COOKIE_NAME)
@@ -1394,16 +1387,41 @@ async def list_files(request: Request):
             )
         
         # Validate session token
-        user = get_user_by_session(session_token)
+        user = await get_user_by_session(session_token)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid or expired session. Please login again."
             )
         
-        documents_dir = os.path.join("app", "documents")
-        files = [f for f in os.listdir(documents_dir) if f.endswith(".pdf")]
-        return {"files": files}
+        # Newest first from the document catalog instead of listing the directory. Paginated when
+        # the client asks for a limit or cursor; without either, every file as before
+        if limit is not None or cursor is not None:
+            limit = max(1, min(limit or 50, 200))
+        try:
+            documents, next_cursor = await asyncio.get_running_loop().run_in_executor(None, in_context(
+                qdrant_index.document_catalog.list,
+                owner_id=user["id"] if mine else None,
+                limit=limit,
+                cursor=cursor
+            ))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return {
+            "files": [document["filename"] for document in documents],
+            "documents": [
+                {
+                    "filename": document["filename"],
+                    "uploaded_at": document["uploaded_at"],
+                    "page_count": document["page_count"],
+                    "chunk_count": document["chunk_count"],
+                    "size_bytes": document["size_bytes"],
+                    "status": document["status"]
+                }
+                for document in documents
+            ],
+            "next_cursor": next_cursor
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -1616,13 +1634,20 @@ async def generate_comprehensive_response(query: str, pdf_context: str = "", max
     Detects if the query is about question generation and adapts the prompt accordingly.
     """
     try:
-        from openai import AsyncOpenAI
+        client = resources.get("openai_async_client")
 
-        client = AsyncOpenAI(api_key=settings.openai_api_key)
+        with stage_timer("query", "intent_classification"):
+            intent = classify_intent(query)
 
-        is_question_generation = "generate" in query.lower() and "question" in query.lower()
+        prompt_start = time.perf_counter()
+        if intent.is_question_generation:
+            system_prompt = """You are an academic examination expert who writes exam-quality questions with detailed answers,
+grounded strictly in the provided document."""
 
-        if is_question_generation:
+            question_count = (
+                f"exactly {intent.requested_question_count} questions"
+                if intent.requested_question_count else "the number of questions specified in the query"
+            )
             user_prompt = f"""
 You are given the following PDF content. Based on this, carry out the task described in the query below.
 
@@ -1634,7 +1659,7 @@ You are given the following PDF content. Based on this, carry out the task descr
 {pdf_context}
 \"\"\"
 
-Please generate the number of questions specified in the query. Each question must be:
+Please generate {question_count}. Each question must be:
 - Well-structured and clearly phrased
 - Aligned with the academic content provided
 - Diverse in format (e.g., MCQ, short answer, descriptive)
@@ -1655,26 +1680,60 @@ Guidelines:
 4. Cite context where appropriate
 """
 
+            context_block = (
+                f"PDF Context:\n{pdf_context}" if pdf_context
+                else "No PDF context available - please provide comprehensive information."
+            )
             user_prompt = f"""Query: {query}
 
-{f"PDF Context:\n{pdf_context}" if pdf_context else "No PDF context available - please provide comprehensive information."}
+{context_block}
 
 Please provide a thorough response that fully addresses the query.
 """
-
-        # Call OpenAI
-        response = await client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt.strip()},
-                {"role": "user", "content": user_prompt.strip()}
-            ],
-            max_tokens=max_tokens,
-            temperature=0.5
-        )
-
-        return response.choices[0].message.content
-
+        stage_seconds.observe(time.perf_counter() - prompt_start, pipeline="query", stage="prompt_build")
+        prompt_tokens = count_tokens(system_prompt) + count_tokens(user_prompt)
+        route = qdrant_index.model_router.route(intent, prompt_tokens, "comprehensive")
+
+        # Call OpenAI, streaming so time-to-first-token is measured and a cancelled hedge stops reading
+        async def attempt(model: str) -> str:
+            parts = []
+            reported_usage = None
+            start = time.perf_counter()
+            stream = await client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt.strip()},
+                    {"role": "user", "content": user_prompt.strip()}
+                ],
+                max_tokens=max_tokens,
+                temperature=0.5,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            try:
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        reported_usage = chunk.usage
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    if not parts:
+                        llm_ttft_seconds.observe(time.perf_counter() - start, model=model)
+                    parts.append(chunk.choices[0].delta.content)
+            finally:
+                await stream.close()
+                if reported_usage is not None:
+                    usage = (reported_usage.prompt_tokens, reported_usage.completion_tokens)
+                else:
+                    usage = (prompt_tokens, count_tokens("".join(parts)))
+                report_llm_usage(model, *usage)
+                qdrant_index.model_router.record(route, model, time.perf_counter() - start, *usage)
+            return "".join(parts)
+
+        with stage_timer("query", "llm_call"):
+            return await hedged(attempt, route.model, qdrant_index.hedge_policy)
+
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         logging.error(f"Error generating comprehensive response: {str(e)}")
         if pdf_context:
@@ -1709,12 +1768,7 @@ async def combine_pdf_and_ai_insights(query: str, pdf_context: str, ai_response:
 
 def extract_main_topic(query: str) -> str:
     """Extract the main topic from a query using simple keyword analysis."""
-    # Simple implementation - can be enhanced with NLP
-    words = query.lower().split()
-    # Remove common question words
-    stop_words = {'what', 'how', 'why', 'when', 'where', 'who', 'is', 'are', 'the', 'a', 'an'}
-    keywords = [word for word in words if word not in stop_words and len(word) > 2]
-    return ' '.join(keywords[:3])  # Return first 3 keywords
+    return classify_intent(query).main_topic
 
 def extract_sections_from_response(response: str) -> list:
     """Extract main sections from AI response."""
@@ -1796,7 +1850,7 @@ def simple_clean_text(text: str) -> str:
     
     return text.strip()
 
-def cleanup_old_files():
+async def cleanup_old_files():
     """
     Clean up old temporary files and expired sessions.
     """
@@ -1816,7 +1870,7 @@ def cleanup_old_files():
                         logging.warning(f"Could not clean up temp file {filename}: {e}")
         
         # Clean up expired sessions
-        cleanup_expired_sessions()
+        await cleanup_expired_sessions()
         
     except Exception as e:
         logging.error(f"Error in cleanup_old_files: {str(e)}")
@@ -1830,79 +1884,57 @@ async def health_check():
         "timestamp": datetime.utcnow().isoformat(),
         "version": "1.0.0"
     }
-    
-def clean_text_for_docx(text: str) -> str:
-    """
-    Remove null bytes and control characters that are not XML-compatible.
-    """
-    if not text:
-        return ""
-    # Remove null bytes and control characters (except newline/tab)
-    return ''.join(c for c in text if c.isprintable() or c in '\n\t').replace('\x00', '').strip()
 
-    
-# Updated download-file route
-@app.get("/download-conversations")
-async def download_conversations(
-    request: Request,
-    user_id: int = None,
-    limit: int = 100
-):
-    """Download conversation history as Word document"""
-    try:
-        # Check for authentication cookie
-        session_token = request.cookies.get(COOKIE_NAME)
-        if not session_token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Authentication required. Please login."
-            )
-        
-        # Validate session token
-        current_user = get_user_by_session(session_token)
-        if not current_user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid or expired session. Please login again."
-            )
-        
-        # Get conversation history
-        conversations = get_conversation_history(user_id, limit)
-        
-        if not conversations:
-            raise HTTPException(status_code=404, detail="No conversations found")
-        
-        # Determine user name
-        user_name = current_user.get('username', 'User')
-        
-        # Create Word document
-        doc = create_conversation_document(conversations, user_name)
-        
-        # Save to memory buffer
-        buffer = io.BytesIO()
-        doc.save(buffer)
-        buffer.seek(0)
-        
-        # Generate filename
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f"conversation_history_{timestamp}.docx"
-        
-        # Create streaming response
-        def generate():
-            yield buffer.read()
-        
-        return StreamingResponse(
-            io.BytesIO(buffer.read()),
-            media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
-    
-    except HTTPException:
-        raise
-    except Exception as e:
-        logging.error(f"Error downloading conversations: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error generating document: {str(e)}")
-    
+@app.get("/ready")
+async def readiness_check():
+    """Readiness for load balancers: 503 until the startup warm-up has completed"""
+    body = {
+        "status": "ready" if warm_up.ready else "warming_up",
+        "warm_up": warm_up.status(),
+        "resources": resources.status()
+    }
+    return JSONResponse(status_code=200 if warm_up.ready else 503, content=body)
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Per-stage latency histograms, cache hit counters and executor queue depths (Prometheus text format)"""
+    return PlainTextResponse(metrics.registry.render(), media_type=metrics.registry.content_type)
+
+@app.get("/admin/slow-requests")
+async def slow_requests(limit: int = 20, admin: dict = Depends(get_admin_user)):
+    """Most recent requests over TRACE_SLOW_REQUEST_SECONDS, with their span trees"""
+    return {
+        "threshold_seconds": tracer.slow_threshold_seconds,
+        "requests": tracer.slow_requests(min(max(limit, 1), settings.trace_slow_log_size)),
+    }
+
+@app.get("/admin/loop-blocks")
+async def loop_blocks(admin: dict = Depends(get_admin_user)):
+    """Recent event-loop stalls with the blocking stack (LOOP_MONITOR_DEBUG=true)"""
+    return {"debug": loop_monitor.debug, "blocks": loop_monitor.recent_blocks()}
+
+@app.get("/usage")
+async def llm_usage(current_user: dict = Depends(get_current_user)):
+    """The current user's LLM token usage against their daily and monthly quotas"""
+    return rate_limiter.user_stats(current_user["id"])
+
+@app.get("/system/stats")
+async def system_stats(admin: dict = Depends(get_admin_user)):
+    """Runtime statistics for in-process caches"""
+    return {
+        "session_cache": session_cache.stats(),
+        "auth_limiter": auth_limiter.stats(),
+        "conversation_writer": conversation_writer.stats(),
+        "conversation_memory": conversation_memory.stats(),
+        "tracing": tracer.stats(),
+        "event_loop": loop_monitor.stats(),
+        "admission": admission.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "llm_hedging": qdrant_index.hedge_policy.stats(),
+        "reranker": qdrant_index.reranker.stats(),
+        "lexical_index": qdrant_index.lexical_index.stats() if qdrant_index.lexical_index is not None else None,
+        "model_router": qdrant_index.model_router.stats()
+    }
     
 @app.get("/public/info")
 async def public_info():
@@ -1920,6 +1952,10 @@ async def public_info():
     }
 
 # Error handlers
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceeded):
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
+
 @app.exception_handler(404)
 async def not_found_handler(request: Request, exc):
     return JSONResponse(
@@ -1940,7 +1976,7 @@ async def periodic_cleanup():
     """Periodic cleanup task"""
     while True:
         try:
-            cleanup_old_files()
+            await cleanup_old_files()
             await asyncio.sleep(3600)  # Run every hour
         except Exception as e:
             logging.error(f"Error in periodic cleanup: {str(e)}")
@@ -1972,8 +2008,10 @@ if __name__ == "__main__":
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
-        workers=1  # Single worker to avoid multiprocessing issues
+        # Cross-worker state lives in shared_state, so several workers can serve requests;
+        # uvicorn only supports auto-reload with a single worker
+        reload=settings.api_workers == 1,
+        workers=settings.api_workers
     )
     
     
\ No newline at end of file
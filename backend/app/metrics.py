@@ -0,0 +1,242 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import bisect
+import functools
+import math
+import threading
+import time
+
+from tracing import span
+
+# Prometheus' default buckets, stretched to cover LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Labels attached to every pipeline metric, taken from the request being served
+CONTEXT_LABELS = ("endpoint", "format_style")
+UNLABELLED = "none"
+
+_request_labels: ContextVar[Tuple[str, str]] = ContextVar("request_labels", default=(UNLABELLED, UNLABELLED))
+
+
+def set_request_labels(endpoint: Optional[str] = None, format_style: Optional[str] = None):
+    """Label everything measured from here on in the current request (and its copied contexts)"""
+    current_endpoint, current_style = _request_labels.get()
+    _request_labels.set((endpoint or current_endpoint, format_style or current_style))
+
+
+def request_labels() -> Dict[str, str]:
+    return dict(zip(CONTEXT_LABELS, _request_labels.get()))
+
+
+def in_context(fn: Callable, *args, **kwargs) -> Callable[[], object]:
+    """
+    Bind fn to a copy of the current context. loop.run_in_executor() does not
+    carry contextvars into the worker thread, so request labels would be lost.
+    """
+    return functools.partial(copy_context().run, fn, *args, **kwargs)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 context_labels: bool = False):
+        self.name = name
+        self.documentation = documentation
+        self.context_labels = context_labels
+        self.labelnames = tuple(labelnames) + (CONTEXT_LABELS if context_labels else ())
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> tuple:
+        if self.context_labels:
+            labels = {**request_labels(), **labels}
+        return tuple(str(labels.get(name, UNLABELLED)) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge(_Metric):
+    """Gauge whose samples are read from callbacks at scrape time (queue depths, pool sizes)"""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._callbacks: Dict[tuple, Callable[[], float]] = {}
+
+    def track(self, fn: Callable[[], float], **labels):
+        with self._lock:
+            self._callbacks[tuple(str(labels.get(name, UNLABELLED)) for name in self.labelnames)] = fn
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._callbacks.items())
+        samples = []
+        for key, fn in items:
+            try:
+                value = fn()
+            except Exception:
+                continue
+            samples.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return samples
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Iterable[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # key -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[position] += 1
+            series[-1] += value
+
+    def total(self, **labels) -> Tuple[int, float]:
+        """(count, sum) over every series matching the given labels"""
+        positions = {self.labelnames.index(name): str(value) for name, value in labels.items()}
+        count, total = 0, 0.0
+        with self._lock:
+            for key, series in self._series.items():
+                if all(key[i] == value for i, value in positions.items()):
+                    count += sum(series[:-1])
+                    total += series[-1]
+        return count, total
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        samples = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                samples.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            samples.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+            samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text exposition format.
+    Each API worker keeps its own registry; scrape every worker (or run one)
+    to see the full picture.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = (), context_labels: bool = False) -> Counter:
+        return self._register(Counter(name, documentation, labelnames, context_labels))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), context_labels: bool = False,
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, context_labels, buckets=buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.histogram(
+    "questgen_stage_seconds", "Duration of one pipeline stage",
+    labelnames=("pipeline", "stage"), context_labels=True
+)
+llm_ttft_seconds = registry.histogram(
+    "questgen_llm_time_to_first_token_seconds", "Time from sending an LLM request to its first streamed token",
+    labelnames=("model",), context_labels=True
+)
+cache_lookups = registry.counter(
+    "questgen_cache_lookups_total", "Cache lookups by cache and result (hit or miss)",
+    labelnames=("cache", "result"), context_labels=True
+)
+executor_queue_depth = registry.gauge(
+    "questgen_executor_queue_depth", "Work items waiting for a worker in each executor",
+    labelnames=("executor",)
+)
+
+
+@contextmanager
+def stage_timer(pipeline: str, stage: str):
+    """Time one stage of the query or ingestion pipeline, tracing it as a span"""
+    with span(f"{pipeline}.{stage}"), stage_seconds.time(pipeline=pipeline, stage=stage):
+        yield
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    cache_lookups.inc(cache=cache, result="hit" if hit else "miss")
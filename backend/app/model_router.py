@@ -0,0 +1,125 @@
+from dataclasses import dataclass
+from typing import Dict, Tuple
+import threading
+
+from intent_router import QueryIntent
+from metrics import registry
+
+llm_route_calls = registry.counter(
+    "questgen_llm_route_calls_total", "LLM calls per model route and routing reason", labelnames=("route", "reason")
+)
+llm_route_seconds = registry.histogram(
+    "questgen_llm_route_seconds", "LLM call latency per model route", labelnames=("route",)
+)
+llm_route_tokens = registry.counter(
+    "questgen_llm_route_tokens_total", "LLM tokens per model route", labelnames=("route", "kind")
+)
+llm_route_cost = registry.counter(
+    "questgen_llm_route_cost_usd_total", "Estimated LLM spend per model route, from MODEL_PRICES", labelnames=("route",)
+)
+
+
+def parse_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """'model:input:output,...' in USD per million tokens -> {model: (input, output)}"""
+    prices = {}
+    for item in spec.split(","):
+        if item.strip():
+            model, input_price, output_price = item.strip().rsplit(":", 2)
+            prices[model] = (float(input_price), float(output_price))
+    return prices
+
+
+def _split(values: str):
+    return frozenset(value.strip() for value in values.split(",") if value.strip())
+
+
+@dataclass(frozen=True)
+class Route:
+    """Where one LLM call goes: the tier name, its model and why it was picked"""
+    name: str
+    model: str
+    reason: str
+
+
+class ModelRouter:
+    """
+    Chooses the small or large model for each LLM call. Question generation
+    and synthesis (comparisons, whole-document questions), long prompts and
+    the listed format styles go to the large model. Short lookup questions
+    of the listed types (definitions by default) go to the small one.
+    Anything else goes to the default tier. Latency, tokens and estimated
+    cost are recorded per route so the policy can be tuned.
+    """
+
+    def __init__(self, small_model: str, large_model: str, enabled: bool = True,
+                 small_max_prompt_tokens: int = 6000, small_question_types: str = "definition",
+                 large_format_styles: str = "", default_tier: str = "large", prices: str = ""):
+        self.models = {"small": small_model, "large": large_model}
+        self.enabled = enabled
+        self.small_max_prompt_tokens = small_max_prompt_tokens
+        self.small_question_types = _split(small_question_types)
+        self.large_format_styles = _split(large_format_styles)
+        self.default_tier = default_tier if default_tier in self.models else "large"
+        self.prices = parse_prices(prices)
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {"calls": 0, "seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0}
+            for name in self.models
+        }
+
+    def _tier(self, intent: QueryIntent, prompt_tokens: int, format_style: str) -> Tuple[str, str]:
+        if not self.enabled:
+            return "large", "disabled"
+        if intent.is_question_generation:
+            return "large", "question_generation"
+        if intent.is_comparison or intent.is_generic:
+            return "large", "synthesis"
+        if prompt_tokens > self.small_max_prompt_tokens:
+            return "large", "long_prompt"
+        if format_style in self.large_format_styles:
+            return "large", "format_style"
+        if intent.question_type in self.small_question_types:
+            return "small", "lookup"
+        return self.default_tier, "default"
+
+    def route(self, intent: QueryIntent, prompt_tokens: int, format_style: str) -> Route:
+        name, reason = self._tier(intent, prompt_tokens, format_style)
+        llm_route_calls.inc(route=name, reason=reason)
+        return Route(name, self.models[name], reason)
+
+    def fixed(self, model: str, reason: str) -> Route:
+        """Route for a call whose model is configured elsewhere, counted under the tier serving that model"""
+        name = next((tier for tier, tier_model in self.models.items() if tier_model == model), "large")
+        llm_route_calls.inc(route=name, reason=reason)
+        return Route(name, model, reason)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        input_price, output_price = self.prices.get(model, (0.0, 0.0))
+        return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+    def record(self, route: Route, model: str, seconds: float, prompt_tokens: int, completion_tokens: int):
+        """Account one attempt on this route (hedged duplicates included, since they are billed)"""
+        cost = self.cost(model, prompt_tokens, completion_tokens)
+        llm_route_seconds.observe(seconds, route=route.name)
+        llm_route_tokens.inc(prompt_tokens, route=route.name, kind="prompt")
+        llm_route_tokens.inc(completion_tokens, route=route.name, kind="completion")
+        llm_route_cost.inc(cost, route=route.name)
+        with self._lock:
+            stats = self._stats[route.name]
+            stats["calls"] += 1
+            stats["seconds"] += seconds
+            stats["prompt_tokens"] += prompt_tokens
+            stats["completion_tokens"] += completion_tokens
+            stats["cost_usd"] += cost
+
+    def stats(self) -> Dict:
+        with self._lock:
+            routes = {
+                name: {
+                    "model": self.models[name],
+                    **stats,
+                    "avg_seconds": stats["seconds"] / stats["calls"] if stats["calls"] else None,
+                }
+                for name, stats in self._stats.items()
+            }
+        return {"enabled": self.enabled, "routes": routes}
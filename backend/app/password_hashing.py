@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from passlib.context import CryptContext
+import asyncio
+import threading
+
+
+class PasswordHasher:
+    """
+    bcrypt hashing and verification on a dedicated, bounded thread pool.
+    bcrypt releases the GIL, so the event loop keeps serving other requests
+    while a hash is computed.
+    """
+
+    def __init__(self, rounds: int = 12, max_workers: int = 2):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self._context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bcrypt")
+
+    async def hash(self, password: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._context.hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._context.verify, password, hashed_password)
+
+    def queue_depth(self) -> int:
+        return self._executor._work_queue.qsize()
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class ConcurrencyLimitExceeded(Exception):
+    """Raised when a ConcurrencyLimiter is saturated"""
+
+
+class ConcurrencyLimiter:
+    """Non-blocking in-flight cap: callers beyond the limit are rejected immediately"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.rejected += 1
+                raise ConcurrencyLimitExceeded()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "rejected": self.rejected}
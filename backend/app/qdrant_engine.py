@@ -1,20 +1,26 @@
 from langchain.text_splitter import CharacterTextSplitter
 from langchain.docstore.document import Document
-from langchain_community.vectorstores import Qdrant
 from langchain_community.document_loaders import PDFMinerLoader
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain.chains.question_answering import load_qa_chain
-from langchain.chains.qa_with_sources import load_qa_with_sources_chain
-from langchain_openai import OpenAI
-from qdrant_client import QdrantClient
 from qdrant_client.http.models import Distance, VectorParams, Filter
 from qdrant_client.http import models as rest
-from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import ChatOpenAI
 from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 from config import settings
+from intent_router import QueryIntent, classify_intent
+from document_store import DocumentStore
+from document_catalog import DocumentCatalog, file_content_hash
+from shared_state import SharedState, create_shared_state
+from resources import resources
+from metrics import in_context, llm_ttft_seconds, set_request_labels, stage_timer
+from conversation_memory import count_tokens
+from rate_limit import report_llm_usage
+from deadlines import DeadlineExceeded, HedgePolicy, check_deadline, hedged_sync, request_timeout
+from model_router import ModelRouter
+from context_compressor import ContextCompressor
+from reranker import Reranker
+from lexical_index import LexicalIndex, fuse
 import uuid
+import threading
 import logging
 import os
 import asyncio
@@ -24,7 +30,6 @@ from tenacity import retry, wait_exponential, stop_after_attempt
 import multiprocessing as mp
 from functools import partial
 import json
-import re
 import base64
 import requests
 from pathlib import Path
@@ -40,74 +45,87 @@ print("QDRANT HOST" , qdrant_host)
 qdrant_api_key = settings.qdrant_api_key
 prefer_grpc = False
 
-# Load the embedding model
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
-
-# Enhanced QA Chain with OpenAI for comprehensive responses
-qa_chain = load_qa_with_sources_chain(
-    llm=ChatOpenAI(
-        openai_api_key=settings.openai_api_key, 
-        model_name="gpt-4o",  # Using latest GPT model
-        temperature=0.3,
-        max_tokens=2000
-    ),
-    chain_type="stuff",
-    verbose=False
-)
-
-# Multiple LLM instances for different purposes
-comprehensive_llm = ChatOpenAI(
-    openai_api_key=settings.openai_api_key,
-    model_name="gpt-4o",
-    temperature=0.2,
-    max_tokens=3000
-)
-
-formatting_llm = ChatOpenAI(
-    openai_api_key=settings.openai_api_key,
-    model_name="gpt-4o",
-    temperature=0.1,
-    max_tokens=2000
-)
-
-academic_llm = ChatOpenAI(
-    openai_api_key=settings.openai_api_key,
-    model_name="gpt-4o",
-    temperature=0.4,
-    max_tokens=2000
-)
-
-# Generic question handler LLM with higher token limit
-generic_llm = ChatOpenAI(
-    openai_api_key=settings.openai_api_key,
-    model_name="gpt-4o",
-    temperature=0.3,
-    max_tokens=4000
-)
+# The embedding model, LLM clients and Qdrant client are created lazily by the
+# resource registry (see resources.py), so importing this module stays cheap.
 
 
 class QdrantIndex:
-    def __init__(self, qdrant_host: str, qdrant_api_key: str, prefer_grpc: bool):
-        """Initialize Qdrant Client with enhanced configuration"""
-        if qdrant_host == "localhost":
-            self.qdrant_client = QdrantClient(url="http://localhost:6333")
-        else:
-            self.qdrant_client = QdrantClient(
-                host=qdrant_host,
-                prefer_grpc=prefer_grpc,
-                api_key=qdrant_api_key
-            )
-
-        self.embedding_model = embedding_model
+    def __init__(self, qdrant_host: str, qdrant_api_key: str, prefer_grpc: bool,
+                 shared_state: Optional[SharedState] = None):
+        """Set up document state; the Qdrant client and models load on first use"""
         self.embedding_size = 768
         self.collection_name = COLLECTION_NAME
-        self.pdf_cache = {}  # Cache for PDF contents
-        self.last_updated_pdf = None  # Track the most recently updated PDF
-        self.pdf_timestamps = {}  # Track PDF update timestamps
-
-        # Create or Recreate Collection with optimized settings
+        # State every API worker must agree on (most recent PDF, document versions)
+        self.shared_state = shared_state or create_shared_state(
+            settings.shared_state_backend, settings.shared_state_path, settings.redis_url
+        )
+        self.document_store = DocumentStore(  # Compact, memory-bounded store of PDF contents
+            settings.document_store_dir,
+            settings.document_store_memory_mb * 1024 * 1024,
+            shared_state=self.shared_state
+        )
+        self.document_catalog = DocumentCatalog(settings.document_catalog_path)  # Indexed document lookups
+        # BM25 side of hybrid retrieval; no index file is created when hybrid search is off
+        self.lexical_index = LexicalIndex(settings.lexical_index_path) if settings.hybrid_search_enabled else None
+        self._collection_ready = False
+        self._collection_lock = threading.Lock()
+        self.hedge_policy = HedgePolicy(  # When to duplicate slow LLM calls
+            settings.llm_hedge_enabled,
+            percentile=settings.llm_hedge_percentile,
+            min_delay=settings.llm_hedge_min_delay_seconds,
+            initial_delay=settings.llm_hedge_initial_delay_seconds,
+            hedge_model=settings.llm_hedge_model,
+            max_fraction=settings.llm_hedge_max_fraction,
+            pool_size=settings.llm_hedge_pool_size
+        )
+        self.reranker = Reranker(  # Cross-encoder second stage over the dense candidates
+            lambda: resources.get("reranker_model"),
+            enabled=settings.rerank_enabled,
+            top_k=settings.rerank_top_k,
+            batch_size=settings.rerank_batch_size,
+            budget_seconds=settings.rerank_budget_ms / 1000,
+            cache_size=settings.rerank_cache_size
+        )
+        self.context_compressor = ContextCompressor(  # Dedupes retrieved chunks before prompting
+            enabled=settings.context_compression_enabled,
+            dedupe_threshold=settings.context_dedupe_threshold,
+            select_sentences=settings.context_select_sentences,
+            keep_ratio=settings.context_keep_ratio
+        )
+        self.model_router = ModelRouter(  # Small vs large model per LLM call
+            settings.model_router_small_model,
+            settings.model_router_large_model,
+            enabled=settings.model_router_enabled,
+            small_max_prompt_tokens=settings.model_router_small_max_prompt_tokens,
+            small_question_types=settings.model_router_small_question_types,
+            large_format_styles=settings.model_router_large_format_styles,
+            default_tier=settings.model_router_default_tier,
+            prices=settings.model_prices
+        )
+
+    @property
+    def embedding_model(self):
+        return resources.get("embedding_model")
+
+    @property
+    def qdrant_client(self):
+        """Shared Qdrant client; the collection is ensured on first access"""
+        client = resources.get("qdrant_client")
+        if not self._collection_ready:
+            with self._collection_lock:
+                if not self._collection_ready:
+                    self._ensure_collection(client)
+                    self._collection_ready = True
+        return client
+
+    def _ensure_collection(self, client):
+        # Create the collection if missing. Recreating it here would wipe vectors
+        # indexed by workers that started earlier.
+        if client.collection_exists(self.collection_name):
+            logging.info(f"Collection {COLLECTION_NAME} already exists, reusing it.")
+            return
         try:
-            self.qdrant_client.recreate_collection(
+            client.create_collection(
                 collection_name=self.collection_name,
                 vectors_config=VectorParams(
                     size=self.embedding_size, 
@@ -125,113 +143,44 @@ class QdrantIndex:
             )
             logging.info(f"Collection {COLLECTION_NAME} successfully created with optimized settings.")
         except Exception as e:
+            # Another worker may have created it between the check and the create
+            if client.collection_exists(self.collection_name):
+                logging.info(f"Collection {COLLECTION_NAME} was created by another worker.")
+                return
             logging.error(f"Error creating collection: {str(e)}")
             raise
 
+    @property
+    def last_updated_pdf(self) -> Optional[str]:
+        """Most recently updated PDF across all workers"""
+        return self.shared_state.get("last_updated_pdf")
+
+    @last_updated_pdf.setter
+    def last_updated_pdf(self, filename: Optional[str]):
+        if filename is None:
+            self.shared_state.delete("last_updated_pdf")
+        else:
+            self.shared_state.set("last_updated_pdf", filename)
+
     def _is_generic_question(self, query: str) -> bool:
         """
         Determine if a question is generic and requires full PDF content
         """
-        generic_patterns = [
-            # Question generation patterns
-            r'generate.*questions?.*(?:from|out of|about).*pdf',
-            r'create.*questions?.*(?:from|out of|about).*pdf',
-            r'make.*questions?.*(?:from|out of|about).*pdf',
-            r'list.*questions?.*(?:from|out of|about).*pdf',
-            r'(?:give|show).*questions?.*(?:from|out of|about).*pdf',
-            
-            # Main topic/content patterns
-            r'what.*(?:are|is).*(?:main|key|primary|important).*(?:topics?|subjects?|themes?|points?|ideas?|concepts?)',
-            r'what.*(?:are|is).*(?:main|key|primary|important).*(?:questions?|issues?|problems?)',
-            r'(?:main|key|primary|important).*(?:topics?|subjects?|themes?|points?|ideas?|concepts?)',
-            r'(?:main|key|primary|important).*(?:questions?|issues?|problems?)',
-            
-            # Summary patterns
-            r'summarize.*(?:the|this).*pdf',
-            r'(?:give|provide).*summary.*(?:of|about).*pdf',
-            r'what.*(?:is|are).*(?:the|this).*pdf.*about',
-            r'(?:overview|summary).*(?:of|about).*(?:the|this).*pdf',
-            
-            # Content analysis patterns
-            r'analyze.*(?:the|this).*pdf',
-            r'(?:analyze|examine).*(?:content|document)',
-            r'what.*(?:does|do).*(?:the|this).*pdf.*(?:discuss|cover|contain)',
-            r'(?:content|contents).*(?:of|in).*(?:the|this).*pdf',
-            
-            # All/everything patterns
-            r'(?:all|everything).*(?:about|in).*(?:the|this).*pdf',
-            r'(?:complete|full|entire).*(?:content|analysis|overview)',
-            
-            # Chapter/section patterns
-            r'(?:list|show|give).*(?:all|every).*(?:chapters?|sections?|parts?)',
-            r'what.*(?:chapters?|sections?|parts?).*(?:are|does).*(?:the|this).*pdf.*(?:have|contain)',
-            
-            # Research/study patterns
-            r'research.*(?:questions?|objectives?|goals?)',
-            r'(?:study|research).*(?:focus|aim|purpose)',
-            r'(?:objectives?|goals?|aims?).*(?:of|in).*(?:the|this).*(?:study|research|paper)',
-            
-            # Methodology patterns
-            r'(?:methodology|methods?).*(?:used|employed|applied)',
-            r'(?:how|what).*(?:methodology|methods?).*(?:was|were).*(?:used|employed)',
-            
-            # Findings/results patterns
-            r'(?:findings|results|conclusions?).*(?:of|in).*(?:the|this).*(?:study|research|paper)',
-            r'what.*(?:findings|results|conclusions?).*(?:does|do).*(?:the|this).*(?:study|research|paper)',
-            
-            # General content patterns
-            r'(?:discuss|cover|explain|describe).*(?:in|within).*(?:the|this).*pdf',
-            r'what.*(?:is|are).*(?:discussed|covered|explained|described).*(?:in|within).*(?:the|this).*pdf'
-        ]
-        
-        query_lower = query.lower().strip()
-        
-        # Check against patterns
-        for pattern in generic_patterns:
-            if re.search(pattern, query_lower):
-                return True
-        
-        # Additional heuristics
-        generic_keywords = [
-            'summarize', 'overview', 'summary', 'analyze', 'analysis', 'content', 'contents',
-            'main points', 'key points', 'important points', 'main topics', 'key topics',
-            'main ideas', 'key ideas', 'main concepts', 'key concepts', 'all about',
-            'everything about', 'complete analysis', 'full analysis', 'entire content',
-            'whole document', 'research questions', 'study objectives', 'research objectives',
-            'generate questions', 'create questions', 'make questions', 'list questions'
-        ]
-        
-        # Check if query contains generic keywords
-        for keyword in generic_keywords:
-            if keyword in query_lower:
-                return True
-        
-        # Check for pattern: "X questions from/about PDF"
-        if re.search(r'\d+\s+questions?.*(?:from|about|out of).*pdf', query_lower):
-            return True
-        
-        return False
+        return classify_intent(query).is_generic
 
     def _get_most_recent_pdf_content(self) -> Tuple[str, str]:
         """
         Get the full content of the most recently updated PDF
         """
-        if not self.pdf_cache:
-            return "", ""
-        
-        # Find the most recently updated PDF
-        most_recent_pdf = None
-        most_recent_timestamp = 0
-        
-        for filename, pdf_data in self.pdf_cache.items():
-            timestamp = pdf_data.get('timestamp', 0)
-            if timestamp > most_recent_timestamp:
-                most_recent_timestamp = timestamp
-                most_recent_pdf = filename
-        
-        if most_recent_pdf:
-            pdf_data = self.pdf_cache[most_recent_pdf]
-            full_content = pdf_data.get('full_text', '')
+        # Most recent PDF as published to every worker and node; the catalog is node-local
+        most_recent_pdf = self.last_updated_pdf
+        if not most_recent_pdf:
+            most_recent = self.document_catalog.most_recent()
+            if not most_recent:
+                return "", ""
+            most_recent_pdf = most_recent["filename"]
+        full_content = self.document_store.full_text(most_recent_pdf)
+        if full_content:
             return full_content, most_recent_pdf
         
         return "", ""
@@ -240,13 +189,13 @@ class QdrantIndex:
         """
         Get the full content of a specific PDF if it exists in cache
         """
-        if pdf_filename in self.pdf_cache:
-            return self.pdf_cache[pdf_filename].get('full_text', '')
+        if pdf_filename in self.document_store:
+            return self.document_store.full_text(pdf_filename)
         
-        # Try to find partial matches
-        for filename, pdf_data in self.pdf_cache.items():
-            if pdf_filename.lower() in filename.lower():
-                return pdf_data.get('full_text', '')
+        # Case-insensitive name / prefix match through the catalog's name index
+        document = self.document_catalog.find(pdf_filename)
+        if document:
+            return self.document_store.full_text(document["filename"])
         
         return ""
 
@@ -335,21 +284,39 @@ class QdrantIndex:
 #             logging.error(f"Error handling generic question: {str(e)}")
 #             return self._generate_error_response(query, str(e))
     
-    def _handle_generic_question(self, query: str, format_style: str = "academic") -> str:
+    def _handle_generic_question(self, query: str, format_style: str = "academic",
+                                 intent: Optional[QueryIntent] = None) -> str:
         try:
+            intent = intent or classify_intent(query)
             full_content, pdf_filename = self._get_most_recent_pdf_content()
             if not full_content:
                 return self._generate_no_pdf_response(query)
 
-            max_content_length = 12000
-            truncated_content = (
-                full_content[:max_content_length] + "\n\n[Note: Truncated]" if len(full_content) > max_content_length else full_content
-            )
+            with stage_timer("query", "prompt_build"):
+                prompt = self._build_generic_prompt(query, intent, full_content, pdf_filename)
+
+            # Use generic_llm
+            response = self._predict("generic_llm", prompt, intent, format_style)
+            return f"{response}\n\n---\nSource: {pdf_filename} | Mode: GenericQuestionHandler"
+
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            logging.error(f"Error handling generic question: {str(e)}")
+            return self._generate_error_response(query, str(e))
 
-            # Specialized Prompt for Question Generation
-            if re.search(r'\bgenerate\b.*\bquestions?\b', query.lower()):
-                prompt = f"""
-    You are an academic exam expert. Your job is to create 15 unique, high-quality questions along with detailed answers based on the following PDF content.
+    def _build_generic_prompt(self, query: str, intent: QueryIntent, full_content: str, pdf_filename: str) -> str:
+        """Prompt for answering (or generating questions) straight from the most recent PDF"""
+        max_content_length = 12000
+        truncated_content = (
+            full_content[:max_content_length] + "\n\n[Note: Truncated]" if len(full_content) > max_content_length else full_content
+        )
+
+        # Specialized Prompt for Question Generation
+        if intent.is_question_generation:
+            question_count = intent.requested_question_count or 15
+            prompt = f"""
+    You are an academic exam expert. Your job is to create {question_count} unique, high-quality questions along with detailed answers based on the following PDF content.
 
     **Instructions:**
     - Cover multiple cognitive levels (definition, analysis, application).
@@ -370,8 +337,8 @@ class QdrantIndex:
     {truncated_content}
     \"\"\"
     """
-            else:
-                prompt = f"""
+        else:
+            prompt = f"""
     You are an academic assistant. Answer the following query based solely on the provided PDF document.
 
     **Query:** {query}
@@ -385,16 +352,8 @@ class QdrantIndex:
     - Use formal academic language.
     - Cite the source context where appropriate.
     """
+        return prompt
 
-            # Use generic_llm
-            response = generic_llm.predict(prompt)
-            return f"{response}\n\n---\nSource: {pdf_filename} | Mode: GenericQuestionHandler"
-
-        except Exception as e:
-            logging.error(f"Error handling generic question: {str(e)}")
-            return self._generate_error_response(query, str(e))
-
-        
     def _build_question_generation_prompt(self, query: str, content: str, filename: str) -> str:
         return f"""
     You are an academic examination expert.
@@ -517,43 +476,66 @@ Would you like me to help you reformulate your question or check the system stat
         """Ultra-fast document insertion with PDF caching and timestamp tracking"""
         if max_workers is None:
             max_workers = min(mp.cpu_count(), 6)
+        loop = asyncio.get_running_loop()
         
         try:
             start_time = time.time()
             current_timestamp = time.time()
             logging.info(f"Starting multiprocessing insertion for {len(texts)} chunks with {max_workers} workers")
-
-            # Cache full PDF content for academic purposes with timestamp
-            self.pdf_cache[filename] = {
-                'full_text': ' '.join(texts),
-                'chunks': texts,
-                'metadata': metadatas,
-                'timestamp': current_timestamp
-            }
-            
-            # Update timestamp tracking
-            self.pdf_timestamps[filename] = current_timestamp
-            self.last_updated_pdf = filename
+            # Catalog reads and writes are SQLite calls; keep them off the event loop
+            def register_if_missing():
+                if self.document_catalog.get(filename) is None:
+                    self.document_catalog.register(filename, status="indexing")
+
+            await loop.run_in_executor(None, register_if_missing)
+
+            # Store full PDF content once (chunks as offsets into it) for academic purposes.
+            # The store publishes the document version; record the most recent PDF for all workers
+            def store_document():
+                self.document_store.put(filename, texts, metadatas, current_timestamp)
+                self.last_updated_pdf = filename
+
+            # Merging chunks and writing the text file and shared state happen off the event loop
+            with stage_timer("ingestion", "cache_write"):
+                await loop.run_in_executor(None, store_document)
             
-            logging.info(f"PDF {filename} cached successfully. Total cached PDFs: {len(self.pdf_cache)}")
+            logging.info(f"PDF {filename} cached successfully. Total cached PDFs: {len(self.document_store)}")
 
             # Step 1: Generate embeddings in parallel batches
             embedding_start = time.time()
-            vectors = await self._generate_embeddings_parallel(texts, max_workers, batch_size)
+            with stage_timer("ingestion", "embedding"):
+                vectors = await self._generate_embeddings_parallel(texts, max_workers, batch_size)
             embedding_time = time.time() - embedding_start
             logging.info(f"Embeddings generated in {embedding_time:.2f} seconds")
 
             # Step 2: Upload with enhanced metadata
             upload_start = time.time()
-            await self._upload_vectors_parallel(texts, metadatas, vectors, filename, max_workers, batch_size)
+            with stage_timer("ingestion", "upsert"):
+                await self._upload_vectors_parallel(texts, metadatas, vectors, filename, max_workers, batch_size)
             upload_time = time.time() - upload_start
+
+            # Step 3: Replace the document's rows in the lexical index
+            if self.lexical_index is not None:
+                lexical_metadatas = [
+                    self._chunk_metadata(text, metadata, filename, i)
+                    for i, (text, metadata) in enumerate(zip(texts, metadatas))
+                ]
+                with stage_timer("ingestion", "lexical_index"):
+                    await loop.run_in_executor(
+                        None, self.lexical_index.index_document, filename, texts, lexical_metadatas
+                    )
             
+            await loop.run_in_executor(
+                None, partial(self.document_catalog.update_status, filename, "indexed", chunk_count=len(texts))
+            )
+
             total_time = time.time() - start_time
             logging.info(f"Successfully indexed {filename} with {len(texts)} chunks in {total_time:.2f}s")
             logging.info(f"Performance breakdown - Embeddings: {embedding_time:.2f}s, Upload: {upload_time:.2f}s")
 
         except Exception as e:
             logging.error(f"Error in multiprocessing insertion: {str(e)}")
+            await loop.run_in_executor(None, self.document_catalog.update_status, filename, "failed")
             raise
 
     async def _generate_embeddings_parallel(self, texts: List[str], max_workers: int, batch_size: int) -> List[List[float]]:
@@ -606,16 +588,7 @@ Would you like me to help you reformulate your question or check the system stat
                 # Enhanced payload with comprehensive metadata
                 payload = {
                     "page_content": texts[i],
-                    "metadata": {
-                        **metadatas[i],
-                        "filename": filename,
-                        "page_number": metadatas[i].get("page", 0),
-                        "chunk_index": i,
-                        "upload_timestamp": time.time(),
-                        "content_length": len(texts[i]),
-                        "chunk_type": self._classify_chunk_type(texts[i]),
-                        "academic_relevance": self._calculate_academic_relevance(texts[i])
-                    }
+                    "metadata": self._chunk_metadata(texts[i], metadatas[i], filename, i)
                 }
                 
                 batch_points.append(
@@ -642,6 +615,19 @@ Would you like me to help you reformulate your question or check the system stat
             
             await asyncio.gather(*tasks)
 
+    def _chunk_metadata(self, text: str, metadata: dict, filename: str, chunk_index: int) -> dict:
+        """Chunk metadata as stored in Qdrant and the lexical index"""
+        return {
+            **metadata,
+            "filename": filename,
+            "page_number": metadata.get("page", 0),
+            "chunk_index": chunk_index,
+            "upload_timestamp": time.time(),
+            "content_length": len(text),
+            "chunk_type": self._classify_chunk_type(text),
+            "academic_relevance": self._calculate_academic_relevance(text)
+        }
+
     def _classify_chunk_type(self, text: str) -> str:
         """Classify chunk type for better academic processing"""
         text_lower = text.lower()
@@ -670,17 +656,32 @@ Would you like me to help you reformulate your question or check the system stat
         score = sum(1 for keyword in academic_keywords if keyword in text_lower)
         return min(score / len(academic_keywords), 1.0)
 
-    def insert_into_index(self, filepath: str, filename: str, batch_size: int = 100, max_workers: int = 4):
-        """Enhanced document insertion with better async handling"""
-        try:
-            logging.info(f"Loading PDF: {filename}")
-            loader = PDFMinerLoader(filepath)
-            docs = loader.load()
-
-            if not docs or not docs[0].page_content.strip():
-                logging.warning(f"Empty document: {filename}")
-                return
-
+    def _register_document(self, filepath: str, filename: str, owner_id: Optional[int] = None,
+                           page_count: Optional[int] = None):
+        """Record the upload in the document catalog before indexing starts"""
+        self.document_catalog.register(
+            filename,
+            owner_id=owner_id,
+            content_hash=file_content_hash(filepath),
+            size_bytes=os.path.getsize(filepath),
+            page_count=page_count,
+            status="indexing"
+        )
+
+    def _extract_chunks(self, filepath: str, filename: str, owner_id: Optional[int] = None,
+                        page_count: Optional[int] = None) -> Optional[Tuple[List[str], List[dict]]]:
+        """Register the upload, extract its text and split it; None when nothing usable was found"""
+        logging.info(f"Loading PDF: {filename}")
+        self._register_document(filepath, filename, owner_id, page_count)
+        with stage_timer("ingestion", "extraction"):
+            docs = PDFMinerLoader(filepath).load()
+
+        if not docs or not docs[0].page_content.strip():
+            logging.warning(f"Empty document: {filename}")
+            self.document_catalog.update_status(filename, "failed")
+            return None
+
+        with stage_timer("ingestion", "splitting"):
             text_splitter = RecursiveCharacterTextSplitter(
                 chunk_size=1000,  # Increased for better context
                 chunk_overlap=150,
@@ -689,12 +690,21 @@ Would you like me to help you reformulate your question or check the system stat
             )
             documents = text_splitter.split_documents(docs)
 
-            if not documents:
-                logging.warning(f"No valid chunks created from: {filename}")
-                return
+        if not documents:
+            logging.warning(f"No valid chunks created from: {filename}")
+            self.document_catalog.update_status(filename, "failed")
+            return None
+
+        return [doc.page_content for doc in documents], [doc.metadata for doc in documents]
 
-            texts = [doc.page_content for doc in documents]
-            metadatas = [doc.metadata for doc in documents]
+    def insert_into_index(self, filepath: str, filename: str, batch_size: int = 100, max_workers: int = 4,
+                          owner_id: Optional[int] = None, page_count: Optional[int] = None):
+        """Enhanced document insertion with better async handling"""
+        try:
+            chunks = self._extract_chunks(filepath, filename, owner_id, page_count)
+            if chunks is None:
+                return
+            texts, metadatas = chunks
 
             # Better async handling
             try:
@@ -718,31 +728,17 @@ Would you like me to help you reformulate your question or check the system stat
             logging.error(f"Error inserting document {filename}: {str(e)}")
             raise
 
-    async def insert_into_index_async(self, filepath: str, filename: str, batch_size: int = 100, max_workers: int = 4):
+    async def insert_into_index_async(self, filepath: str, filename: str, batch_size: int = 100, max_workers: int = 4,
+                                      owner_id: Optional[int] = None, page_count: Optional[int] = None):
         """Async version of insert_into_index"""
         try:
-            logging.info(f"Loading PDF: {filename}")
-            loader = PDFMinerLoader(filepath)
-            docs = loader.load()
-
-            if not docs or not docs[0].page_content.strip():
-                logging.warning(f"Empty document: {filename}")
-                return
-
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=150,
-                length_function=len,
-                separators=["\n\n", "\n", ". ", " ", ""]
+            # Catalog writes, PDF extraction and splitting all block; run them off the event loop
+            chunks = await asyncio.get_running_loop().run_in_executor(
+                None, in_context(self._extract_chunks, filepath, filename, owner_id, page_count)
             )
-            documents = text_splitter.split_documents(docs)
-
-            if not documents:
-                logging.warning(f"No valid chunks created from: {filename}")
+            if chunks is None:
                 return
-
-            texts = [doc.page_content for doc in documents]
-            metadatas = [doc.metadata for doc in documents]
+            texts, metadatas = chunks
 
             await self.insert_with_multiprocessing(texts, metadatas, filename, max_workers, batch_size)
 
@@ -750,31 +746,14 @@ Would you like me to help you reformulate your question or check the system stat
             logging.error(f"Error inserting document {filename}: {str(e)}")
             raise
 
-    def insert_into_index_threaded(self, filepath: str, filename: str, batch_size: int = 100, max_workers: int = 4):
+    def insert_into_index_threaded(self, filepath: str, filename: str, batch_size: int = 100, max_workers: int = 4,
+                                   owner_id: Optional[int] = None, page_count: Optional[int] = None):
         """Thread-based solution for sync contexts"""
         try:
-            logging.info(f"Loading PDF: {filename}")
-            loader = PDFMinerLoader(filepath)
-            docs = loader.load()
-
-            if not docs or not docs[0].page_content.strip():
-                logging.warning(f"Empty document: {filename}")
-                return
-
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=1000,
-                chunk_overlap=150,
-                length_function=len,
-                separators=["\n\n", "\n", ". ", " ", ""]
-            )
-            documents = text_splitter.split_documents(docs)
-
-            if not documents:
-                logging.warning(f"No valid chunks created from: {filename}")
+            chunks = self._extract_chunks(filepath, filename, owner_id, page_count)
+            if chunks is None:
                 return
-
-            texts = [doc.page_content for doc in documents]
-            metadatas = [doc.metadata for doc in documents]
+            texts, metadatas = chunks
 
             def run_async_in_thread():
                 loop = asyncio.new_event_loop()
@@ -800,34 +779,42 @@ Would you like me to help you reformulate your question or check the system stat
         """
         try:
             start_time = time.time()
+            set_request_labels(format_style=format_style)
             
-            # Check if this is a generic question
-            if self._is_generic_question(query):
+            # Classify the query once; every routing decision below reuses this intent
+            with stage_timer("query", "intent_classification"):
+                intent = classify_intent(query)
+            if intent.is_generic:
                 logging.info(f"Detected generic question: {query}")
-                return self._handle_generic_question(query, format_style)
+                return self._handle_generic_question(query, format_style, intent)
             
             # Step 1: Enhanced PDF context search with relevance scoring
+            check_deadline("retrieval")
             pdf_context, sources, search_metadata = self._get_enhanced_pdf_context(query, top_k)
             
             # Step 2: Determine if we should use direct OpenAI API with PDF
-            use_direct_api = self._should_use_direct_pdf_api(query, sources)
+            use_direct_api = self._should_use_direct_pdf_api(query, sources, intent)
             
             # Step 3: Generate response based on context availability
             if pdf_context and len(pdf_context.strip()) > 100:
                 # PDF context found - create enhanced query with references
-                enhanced_query = self._create_enhanced_query_with_references(query, pdf_context, sources)
-                response = self._generate_structured_response(enhanced_query, pdf_context, format_style)
+                with stage_timer("query", "prompt_build"):
+                    enhanced_query = self._create_enhanced_query_with_references(query, pdf_context, sources)
+                response = self._generate_structured_response(enhanced_query, pdf_context, format_style, intent)
             else:
                 # No strong PDF context - use comprehensive AI response
-                response = self._generate_comprehensive_response(query, "", format_style)
+                response = self._generate_comprehensive_response(query, "", format_style, intent)
             
             # Step 4: Format response according to specified style
-            formatted_response = self._format_response_by_style(
-                response, sources, search_metadata, format_style, time.time() - start_time
-            )
+            with stage_timer("query", "formatting"):
+                formatted_response = self._format_response_by_style(
+                    response, sources, search_metadata, format_style, time.time() - start_time
+                )
             
             return formatted_response
 
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logging.error(f"Error in query_and_generate_response: {str(e)}")
             return self._generate_error_fallback_response(query, str(e))
@@ -835,19 +822,49 @@ Would you like me to help you reformulate your question or check the system stat
     def _get_enhanced_pdf_context(self, query: str, top_k: int) -> Tuple[str, List[Dict], Dict]:
         """Enhanced PDF context extraction with better relevance scoring"""
         try:
-            query_vector = self.embedding_model.embed_query(query)
-            search_results = self.qdrant_client.search(
-                collection_name=self.collection_name,
-                query_vector=query_vector,
-                limit=top_k,
-                score_threshold=0.25,
-                with_payload=True
-            )
+            with stage_timer("query", "query_embedding"):
+                query_vector = self.embedding_model.embed_query(query)
+            limit = max(top_k, settings.rerank_candidates) if self.reranker.enabled else top_k
+            with stage_timer("query", "qdrant_search"):
+                search_results = self.qdrant_client.search(
+                    collection_name=self.collection_name,
+                    query_vector=query_vector,
+                    limit=limit,
+                    score_threshold=0.25,
+                    with_payload=True
+                )
+            lexical_count = 0
+            if self.lexical_index is not None:
+                # Exact terms (symbols, section numbers, rare names) that embeddings blur
+                with stage_timer("query", "lexical_search"):
+                    lexical_results = self.lexical_index.search(query, settings.hybrid_lexical_candidates)
+                lexical_count = len(lexical_results)
+                search_results = fuse(search_results, lexical_results, settings.hybrid_rrf_k,
+                                      limit=max(limit, settings.hybrid_lexical_candidates))
+                if not self.reranker.enabled:
+                    search_results = search_results[:top_k]
+            candidate_count = len(search_results)
+            rerank_scores = []
+            if self.reranker.enabled and search_results:
+                with stage_timer("query", "rerank"):
+                    reranked = self.reranker.rerank(
+                        query, search_results, lambda result: result.payload.get("page_content", ""),
+                        top_k=min(top_k, self.reranker.top_k)
+                    )
+                if any(score is not None for _, score in reranked):
+                    search_results = [result for result, _ in reranked]
+                    rerank_scores = [score for _, score in reranked]
+                else:
+                    # Cross-encoder unavailable: keep the dense top_k rather than cutting to RERANK_TOP_K
+                    search_results = search_results[:top_k]
 
             pdf_context = ""
             sources = []
+            hits = []
             search_metadata = {
                 "total_results": len(search_results),
+                "candidates": candidate_count,
+                "lexical_candidates": lexical_count,
                 "avg_score": 0,
                 "best_score": 0,
                 "document_types": set(),
@@ -855,9 +872,12 @@ Would you like me to help you reformulate your question or check the system stat
             }
             
             if search_results:
-                scores = [result.score for result in search_results]
-                search_metadata["avg_score"] = sum(scores) / len(scores)
-                search_metadata["best_score"] = max(scores)
+                # Cosine statistics cover dense hits only; chunks found only by BM25 have no cosine score
+                scores = [result.score for result in search_results if result.score is not None]
+                search_metadata["lexical_only"] = len(search_results) - len(scores)
+                if scores:
+                    search_metadata["avg_score"] = sum(scores) / len(scores)
+                    search_metadata["best_score"] = max(scores)
                 
                 for i, result in enumerate(search_results):
                     payload = result.payload
@@ -866,9 +886,15 @@ Would you like me to help you reformulate your question or check the system stat
                     
                     if content:
                         # Enhanced context formatting with clear source attribution
-                        pdf_context += f"\n--- SOURCE {i+1}: {metadata.get('filename', 'Unknown')} | Page {metadata.get('page_number', 'Unknown')} | Score: {result.score:.3f} ---\n"
+                        lexical_score = getattr(result, "lexical_score", None)
+                        score_label = (
+                            f"Score: {result.score:.3f}" if result.score is not None else f"BM25: {lexical_score:.2f}"
+                        )
+                        pdf_context += f"\n--- SOURCE {i+1}: {metadata.get('filename', 'Unknown')} | Page {metadata.get('page_number', 'Unknown')} | {score_label} ---\n"
                         pdf_context += content + "\n"
                         
+                        # The compressor weights passages by score; lexical-only chunks use their scaled RRF score
+                        hits.append((content, metadata, result.score if result.score is not None else result.fused_score))
                         search_metadata["document_types"].add(metadata.get("chunk_type", "content"))
                         search_metadata["academic_relevance"] += metadata.get("academic_relevance", 0)
                         
@@ -879,12 +905,21 @@ Would you like me to help you reformulate your question or check the system stat
                             "score": result.score,
                             "content_preview": content[:100] + "..." if len(content) > 100 else content,
                             "chunk_type": metadata.get("chunk_type", "content"),
-                            "academic_relevance": metadata.get("academic_relevance", 0)
+                            "academic_relevance": metadata.get("academic_relevance", 0),
+                            "rerank_score": rerank_scores[i] if rerank_scores else None,
+                            "fused_score": getattr(result, "fused_score", None),
+                            "lexical_rank": getattr(result, "lexical_rank", None),
+                            "lexical_score": lexical_score
                         })
                 
                 if sources:
                     search_metadata["academic_relevance"] /= len(sources)
                 search_metadata["document_types"] = list(search_metadata["document_types"])
+
+            if hits and self.context_compressor.enabled:
+                with stage_timer("query", "context_compression"):
+                    pdf_context, compression = self.context_compressor.compress(query, hits, raw_context=pdf_context)
+                search_metadata.update(compression)
             
             return pdf_context, sources, search_metadata
 
@@ -892,20 +927,15 @@ Would you like me to help you reformulate your question or check the system stat
             logging.error(f"Error in enhanced PDF context search: {str(e)}")
             return "", [], {"error": str(e)}
 
-    def _should_use_direct_pdf_api(self, query: str, sources: List[Dict]) -> bool:
+    def _should_use_direct_pdf_api(self, query: str, sources: List[Dict],
+                                   intent: Optional[QueryIntent] = None) -> bool:
         """Determine if we should use direct PDF API for better responses"""
         # Use direct API if we have good sources and complex query
-        if len(sources) >= 3 and any(source["score"] > 0.7 for source in sources):
+        if len(sources) >= 3 and any((source["score"] or 0) > 0.7 for source in sources):
             return True
         
-        # Check for complex analytical queries
-        complex_patterns = [
-            r'compare.*with', r'analyze.*relationship', r'what.*difference',
-            r'how.*relate', r'connection.*between', r'impact.*of'
-        ]
-        
-        query_lower = query.lower()
-        return any(re.search(pattern, query_lower) for pattern in complex_patterns)
+        # Complex analytical (comparison/relationship) queries
+        return (intent or classify_intent(query)).is_comparison
 
     def _create_enhanced_query_with_references(self, query: str, pdf_context: str, sources: List[Dict]) -> str:
         """Create enhanced query with source references"""
@@ -925,6 +955,13 @@ Would you like me to help you reformulate your question or check the system stat
             """
         return enhanced_query
 
+    @staticmethod
+    def _format_score(source: Dict) -> str:
+        """Cosine score of a source, or its BM25 score when only the lexical index found it"""
+        if source["score"] is None:
+            return f"BM25 {source['lexical_score']:.2f}"
+        return f"{source['score']:.3f}"
+
     def _create_source_summary(self, sources: List[Dict]) -> str:
         """Create a summary of sources for reference"""
         if not sources:
@@ -932,35 +969,74 @@ Would you like me to help you reformulate your question or check the system stat
         
         summary = f"Found {len(sources)} relevant sources:\n"
         for i, source in enumerate(sources, 1):
-            summary += f"  {i}. {source['filename']} (Page {source['page_number']}) - Score: {source['score']:.3f}\n"
+            summary += f"  {i}. {source['filename']} (Page {source['page_number']}) - Score: {self._format_score(source)}\n"
         
         return summary
 
-    def _generate_structured_response(self, enhanced_query: str, pdf_context: str, format_style: str) -> str:
+    def _predict(self, llm_name: str, prompt: str, intent: QueryIntent, format_style: str) -> str:
+        """
+        Call an LLM resource on the model the router picks, within the request
+        deadline and hedging slow calls. The reply is streamed so
+        time-to-first-token is measured and a cancelled attempt stops reading.
+        """
+        llm = resources.get(llm_name)
+        prompt_tokens = count_tokens(prompt)
+        route = self.model_router.route(intent, prompt_tokens, format_style)
+
+        def attempt(model: str, cancelled: threading.Event) -> str:
+            parts = []
+            start = time.perf_counter()
+            # Bounds a stalled stream too: the client gives up at the deadline instead of holding the thread
+            timeout = request_timeout()
+            stream = llm.stream(prompt, model=model, **({"timeout": timeout} if timeout is not None else {}))
+            try:
+                for chunk in stream:
+                    if not parts:
+                        llm_ttft_seconds.observe(time.perf_counter() - start, model=llm_name)
+                    parts.append(chunk.content)
+                    if cancelled.is_set():
+                        break
+            finally:
+                stream.close()
+                completion_tokens = count_tokens("".join(parts))
+                report_llm_usage(model, prompt_tokens, completion_tokens)
+                self.model_router.record(route, model, time.perf_counter() - start, prompt_tokens, completion_tokens)
+            return "".join(parts)
+
+        check_deadline("llm_call")
+        with stage_timer("query", "llm_call"):
+            return hedged_sync(attempt, route.model, self.hedge_policy)
+
+    def _generate_structured_response(self, enhanced_query: str, pdf_context: str, format_style: str,
+                                      intent: QueryIntent) -> str:
         """Generate structured response using appropriate LLM"""
         try:
             if format_style == "academic":
-                llm = academic_llm
+                llm = "academic_llm"
                 system_prompt = """You are an expert academic researcher. Provide scholarly, well-referenced responses with proper citations and formal language."""
             elif format_style == "comprehensive":
-                llm = comprehensive_llm
+                llm = "comprehensive_llm"
                 system_prompt = """You are a comprehensive AI assistant. Provide detailed, thorough responses with clear structure and examples."""
             else:
-                llm = formatting_llm
+                llm = "formatting_llm"
                 system_prompt = """You are a professional AI assistant. Provide clear, well-formatted responses that are easy to understand."""
             
             full_prompt = f"{system_prompt}\n\n{enhanced_query}"
-            response = llm.predict(full_prompt)
+            response = self._predict(llm, full_prompt, intent, format_style)
             
             return response
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logging.error(f"Error generating structured response: {str(e)}")
             return self._generate_fallback_response(enhanced_query)
 
-    def _generate_comprehensive_response(self, query: str, context: str, format_style: str) -> str:
+    def _generate_comprehensive_response(self, query: str, context: str, format_style: str,
+                                         intent: Optional[QueryIntent] = None) -> str:
         """Generate comprehensive response when no strong PDF context is available"""
         try:
+            intent = intent or classify_intent(query)
             prompt = f"""
                     Query: {query}
 
@@ -971,17 +1047,20 @@ Would you like me to help you reformulate your question or check the system stat
                     """
             
             if format_style == "academic":
-                if "generate" in query.lower() and "question" in query.lower():
-                    prompt = self._build_question_generation_prompt(query, context, pdf_filename)
-                else:
-                    prompt = self._build_standard_academic_prompt(query, truncated_content, pdf_filename)
+                with stage_timer("query", "prompt_build"):
+                    if intent.is_question_generation:
+                        prompt = self._build_question_generation_prompt(query, context, "retrieved context")
+                    else:
+                        prompt = self._build_standard_academic_prompt(query, context, "retrieved context")
 
-                response = academic_llm.predict(prompt)
+                response = self._predict("academic_llm", prompt, intent, format_style)
             else:
-                response = comprehensive_llm.predict(prompt)
+                response = self._predict("comprehensive_llm", prompt, intent, format_style)
 
             return response
             
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             logging.error(f"Error generating comprehensive response: {str(e)}")
             return f"I apologize, but I encountered an error while processing your query: {query}. Please try rephrasing your question or check if the PDF documents are properly loaded."
@@ -1004,6 +1083,8 @@ Would you like me to help you reformulate your question or check the system stat
             formatted_response += f"- Sources Found: {search_metadata.get('total_results', 0)}\n"
             formatted_response += f"- Average Relevance Score: {search_metadata.get('avg_score', 0):.3f}\n"
             formatted_response += f"- Best Match Score: {search_metadata.get('best_score', 0):.3f}\n"
+            if search_metadata.get("lexical_only"):
+                formatted_response += f"- Keyword-only Matches (BM25, not in the scores above): {search_metadata['lexical_only']}\n"
             
             return formatted_response
             
@@ -1019,7 +1100,7 @@ Would you like me to help you reformulate your question or check the system stat
             formatted_response += "## Sources and References\n\n"
             for i, source in enumerate(sources, 1):
                 formatted_response += f"**[{i}]** {source['filename']} - Page {source['page_number']} "
-                formatted_response += f"(Relevance: {source['score']:.3f}, Type: {source['chunk_type']})\n"
+                formatted_response += f"(Relevance: {self._format_score(source)}, Type: {source['chunk_type']})\n"
                 formatted_response += f"   *Preview:* {source['content_preview']}\n\n"
         
         return formatted_response
@@ -1033,7 +1114,7 @@ Would you like me to help you reformulate your question or check the system stat
             for i, source in enumerate(sources, 1):
                 formatted_response += f"### Source {i}: {source['filename']}\n"
                 formatted_response += f"- **Page:** {source['page_number']}\n"
-                formatted_response += f"- **Relevance Score:** {source['score']:.3f}\n"
+                formatted_response += f"- **Relevance Score:** {self._format_score(source)}\n"
                 formatted_response += f"- **Content Type:** {source['chunk_type']}\n"
                 formatted_response += f"- **Academic Relevance:** {source['academic_relevance']:.3f}\n"
                 formatted_response += f"- **Preview:** {source['content_preview']}\n\n"
@@ -1047,7 +1128,7 @@ Would you like me to help you reformulate your question or check the system stat
         if sources:
             formatted_response += "**Sources:**\n"
             for i, source in enumerate(sources, 1):
-                formatted_response += f"{i}. {source['filename']} (Page {source['page_number']}) - Score: {source['score']:.3f}\n"
+                formatted_response += f"{i}. {source['filename']} (Page {source['page_number']}) - Score: {self._format_score(source)}\n"
         
         return formatted_response
 
@@ -1109,8 +1190,9 @@ If the problem persists, please check the system logs for more detailed error in
                 "indexed_vectors": collection_info.indexed_vectors_count,
                 "vector_size": collection_info.config.params.vectors.size,
                 "distance_metric": collection_info.config.params.vectors.distance.name,
-                "cached_pdfs": len(self.pdf_cache),
-                "pdf_filenames": list(self.pdf_cache.keys()),
+                "cached_pdfs": len(self.document_store),
+                "catalog_documents": self.document_catalog.count(),
+                "pdf_filenames": self.document_store.filenames(),
                 "last_updated_pdf": self.last_updated_pdf,
                 "sample_points": len(sample_points[0]) if sample_points else 0
             }
@@ -1121,12 +1203,36 @@ If the problem persists, please check the system logs for more detailed error in
             logging.error(f"Error getting collection info: {str(e)}")
             return {"error": str(e)}
 
+    def remove_document(self, filename: str) -> bool:
+        """Remove a document's vectors, stored text and catalog entry"""
+        try:
+            self.qdrant_client.delete(
+                collection_name=self.collection_name,
+                points_selector=rest.FilterSelector(
+                    filter=Filter(must=[
+                        rest.FieldCondition(key="metadata.filename", match=rest.MatchValue(value=filename))
+                    ])
+                )
+            )
+            self.document_store.remove(filename)
+            if self.lexical_index is not None:
+                self.lexical_index.remove_document(filename)
+            self.document_catalog.remove(filename)
+            if self.last_updated_pdf == filename:
+                self.last_updated_pdf = None
+            logging.info(f"Document {filename} removed from index")
+            return True
+        except Exception as e:
+            logging.error(f"Error removing document {filename}: {str(e)}")
+            raise
+
     def delete_collection(self):
         """Delete the current collection"""
         try:
             self.qdrant_client.delete_collection(self.collection_name)
-            self.pdf_cache.clear()
-            self.pdf_timestamps.clear()
+            self.document_store.clear()
+            if self.lexical_index is not None:
+                self.lexical_index.clear()
             self.last_updated_pdf = None
             logging.info(f"Collection {self.collection_name} deleted successfully")
             return True
@@ -1138,17 +1244,21 @@ If the problem persists, please check the system logs for more detailed error in
         """List all cached PDFs with their metadata"""
         try:
             pdf_info = {}
-            for filename, data in self.pdf_cache.items():
+            memory_usage = self.document_store.memory_usage()
+            for filename, usage in memory_usage["documents"].items():
                 pdf_info[filename] = {
-                    "timestamp": data.get("timestamp", 0),
-                    "chunks_count": len(data.get("chunks", [])),
-                    "total_characters": len(data.get("full_text", "")),
-                    "last_updated": time.ctime(data.get("timestamp", 0))
+                    "timestamp": usage["timestamp"],
+                    "chunks_count": usage["chunks"],
+                    "total_bytes": usage["text_bytes"],
+                    "last_updated": time.ctime(usage["timestamp"]),
+                    "memory": usage
                 }
             
             return {
-                "total_cached_pdfs": len(self.pdf_cache),
+                "total_cached_pdfs": len(self.document_store),
                 "most_recent_pdf": self.last_updated_pdf,
+                "resident_bytes": memory_usage["resident_bytes"],
+                "memory_budget_bytes": memory_usage["memory_budget_bytes"],
                 "pdf_details": pdf_info
             }
             
@@ -1159,8 +1269,7 @@ If the problem persists, please check the system logs for more detailed error in
     def clear_pdf_cache(self):
         """Clear the PDF cache"""
         try:
-            self.pdf_cache.clear()
-            self.pdf_timestamps.clear()
+            self.document_store.clear()
             self.last_updated_pdf = None
             logging.info("PDF cache cleared successfully")
             return True
@@ -0,0 +1,279 @@
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import logging
+import math
+import threading
+import time
+
+from metrics import registry
+
+CREATE_LLM_USAGE_SQL = '''
+    CREATE TABLE IF NOT EXISTS llm_usage (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        endpoint TEXT NOT NULL,
+        model TEXT,
+        estimated_tokens INTEGER NOT NULL,
+        prompt_tokens INTEGER NOT NULL,
+        completion_tokens INTEGER NOT NULL,
+        timestamp TIMESTAMP NOT NULL
+    )
+'''
+LLM_USAGE_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS idx_llm_usage_timestamp_user ON llm_usage (timestamp, user_id)",
+    "CREATE INDEX IF NOT EXISTS idx_llm_usage_user_timestamp ON llm_usage (user_id, timestamp)",
+)
+INSERT_LLM_USAGE_SQL = '''
+    INSERT INTO llm_usage (user_id, endpoint, model, estimated_tokens, prompt_tokens, completion_tokens, timestamp)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+# Month-to-date and today's totals per user, read at startup and on every sync
+SELECT_USAGE_TOTALS_SQL = '''
+    SELECT user_id,
+           SUM(prompt_tokens + completion_tokens) AS month_tokens,
+           SUM(CASE WHEN timestamp >= ? THEN prompt_tokens + completion_tokens ELSE 0 END) AS day_tokens
+    FROM llm_usage
+    WHERE timestamp >= ?
+    GROUP BY user_id
+'''
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+rate_limit_rejections = registry.counter(
+    "questgen_rate_limit_rejections_total", "Requests refused by per-user limits", labelnames=("reason",)
+)
+llm_tokens_used = registry.counter(
+    "questgen_llm_tokens_total", "LLM tokens used by user requests", labelnames=("kind",), context_labels=True
+)
+
+
+class RateLimited(Exception):
+    """Raised when a user is over a rate limit or quota"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Rate limit exceeded ({reason}), retry in {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket, refilled lazily; the level may go negative when usage is reconciled"""
+
+    __slots__ = ("capacity", "rate", "level", "updated")
+
+    def __init__(self, capacity: float, rate: float):
+        self.capacity = capacity
+        self.rate = rate
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, amount: float) -> float:
+        """Take `amount`, or return the seconds until it would be available (0 on success)"""
+        now = time.monotonic()
+        self._refill(now)
+        # A request larger than the whole bucket goes through when the bucket is full
+        if self.level >= amount or amount > self.capacity and self.level >= self.capacity:
+            self.level -= amount
+            return 0.0
+        return (amount - self.level) / self.rate if self.rate > 0 else math.inf
+
+    def adjust(self, amount: float):
+        """Give back (positive) or charge (negative) tokens after the fact"""
+        self._refill(time.monotonic())
+        self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass
+class UserUsage:
+    requests: TokenBucket
+    llm_tokens: TokenBucket
+    day: str
+    month: str
+    day_tokens: int = 0
+    month_tokens: int = 0
+
+
+@dataclass
+class UsageScope:
+    """LLM usage of one request: the admitted estimate and the calls actually made"""
+    user_id: int
+    endpoint: str
+    estimated_tokens: int = 0
+    calls: List[Tuple[str, int, int]] = field(default_factory=list)  # (model, prompt, completion)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+
+_usage_scope: ContextVar[Optional[UsageScope]] = ContextVar("usage_scope", default=None)
+
+
+def report_llm_usage(model: str, prompt_tokens: int, completion_tokens: int):
+    """Attribute one LLM call to the request being served, if it is metered"""
+    scope = _usage_scope.get()
+    llm_tokens_used.inc(prompt_tokens, kind="prompt")
+    llm_tokens_used.inc(completion_tokens, kind="completion")
+    if scope is not None:
+        with scope._lock:
+            scope.calls.append((model, prompt_tokens, completion_tokens))
+
+
+class UserRateLimiter:
+    """
+    Per-user token buckets on requests and on LLM tokens, plus daily and
+    monthly token quotas, all checked in memory.
+
+    State is O(1) per user in a bounded LRU. Actual usage goes to the
+    llm_usage ledger through a write-behind queue, so admission never waits
+    on SQLite. Quota totals are loaded from the ledger at startup and
+    re-synced periodically, which also folds in usage recorded by other
+    workers (totals are approximate across workers between syncs).
+    Quotas of 0 disable the corresponding check.
+    """
+
+    def __init__(self, ledger, requests_per_minute: float, request_burst: int,
+                 llm_tokens_per_minute: float, llm_token_burst: int,
+                 daily_token_quota: int = 0, monthly_token_quota: int = 0, max_users: int = 100000):
+        self.ledger = ledger
+        self.requests_per_minute = requests_per_minute
+        self.request_burst = request_burst
+        self.llm_tokens_per_minute = llm_tokens_per_minute
+        self.llm_token_burst = llm_token_burst
+        self.daily_token_quota = daily_token_quota
+        self.monthly_token_quota = monthly_token_quota
+        self.max_users = max_users
+        self._users: "OrderedDict[int, UserUsage]" = OrderedDict()
+        self._baseline: Dict[int, Tuple[int, int]] = {}  # user_id -> (day, month) tokens at last sync
+        self._baseline_period: Tuple[str, str] = self._period()
+        self.rejected = 0
+        self.recorded = 0
+        self.last_sync = None
+
+    @staticmethod
+    def _period(now: Optional[datetime] = None) -> Tuple[str, str]:
+        now = now or datetime.utcnow()
+        return now.strftime("%Y-%m-%d"), now.strftime("%Y-%m")
+
+    def _user(self, user_id: int) -> UserUsage:
+        day, month = self._period()
+        usage = self._users.get(user_id)
+        if usage is None:
+            baseline = self._baseline.get(user_id, (0, 0)) if self._baseline_period == (day, month) else (0, 0)
+            usage = UserUsage(
+                requests=TokenBucket(self.request_burst, self.requests_per_minute / 60),
+                llm_tokens=TokenBucket(self.llm_token_burst, self.llm_tokens_per_minute / 60),
+                day=day, month=month, day_tokens=baseline[0], month_tokens=baseline[1]
+            )
+            self._users[user_id] = usage
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+            if usage.month != month:
+                usage.month, usage.month_tokens = month, 0
+            if usage.day != day:
+                usage.day, usage.day_tokens = day, 0
+        return usage
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected += 1
+        rate_limit_rejections.inc(reason=reason)
+        raise RateLimited(reason, max(1, math.ceil(min(retry_after, 31 * 86400))))
+
+    def open(self, user_id: int, endpoint: str) -> UsageScope:
+        """Admit one request against the user's request bucket and start metering it"""
+        wait = self._user(user_id).requests.take(1)
+        if wait:
+            self._reject("requests", wait)
+        scope = UsageScope(user_id, endpoint)
+        _usage_scope.set(scope)
+        return scope
+
+    def open_background(self, user_id: int, endpoint: str) -> UsageScope:
+        """Start metering LLM work done for a user outside a request; never rejected, but close() bills it"""
+        scope = UsageScope(user_id, endpoint)
+        _usage_scope.set(scope)
+        return scope
+
+    def reserve(self, scope: UsageScope, estimated_tokens: int):
+        """Check quotas and take the estimated LLM tokens before calling the model"""
+        usage = self._user(scope.user_id)
+        now = datetime.utcnow()
+        if self.daily_token_quota and usage.day_tokens + estimated_tokens > self.daily_token_quota:
+            tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+            self._reject("daily_quota", (tomorrow - now).total_seconds())
+        if self.monthly_token_quota and usage.month_tokens + estimated_tokens > self.monthly_token_quota:
+            next_month = (now.replace(day=28) + timedelta(days=4)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+            self._reject("monthly_quota", (next_month - now).total_seconds())
+        wait = usage.llm_tokens.take(estimated_tokens)
+        if wait:
+            self._reject("llm_tokens", wait)
+        scope.estimated_tokens += estimated_tokens
+
+    async def close(self, scope: UsageScope):
+        """Reconcile the estimate with actual usage and queue the ledger row"""
+        with scope._lock:
+            calls = list(scope.calls)
+        if not calls and not scope.estimated_tokens:
+            return
+        prompt_tokens = sum(call[1] for call in calls)
+        completion_tokens = sum(call[2] for call in calls)
+        actual = prompt_tokens + completion_tokens
+        usage = self._user(scope.user_id)
+        usage.llm_tokens.adjust(scope.estimated_tokens - actual)
+        usage.day_tokens += actual
+        usage.month_tokens += actual
+        self.recorded += 1
+        models = ",".join(sorted({call[0] for call in calls})) or None
+        await self.ledger.submit((
+            scope.user_id, scope.endpoint, models, scope.estimated_tokens,
+            prompt_tokens, completion_tokens, datetime.utcnow().strftime(TIMESTAMP_FORMAT)
+        ))
+
+    async def sync(self, db):
+        """Reload month-to-date and daily totals from the ledger (off the request path)"""
+        day, month = self._period()
+        rows = await db.fetchall(SELECT_USAGE_TOTALS_SQL, (f"{day} 00:00:00", f"{month}-01 00:00:00"))
+        self._baseline = {row["user_id"]: (row["day_tokens"] or 0, row["month_tokens"] or 0) for row in rows}
+        self._baseline_period = (day, month)
+        for user_id, (day_tokens, month_tokens) in self._baseline.items():
+            usage = self._users.get(user_id)
+            if usage is not None and usage.day == day and usage.month == month:
+                # Local totals include rows still queued here; the ledger includes other workers
+                usage.day_tokens = max(usage.day_tokens, day_tokens)
+                usage.month_tokens = max(usage.month_tokens, month_tokens)
+        self.last_sync = time.time()
+
+    async def run_sync(self, db, interval: float):
+        while True:
+            try:
+                await self.sync(db)
+            except Exception as e:
+                logging.error(f"Usage totals sync failed: {e}")
+            await asyncio.sleep(interval)
+
+    def user_stats(self, user_id: int) -> Dict:
+        usage = self._user(user_id)
+        return {
+            "day": usage.day,
+            "day_tokens": usage.day_tokens,
+            "daily_token_quota": self.daily_token_quota or None,
+            "month": usage.month,
+            "month_tokens": usage.month_tokens,
+            "monthly_token_quota": self.monthly_token_quota or None,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "tracked_users": len(self._users),
+            "requests_per_minute": self.requests_per_minute,
+            "llm_tokens_per_minute": self.llm_tokens_per_minute,
+            "rejected": self.rejected,
+            "recorded": self.recorded,
+            "last_sync": self.last_sync,
+        }
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+import hashlib
+import logging
+import threading
+import time
+
+from metrics import record_cache_lookup, registry
+
+T = TypeVar("T")
+
+rerank_seconds = registry.histogram(
+    "questgen_rerank_seconds", "Cross-encoder reranking time per query", context_labels=True
+)
+rerank_pairs = registry.counter(
+    "questgen_rerank_pairs_total", "Candidate passages per rerank outcome (scored, cached, unscored)",
+    labelnames=("outcome",)
+)
+
+
+def _key(query: str, text: str) -> bytes:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(" ".join(query.lower().split()).encode())
+    digest.update(b"\x00")
+    digest.update(text.encode())
+    return digest.digest()
+
+
+class Reranker:
+    """
+    Second retrieval stage. A small cross-encoder scores (query, passage)
+    pairs on CPU, in batches, best dense hits first. Scores are cached per
+    (query, passage) in an LRU. Scoring stops when the next batch would
+    overrun budget_seconds, judged by the moving average time per pair.
+    Candidates left unscored keep their dense order after the scored ones.
+    If the model cannot be loaded the dense order is returned unchanged.
+    """
+
+    def __init__(self, load_model: Callable[[], object], enabled: bool = True, top_k: int = 4,
+                 batch_size: int = 16, budget_seconds: float = 0.3, cache_size: int = 20000):
+        self.load_model = load_model
+        self.enabled = enabled
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.budget_seconds = budget_seconds
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._seconds_per_pair: Optional[float] = None
+        self._model_error: Optional[str] = None
+        self.queries = 0
+        self.budget_exhausted = 0
+
+    def _cached(self, key: bytes) -> Optional[float]:
+        with self._lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _store(self, keys: Sequence[bytes], scores: Sequence[float]):
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._cache[key] = score
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _score(self, query: str, texts: List[str]) -> List[float]:
+        model = self.load_model()
+        start = time.perf_counter()
+        scores = model.predict([(query, text) for text in texts], batch_size=len(texts), show_progress_bar=False)
+        per_pair = (time.perf_counter() - start) / len(texts)
+        with self._lock:
+            # Moving average, so the budget check follows CPU contention
+            self._seconds_per_pair = per_pair if self._seconds_per_pair is None else (
+                0.8 * self._seconds_per_pair + 0.2 * per_pair
+            )
+        return [float(score) for score in scores]
+
+    def rerank(self, query: str, candidates: List[T], text: Callable[[T], str],
+               top_k: Optional[int] = None) -> List[Tuple[T, Optional[float]]]:
+        """
+        candidates come best first (dense or fused order). Returns the top_k as
+        (candidate, rerank score), where the score is None for a candidate
+        the budget left unscored.
+        """
+        top_k = top_k or self.top_k
+        if not self.enabled or not candidates:
+            return [(candidate, None) for candidate in candidates[:top_k]]
+
+        start = time.perf_counter()
+        self.queries += 1
+        keys = [_key(query, text(candidate)) for candidate in candidates]
+        scores: List[Optional[float]] = []
+        for key in keys:
+            score = self._cached(key)
+            record_cache_lookup("rerank", score is not None)
+            scores.append(score)
+        rerank_pairs.inc(sum(score is not None for score in scores), outcome="cached")
+
+        pending = [i for i, score in enumerate(scores) if score is None]
+        for offset in range(0, len(pending), self.batch_size):
+            batch = pending[offset:offset + self.batch_size]
+            elapsed = time.perf_counter() - start
+            expected = (self._seconds_per_pair or 0.0) * len(batch)
+            if offset and elapsed + expected > self.budget_seconds:
+                self.budget_exhausted += 1
+                rerank_pairs.inc(len(pending) - offset, outcome="unscored")
+                break
+            try:
+                batch_scores = self._score(query, [text(candidates[i]) for i in batch])
+            except Exception as e:
+                if self._model_error != str(e):
+                    logging.error(f"Reranking unavailable, keeping dense order: {e}")
+                    self._model_error = str(e)
+                rerank_pairs.inc(len(pending) - offset, outcome="unscored")
+                break
+            self._model_error = None
+            self._store([keys[i] for i in batch], batch_scores)
+            for i, score in zip(batch, batch_scores):
+                scores[i] = score
+            rerank_pairs.inc(len(batch), outcome="scored")
+
+        scored = sorted((i for i, score in enumerate(scores) if score is not None), key=lambda i: scores[i], reverse=True)
+        unscored = [i for i, score in enumerate(scores) if score is None]
+        rerank_seconds.observe(time.perf_counter() - start)
+        return [(candidates[i], scores[i]) for i in (scored + unscored)[:top_k]]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            cached = len(self._cache)
+            per_pair = self._seconds_per_pair
+        return {
+            "enabled": self.enabled,
+            "top_k": self.top_k,
+            "budget_seconds": self.budget_seconds,
+            "queries": self.queries,
+            "budget_exhausted": self.budget_exhausted,
+            "cached_pairs": cached,
+            "ms_per_pair": per_pair * 1000 if per_pair is not None else None,
+            "model_error": self._model_error,
+        }
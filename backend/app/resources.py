@@ -0,0 +1,115 @@
+from typing import Any, Callable, Dict, Iterable, Optional
+import logging
+import threading
+import time
+
+from config import settings
+
+
+class ResourceRegistry:
+    """
+    Heavy resources (embedding model, LLM clients, Qdrant client) created on
+    first use, exactly once per process, however many threads ask at the same
+    time. warm_up() loads them ahead of traffic.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._load_seconds: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._locks[name]:
+            instance = self._instances.get(name)
+            if instance is None:
+                start = time.perf_counter()
+                try:
+                    instance = self._factories[name]()
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._load_seconds[name] = time.perf_counter() - start
+                self._errors.pop(name, None)
+                self._instances[name] = instance
+                logging.info(f"Loaded resource {name} in {self._load_seconds[name]:.2f}s")
+        return instance
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._instances
+
+    def warm_up(self, names: Optional[Iterable[str]] = None) -> Dict[str, float]:
+        """Load the given resources (all by default); returns load seconds per resource"""
+        for name in names or list(self._factories):
+            try:
+                self.get(name)
+            except Exception as e:
+                logging.error(f"Failed to load resource {name}: {e}")
+        return dict(self._load_seconds)
+
+    def status(self) -> Dict[str, Dict]:
+        return {
+            name: {
+                "loaded": name in self._instances,
+                "load_seconds": self._load_seconds.get(name),
+                "error": self._errors.get(name),
+            }
+            for name in self._factories
+        }
+
+
+def _embedding_model():
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+    return HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+
+
+def _qdrant_client():
+    from qdrant_client import QdrantClient
+    if settings.qdrant_host == "localhost":
+        return QdrantClient(url="http://localhost:6333")
+    return QdrantClient(host=settings.qdrant_host, prefer_grpc=False, api_key=settings.qdrant_api_key)
+
+
+def _chat_llm(temperature: float, max_tokens: int) -> Callable[[], Any]:
+    def factory():
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            openai_api_key=settings.openai_api_key,
+            openai_api_base=settings.openai_base_url or None,
+            model_name="gpt-4o",
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+    return factory
+
+
+def _reranker_model():
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(settings.rerank_model, device="cpu")
+
+
+def _openai_async_client():
+    from openai import AsyncOpenAI
+    # One client (and connection pool) for every direct chat completion call
+    return AsyncOpenAI(api_key=settings.openai_api_key, base_url=settings.openai_base_url or None)
+
+
+resources = ResourceRegistry()
+resources.register("embedding_model", _embedding_model)
+resources.register("qdrant_client", _qdrant_client)
+resources.register("reranker_model", _reranker_model)
+# Multiple LLM instances for different purposes
+resources.register("comprehensive_llm", _chat_llm(temperature=0.2, max_tokens=3000))
+resources.register("formatting_llm", _chat_llm(temperature=0.1, max_tokens=2000))
+resources.register("academic_llm", _chat_llm(temperature=0.4, max_tokens=2000))
+# Generic question handler LLM with higher token limit
+resources.register("generic_llm", _chat_llm(temperature=0.3, max_tokens=4000))
+resources.register("openai_async_client", _openai_async_client)
@@ -0,0 +1,172 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Set
+import threading
+import time
+
+from shared_state import SharedState
+from metrics import record_cache_lookup
+
+SESSION_EPOCH_KEY = "session_epoch"
+
+
+class SessionCache:
+    """
+    Bounded TTL cache of authenticated sessions keyed by session token hash.
+    Entries hold the user row plus session fields (expires_at, current_file)
+    and are invalidated explicitly on logout and bulk session invalidation.
+    Current-file changes only update the local entry; readers that need the
+    current file across workers read it from the database.
+
+    With a shared state, invalidations also bump a shared epoch; other
+    workers notice the change within `sync_interval` seconds and drop their
+    cached sessions. `generation` counts local invalidations, so a caller
+    that fetched a session from the database can pass the generation it saw
+    to put() and the entry is not cached if an invalidation happened since.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0,
+                 shared_state: Optional[SharedState] = None, sync_interval: float = 1.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.shared_state = shared_state
+        self.sync_interval = sync_interval
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # token_hash -> (valid_until, session)
+        self._user_tokens: Dict[int, Set[str]] = {}
+        self._lock = threading.Lock()
+        self._epoch = self._read_epoch()
+        self._last_sync = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self.epoch_resets = 0
+        self.generation = 0
+        self.stale_puts = 0
+
+    def get(self, token_hash: str) -> Optional[dict]:
+        self._sync()
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is not None:
+                valid_until, session = entry
+                if time.monotonic() < valid_until:
+                    self._entries.move_to_end(token_hash)
+                    self.hits += 1
+                    record_cache_lookup("session", True)
+                    return session
+                self._remove(token_hash)
+            self.misses += 1
+            record_cache_lookup("session", False)
+            return None
+
+    def put(self, token_hash: str, session: dict, generation: Optional[int] = None):
+        # Never cache beyond the session's own expiry
+        ttl = min(self.ttl_seconds, self._seconds_until_expiry(session))
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                # Invalidated while the caller was reading it; the row may be gone already
+                self.stale_puts += 1
+                return
+            self._remove(token_hash)
+            self._entries[token_hash] = (time.monotonic() + ttl, session)
+            self._user_tokens.setdefault(session["id"], set()).add(token_hash)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def update(self, token_hash: str, **fields):
+        """Update fields of a cached session in place (e.g. current_file)"""
+        with self._lock:
+            entry = self._entries.get(token_hash)
+            if entry is not None:
+                valid_until, session = entry
+                self._entries[token_hash] = (valid_until, {**session, **fields})
+
+    def invalidate(self, token_hash: str):
+        with self._lock:
+            self.generation += 1
+            self._remove(token_hash)
+        self._publish()
+
+    def invalidate_user(self, user_id: int):
+        with self._lock:
+            self.generation += 1
+            for token_hash in list(self._user_tokens.get(user_id, ())):
+                self._remove(token_hash)
+        self._publish()
+
+    def _read_epoch(self) -> int:
+        if self.shared_state is None:
+            return 0
+        return int(self.shared_state.get(SESSION_EPOCH_KEY) or 0)
+
+    def _sync(self):
+        """Drop every cached session if another worker invalidated one since the last check"""
+        if self.shared_state is None or time.monotonic() - self._last_sync < self.sync_interval:
+            return
+        epoch = self._read_epoch()
+        with self._lock:
+            self._last_sync = time.monotonic()
+            if epoch != self._epoch:
+                self._clear_for_epoch(epoch)
+
+    def _publish(self):
+        """Tell other workers that cached sessions changed"""
+        if self.shared_state is None:
+            return
+        epoch = self.shared_state.incr(SESSION_EPOCH_KEY)
+        with self._lock:
+            if epoch != self._epoch + 1:
+                # Someone else bumped the epoch since we last looked
+                self._clear_for_epoch(epoch)
+            self._epoch = epoch
+
+    def _clear_for_epoch(self, epoch: int):
+        self._entries.clear()
+        self._user_tokens.clear()
+        self._epoch = epoch
+        self.generation += 1
+        self.epoch_resets += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._user_tokens.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "epoch": self._epoch,
+                "epoch_resets": self.epoch_resets,
+                "stale_puts": self.stale_puts,
+            }
+
+    def _remove(self, token_hash: str):
+        entry = self._entries.pop(token_hash, None)
+        if entry is not None:
+            user_id = entry[1]["id"]
+            tokens = self._user_tokens.get(user_id)
+            if tokens is not None:
+                tokens.discard(token_hash)
+                if not tokens:
+                    del self._user_tokens[user_id]
+
+    @staticmethod
+    def _seconds_until_expiry(session: dict) -> float:
+        expires_at = session.get("expires_at")
+        if isinstance(expires_at, str):
+            try:
+                expires_at = datetime.fromisoformat(expires_at)
+            except ValueError:
+                expires_at = None
+        if not isinstance(expires_at, datetime):
+            return float("inf")
+        return (expires_at - datetime.utcnow()).total_seconds()
@@ -0,0 +1,149 @@
+from abc import ABC, abstractmethod
+from typing import Optional
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+
+class SharedState(ABC):
+    """
+    Small key/value interface for state that every API worker on a node must
+    agree on (most recently updated document, document versions, session
+    invalidation epochs). Values are strings.
+
+    Workers share one node: users.db, the document catalog, the lexical index
+    and the document store are SQLite/plain files on local disk, and SQLite
+    WAL is not safe on network filesystems.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def incr(self, key: str) -> int:
+        ...
+
+    def close(self):
+        pass
+
+
+class SQLiteSharedState(SharedState):
+    """Shared state for workers on one node, in a WAL-mode SQLite file"""
+
+    def __init__(self, db_path: str, busy_timeout: float = 5.0):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(db_path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS shared_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    expires_at REAL
+                )
+            ''')
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM shared_state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO shared_state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at)
+            )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM shared_state WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front so the read sees our own increment
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute('''
+                    INSERT INTO shared_state (key, value) VALUES (?, '1')
+                    ON CONFLICT(key) DO UPDATE SET value = CAST(CAST(value AS INTEGER) + 1 AS TEXT)
+                ''', (key,))
+                row = self._conn.execute("SELECT value FROM shared_state WHERE key = ?", (key,)).fetchone()
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return int(row[0])
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisSharedState(SharedState):
+    """
+    Shared state on Redis or any server speaking its protocol, for nodes that
+    already run one. A client can be passed in directly (e.g. a fakeredis
+    instance as a local stand-in); otherwise one is created from `url`.
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", client=None, prefix: str = "questgen:"):
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("The redis package is required for SHARED_STATE_BACKEND=redis") from e
+            client = redis.Redis.from_url(url)
+        self._client = client
+        self.prefix = prefix
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}{key}"
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._client.get(self._key(key))
+        return value.decode("utf-8") if isinstance(value, bytes) else value
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None):
+        if ttl:
+            self._client.set(self._key(key), value, px=int(ttl * 1000))
+        else:
+            self._client.set(self._key(key), value)
+
+    def delete(self, key: str):
+        self._client.delete(self._key(key))
+
+    def incr(self, key: str) -> int:
+        return int(self._client.incr(self._key(key)))
+
+    def close(self):
+        try:
+            self._client.close()
+        except Exception as e:
+            logging.warning(f"Error closing shared state client: {e}")
+
+
+def create_shared_state(backend: str, sqlite_path: str, redis_url: str) -> SharedState:
+    if backend == "sqlite":
+        return SQLiteSharedState(sqlite_path)
+    if backend == "redis":
+        return RedisSharedState(redis_url)
+    raise ValueError(f"Unknown shared state backend: {backend}")
@@ -0,0 +1,68 @@
+"""
+Admission pool tests: requests beyond max_concurrency queue and are admitted
+as slots free up, and only those whose expected wait exceeds the budget are
+refused. Run from backend/app:
+    python -m pytest tests
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from admission import AdmissionPool, AdmissionRejected  # noqa: E402
+
+
+def slow_pool(max_concurrency: int, max_queue: int, max_wait_seconds: float, service_seconds: float) -> AdmissionPool:
+    """A pool whose moving average says each slot is held for service_seconds"""
+    pool = AdmissionPool("test", max_concurrency, max_queue, max_wait_seconds)
+    pool._service_seconds = service_seconds
+    pool._samples = 1
+    return pool
+
+
+def test_estimated_wait_spreads_service_time_over_slots():
+    pool = slow_pool(16, 64, 10.0, 20.0)
+    assert pool.estimated_wait(1) == pytest.approx(1.25)
+    assert pool.estimated_wait(8) == pytest.approx(10.0)
+    assert pool.estimated_wait(9) > 10.0
+
+
+def test_queued_requests_are_admitted_past_concurrency():
+    async def scenario():
+        # Slots are held far longer than max_wait, as LLM calls are
+        pool = slow_pool(4, 8, 10.0, 20.0)
+        holders = [await pool.acquire() for _ in range(4)]
+        queued = [asyncio.ensure_future(pool.acquire()) for _ in range(2)]
+        await asyncio.sleep(0)
+        assert pool.queued == 2
+
+        # Position 3 would wait 3 * 20 / 4 = 15s, over the 10s budget
+        with pytest.raises(AdmissionRejected) as rejected:
+            await pool.acquire()
+        assert rejected.value.status_code == 503
+
+        for admitted_at in holders[:2]:
+            pool.release(admitted_at)
+        admitted = await asyncio.wait_for(asyncio.gather(*queued), timeout=1)
+        assert len(admitted) == 2
+        assert pool.in_flight == 4 and pool.queued == 0
+        assert pool.admitted == 6 and pool.rejected == 1
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_refused_with_429():
+    async def scenario():
+        pool = slow_pool(1, 1, 10.0, 0.1)
+        await pool.acquire()
+        waiter = asyncio.ensure_future(pool.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await pool.acquire()
+        assert rejected.value.status_code == 429
+        waiter.cancel()
+
+    asyncio.run(scenario())
@@ -0,0 +1,94 @@
+"""
+Round-trip tests for DocumentStore: every chunk put into the store must read
+back byte for byte, whether the document is resident or served from disk.
+Run from backend/app:
+    python -m pytest tests
+"""
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+from document_store import DocumentStore, merge_chunks  # noqa: E402
+
+
+def split(text: str, size: int, overlap: int):
+    """Fixed-size chunks with overlap, like the ingestion splitter"""
+    return [text[i:i + size] for i in range(0, max(1, len(text) - overlap), size - overlap)]
+
+
+def read_back(text: bytes, offsets, lengths):
+    return [text[offset:offset + length].decode("utf-8") for offset, length in zip(offsets, lengths)]
+
+
+def test_merge_chunks_overlap_across_separator():
+    chunks = [
+        "the quick brown fox jumps over the lazy dog",
+        "ZZZZZ",
+        "over the lazy dogZZZZZ and more text here",
+    ]
+    text, offsets, lengths = merge_chunks(chunks)
+    assert read_back(text, offsets, lengths) == chunks
+
+
+def test_merge_chunks_overlapping_splits():
+    rng = random.Random(7)
+    words = ["alpha", "beta", "gamma", "delta", "épsilon", "ζeta", "eta", "theta"]
+    text = " ".join(rng.choice(words) for _ in range(2000))
+    chunks = split(text, 300, 60)
+    merged, offsets, lengths = merge_chunks(chunks)
+    assert read_back(merged, offsets, lengths) == chunks
+    # Overlaps are stored once
+    assert len(merged) < sum(lengths)
+
+
+def test_merge_chunks_mixed_overlap_and_gaps():
+    rng = random.Random(11)
+    words = ["one", "two", "three", "four", "five", "six"]
+    chunks = []
+    for _ in range(200):
+        if chunks and rng.random() < 0.6:
+            previous = chunks[-1]
+            tail = previous[-rng.randint(20, min(80, len(previous))):]
+            chunks.append(tail + " ".join(rng.choice(words) for _ in range(rng.randint(1, 30))))
+        else:
+            chunks.append(" ".join(rng.choice(words) for _ in range(rng.randint(5, 40))))
+    text, offsets, lengths = merge_chunks(chunks)
+    assert read_back(text, offsets, lengths) == chunks
+
+
+@pytest.mark.parametrize("memory_budget", [10 ** 9, 0])
+def test_store_round_trip(tmp_path, memory_budget):
+    chunks = [
+        "the quick brown fox jumps over the lazy dog",
+        "ZZZZZ",
+        "over the lazy dogZZZZZ and more text here",
+    ] + split("lorem ipsum dolor sit amet " * 200, 250, 50)
+    metadatas = [{"page": i // 4} for i in range(len(chunks))]
+    store = DocumentStore(str(tmp_path), memory_budget)
+    store.put("a.pdf", chunks, metadatas)
+    # A second document pushes the first out of memory when the budget is 0
+    store.put("b.pdf", ["other document text"], [{"page": 0}])
+
+    assert store.chunks("a.pdf") == chunks
+    assert [store.chunk_metadata("a.pdf", i) for i in range(len(chunks))] == metadatas
+
+    # A fresh store reads the same chunks back from disk
+    reopened = DocumentStore(str(tmp_path), memory_budget)
+    assert reopened.chunks("a.pdf") == chunks
+    assert reopened.chunks("b.pdf") == ["other document text"]
+
+
+def test_store_replace_and_remove(tmp_path):
+    store = DocumentStore(str(tmp_path), 0)
+    store.put("a.pdf", ["first version of the text"], [{}])
+    store.put("other.pdf", ["x"], [{}])
+    assert store.chunk("a.pdf", 0) == "first version of the text"
+    store.put("a.pdf", ["second version"], [{}])
+    store.put("other.pdf", ["y"], [{}])
+    assert store.chunk("a.pdf", 0) == "second version"
+    assert store.remove("a.pdf")
+    assert "a.pdf" not in store
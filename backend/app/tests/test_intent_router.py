@@ -0,0 +1,37 @@
+"""
+Intent router tests: the labelled query set from the benchmark must classify
+without mismatches, and question-generation detection must match the check
+it replaced. Run from backend/app:
+    python -m pytest tests
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import pytest  # noqa: E402
+
+from bench_intent_router import LABELLED_QUERIES, check_accuracy  # noqa: E402
+from intent_router import IntentRouter  # noqa: E402
+
+
+def test_labelled_queries():
+    accuracy, failures = check_accuracy(IntentRouter())
+    assert failures == []
+    assert accuracy == 1.0
+
+
+@pytest.mark.parametrize("query", [query for query, _ in LABELLED_QUERIES] + [
+    "generate questions",
+    "QUESTION: can you generate a quiz?",
+    "Please regenerate the questions",
+    "generate a summary",
+    "what question does chapter 2 answer?",
+    "create 10 questions",
+    "generating questions",
+    "Generate 5 questions\nfrom the PDF",
+])
+def test_question_generation_matches_original_check(query):
+    original = "generate" in query.lower() and "question" in query.lower()
+    assert IntentRouter().classify(query).is_question_generation == original
@@ -0,0 +1,47 @@
+"""
+Lexical index and fusion tests: BM25 search over an on-disk FTS5 index, and
+reciprocal rank fusion with dense hits. Run from backend/app:
+    python -m pytest tests
+"""
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lexical_index import LexicalIndex, build_match_query, fuse  # noqa: E402
+
+
+def dense_hit(filename: str, chunk_index: int, score: float):
+    return SimpleNamespace(payload={"page_content": f"chunk {chunk_index}",
+                                    "metadata": {"filename": filename, "chunk_index": chunk_index}}, score=score)
+
+
+def test_build_match_query_quotes_terms_and_drops_stop_words():
+    assert build_match_query('What is "eq. 7.31" in QX-4471?') == '"eq" OR "7.31" OR "qx-4471"'
+
+
+def test_search_finds_exact_terms(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.db"))
+    texts = ["the pump uses part QX-4471", "thermodynamics of pumps", "unrelated text"]
+    index.index_document("a.pdf", texts, [{"filename": "a.pdf", "chunk_index": i} for i in range(3)])
+    hits = index.search("What is QX-4471?")
+    assert [hit.metadata["chunk_index"] for hit in hits] == [0]
+    assert index.remove_document("a.pdf") == 3
+    assert index.search("QX-4471") == []
+
+
+def test_fuse_keeps_lexical_only_hits_out_of_cosine_scores(tmp_path):
+    index = LexicalIndex(str(tmp_path / "lexical.db"))
+    texts = ["part QX-4471 fails under load", "load testing overview"]
+    index.index_document("a.pdf", texts, [{"filename": "a.pdf", "chunk_index": i} for i in range(2)])
+    dense = [dense_hit("a.pdf", 1, 0.8), dense_hit("a.pdf", 5, 0.6)]
+    fused = fuse(dense, index.search("QX-4471 load"), k=60)
+
+    by_chunk = {candidate.payload["metadata"]["chunk_index"]: candidate for candidate in fused}
+    assert by_chunk[1].score == 0.8 and by_chunk[1].lexical_rank is not None
+    # Found only by BM25: no cosine score, but a BM25 score and a fused rank
+    assert by_chunk[0].score is None
+    assert by_chunk[0].lexical_score > 0 and by_chunk[0].dense_rank is None
+    # Ranked by fused rank: found by both, then BM25 rank 1, then dense rank 2
+    assert [candidate.payload["metadata"]["chunk_index"] for candidate in fused] == [1, 0, 5]
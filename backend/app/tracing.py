@@ -0,0 +1,248 @@
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+
+
+@dataclass
+class Span:
+    """One timed operation inside a request trace"""
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str] = None
+    start_ns: int = 0
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    children: List["Span"] = field(default_factory=list)
+
+    @property
+    def duration_ms(self) -> float:
+        end_ns = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end_ns - self.start_ns) / 1e6
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def walk(self):
+        yield self
+        for child in list(self.children):
+            yield from child.walk()
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+            "children": [child.to_dict() for child in list(self.children)],
+        }
+
+    def render(self, depth: int = 0) -> str:
+        """Indented span tree, one line per span"""
+        line = f"{'  ' * depth}{self.name} {self.duration_ms:.1f}ms"
+        if self.error:
+            line += f" error={self.error}"
+        return "\n".join([line] + [child.render(depth + 1) for child in list(self.children)])
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+_children_lock = threading.Lock()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Child span of the active one. Outside a traced request this is a no-op, so
+    library code can be instrumented unconditionally.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, parent.trace_id, secrets.token_hex(8), parent.span_id, time.time_ns(), attributes=attributes)
+    with _children_lock:
+        parent.children.append(child)
+    token = _current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        child.end_ns = time.time_ns()
+        _current_span.reset(token)
+
+
+class OTLPHttpExporter:
+    """
+    Ships finished traces to an OpenTelemetry collector over OTLP/HTTP (JSON
+    encoding) from a background thread. Traces are dropped, not queued without
+    bound, when the collector cannot keep up.
+    """
+
+    def __init__(self, endpoint: str, service_name: str, max_queue: int = 1000, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+        self.dropped = 0
+        self.exported = 0
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, root: Span):
+        try:
+            self._queue.put_nowait(root)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            root = self._queue.get()
+            if root is None:
+                return
+            batch = [root]
+            while len(batch) < 64:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._send(batch)
+                    return
+                batch.append(item)
+            self._send(batch)
+
+    def _send(self, roots: List[Span]):
+        body = json.dumps(self._payload(roots)).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                response.read()
+            self.exported += len(roots)
+        except Exception as e:
+            self.dropped += len(roots)
+            logging.warning(f"Trace export to {self.url} failed: {e}")
+
+    def _payload(self, roots: List[Span]) -> Dict:
+        spans = []
+        for root in roots:
+            for item in root.walk():
+                spans.append({
+                    "traceId": item.trace_id,
+                    "spanId": item.span_id,
+                    "parentSpanId": item.parent_id or "",
+                    "name": item.name,
+                    "kind": 2 if item.parent_id is None else 1,  # SERVER for the request, INTERNAL below it
+                    "startTimeUnixNano": str(item.start_ns),
+                    "endTimeUnixNano": str(item.end_ns or item.start_ns),
+                    "attributes": [_otlp_attribute(k, v) for k, v in item.attributes.items()],
+                    "status": {"code": 2, "message": item.error} if item.error else {"code": 1},
+                })
+        return {"resourceSpans": [{
+            "resource": {"attributes": [
+                _otlp_attribute("service.name", self.service_name),
+                _otlp_attribute("process.pid", os.getpid()),
+            ]},
+            "scopeSpans": [{"scope": {"name": "questgen"}, "spans": spans}],
+        }]}
+
+    def close(self, timeout: float = 5.0):
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+class Tracer:
+    """
+    Starts a root span per request. Finished traces slower than
+    `slow_threshold_seconds` are logged with their full span tree and kept in
+    a bounded in-memory log; every trace is handed to the exporter, if any.
+    """
+
+    def __init__(self, slow_threshold_seconds: float = 5.0, slow_log_size: int = 100,
+                 exporter: Optional[OTLPHttpExporter] = None):
+        self.slow_threshold_seconds = slow_threshold_seconds
+        self.exporter = exporter
+        self._slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+        self.traces = 0
+        self.slow_traces = 0
+
+    @contextmanager
+    def trace(self, name: str, **attributes):
+        root = Span(name, secrets.token_hex(16), secrets.token_hex(8), None, time.time_ns(), attributes=attributes)
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            root.end_ns = time.time_ns()
+            _current_span.reset(token)
+            self._finish(root)
+
+    def _finish(self, root: Span):
+        with self._lock:
+            self.traces += 1
+            if root.duration_ms >= self.slow_threshold_seconds * 1000:
+                self.slow_traces += 1
+                self._slow.append({
+                    "trace_id": root.trace_id,
+                    "started_at": root.start_ns / 1e9,
+                    "duration_ms": round(root.duration_ms, 3),
+                    "tree": root.to_dict(),
+                })
+                logging.warning(f"Slow request {root.trace_id} ({root.duration_ms:.0f}ms):\n{root.render()}")
+        if self.exporter is not None:
+            self.exporter.export(root)
+
+    def slow_requests(self, limit: int = 20) -> List[Dict]:
+        """Most recent slow traces first"""
+        with self._lock:
+            return list(self._slow)[::-1][:limit]
+
+    def stats(self) -> Dict:
+        stats = {
+            "traces": self.traces,
+            "slow_traces": self.slow_traces,
+            "slow_threshold_seconds": self.slow_threshold_seconds,
+        }
+        if self.exporter is not None:
+            stats.update(exported=self.exporter.exported, export_dropped=self.exporter.dropped)
+        return stats
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
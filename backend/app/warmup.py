@@ -0,0 +1,160 @@
+from typing import Awaitable, Callable, Dict, List, Tuple
+import asyncio
+import logging
+import threading
+import time
+
+from resources import resources
+
+# Representative passages for warming the embedding model (tokenizer, first forward pass)
+WARM_UP_TEXTS = [
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "The French Revolution began in 1789 and reshaped European politics.",
+    "A binary search tree keeps keys ordered so lookups take logarithmic time.",
+    "Supply and demand determine the equilibrium price in a competitive market.",
+    "Newton's second law states that force equals mass times acceleration.",
+]
+WARM_UP_QUERY = "Generate five questions about the main topic of this document."
+LLM_RESOURCES = ("comprehensive_llm", "formatting_llm", "academic_llm", "generic_llm")
+
+
+class WarmUp:
+    """
+    Ordered startup warm-up. Each component is timed and logged; the API is
+    ready once every required component has succeeded. Optional components
+    (e.g. LLM pings) are reported but never hold readiness back. Required
+    components that fail are retried, in order, with exponential backoff
+    from retry_delay up to max_retry_delay seconds until they succeed or
+    stop() is called.
+    """
+
+    def __init__(self, retry_delay: float = 1.0, max_retry_delay: float = 60.0):
+        self.components: List[Tuple[str, Callable[[], None], bool]] = []
+        self.results: Dict[str, Dict] = {}
+        self.state = "pending"
+        self.duration_seconds = None
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._stopped = threading.Event()
+        self._loop = None
+
+    def add(self, name: str, fn: Callable[[], None], required: bool = True):
+        self.components.append((name, fn, required))
+        self.results[name] = {"status": "pending", "seconds": None, "required": required, "error": None, "attempts": 0}
+
+    def _run_component(self, name: str, fn: Callable[[], None], required: bool):
+        result = self.results[name]
+        result["status"] = "running"
+        result["attempts"] += 1
+        component_start = time.perf_counter()
+        try:
+            fn()
+            result.update(status="ok", error=None)
+        except Exception as e:
+            result.update(status="failed", error=str(e))
+            log = logging.error if required else logging.warning
+            log(f"Warm-up component {name} failed (attempt {result['attempts']}): {e}")
+        result["seconds"] = time.perf_counter() - component_start
+        logging.info(f"Warm-up {name}: {result['status']} in {result['seconds']:.2f}s")
+
+    def _failed_required(self) -> List[Tuple[str, Callable[[], None], bool]]:
+        return [c for c in self.components if c[2] and self.results[c[0]]["status"] == "failed"]
+
+    def run(self):
+        self.state = "running"
+        start = time.perf_counter()
+        for name, fn, required in self.components:
+            self._run_component(name, fn, required)
+        delay = self.retry_delay
+        while self._failed_required():
+            self.state = "retrying"
+            logging.warning(f"Warm-up not ready; retrying failed components in {delay:.1f}s")
+            if self._stopped.wait(delay):
+                return
+            for name, fn, required in self._failed_required():
+                self._run_component(name, fn, required)
+            delay = min(delay * 2, self.max_retry_delay)
+        self.duration_seconds = time.perf_counter() - start
+        self.state = "complete"
+        logging.info(f"Warm-up complete in {self.duration_seconds:.2f}s (ready={self.ready})")
+
+    def stop(self):
+        """Stop retrying (on shutdown)"""
+        self._stopped.set()
+
+    async def run_async(self):
+        """Run the warm-up off the event loop"""
+        self._loop = asyncio.get_running_loop()
+        await asyncio.to_thread(self.run)
+
+    def run_on_loop(self, coro_fn: Callable[[], Awaitable]):
+        """
+        From a component, run a coroutine on the event loop that started the
+        warm-up: async clients keep connections bound to the loop they were
+        opened on, so warming them anywhere else is wasted.
+        """
+        if self._loop is None:
+            raise RuntimeError("async components are only warmed by run_async()")
+        return asyncio.run_coroutine_threadsafe(coro_fn(), self._loop).result()
+
+    def skip(self):
+        """Mark the warm-up as complete without running it"""
+        self.state = "complete"
+        for result in self.results.values():
+            result["status"] = "skipped"
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "complete" and all(
+            result["status"] in ("ok", "skipped") for result in self.results.values() if result["required"]
+        )
+
+    def status(self) -> Dict:
+        return {
+            "state": self.state,
+            "ready": self.ready,
+            "duration_seconds": self.duration_seconds,
+            "components": self.results,
+        }
+
+
+def build_warm_up(index, embedding_batch_size: int = 50, ping_llms: bool = False) -> WarmUp:
+    """Warm-up plan for a QdrantIndex: embedding batches, Qdrant round trip, LLM clients"""
+    warm_up = WarmUp()
+    query_vector = []
+
+    def embed():
+        batch = (WARM_UP_TEXTS * (embedding_batch_size // len(WARM_UP_TEXTS) + 1))[:embedding_batch_size]
+        index.embedding_model.embed_documents(batch)
+        query_vector[:] = index.embedding_model.embed_query(WARM_UP_QUERY)
+
+    def qdrant():
+        # Opens the connection, ensures the collection and touches the HNSW index
+        client = index.qdrant_client
+        client.search(collection_name=index.collection_name, query_vector=query_vector or [0.0] * index.embedding_size, limit=1)
+
+    def rerank():
+        resources.get("reranker_model")
+        index.reranker.rerank(WARM_UP_QUERY, WARM_UP_TEXTS, str)
+
+    warm_up.add("embedding_model", lambda: resources.get("embedding_model"))
+    warm_up.add("embedding_batch", embed)
+    warm_up.add("qdrant", qdrant)
+    if index.reranker.enabled:
+        # Optional: without the cross-encoder retrieval falls back to dense order
+        warm_up.add("reranker", rerank, required=False)
+    async def list_models():
+        await resources.get("openai_async_client").models.list()
+
+    for name in LLM_RESOURCES:
+        warm_up.add(name, lambda name=name: resources.get(name))
+    warm_up.add("openai_async_client", lambda: resources.get("openai_async_client"))
+    # GET /models is free and opens each client's HTTPS connection pool (every ChatOpenAI
+    # instance has its own); optional so an LLM outage doesn't keep the API out of rotation
+    for name in LLM_RESOURCES:
+        warm_up.add(f"{name}_connection", lambda name=name: resources.get(name).root_client.models.list(), required=False)
+    warm_up.add("openai_async_client_connection", lambda: warm_up.run_on_loop(list_models), required=False)
+    if ping_llms:
+        # One paid one-token completion per process checks that the model answers
+        warm_up.add("llm_ping", lambda: resources.get(LLM_RESOURCES[0]).invoke("ping", max_tokens=1), required=False)
+    return warm_up
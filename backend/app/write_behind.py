@@ -0,0 +1,146 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import time
+
+from db import Database
+
+DURABILITY_MODES = ("relaxed", "strict")
+
+
+class WriteBehindQueue:
+    """
+    Bounded in-process queue that batches single-row writes into one transaction.
+
+    relaxed: submit() returns once the row is queued; a crash can lose rows that
+             have not been flushed yet.
+    strict:  submit() waits until the batch holding the row is committed with
+             synchronous=FULL. Rows are still grouped into shared transactions.
+    """
+
+    def __init__(self, db: Database, sql: str, max_size: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 0.05, durability: str = "relaxed"):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.db = db
+        self.sql = sql
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durability = durability
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+        self.enqueued = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def start(self):
+        """Start the background flusher on the running event loop"""
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def submit(self, params: Sequence):
+        """Queue one row, waiting for space when the queue is full"""
+        if self._queue is None or self._closing:
+            # Not running (startup/shutdown): write through
+            await self.db.execute(self.sql, params)
+            return
+
+        future = asyncio.get_running_loop().create_future() if self.durability == "strict" else None
+        await self._queue.put((params, future))
+        self.enqueued += 1
+        if future is not None:
+            await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self._flush(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _flush(self, batch: List[Tuple[Sequence, Optional[asyncio.Future]]]):
+        rows = [params for params, _ in batch]
+        strict = self.durability == "strict"
+
+        def _write(conn):
+            if strict:
+                conn.execute("PRAGMA synchronous=FULL")
+            try:
+                with conn:
+                    conn.executemany(self.sql, rows)
+            finally:
+                if strict:
+                    conn.execute("PRAGMA synchronous=NORMAL")
+
+        start = time.perf_counter()
+        error = None
+        try:
+            await self.db.run(_write)
+            self.written += len(rows)
+        except Exception as e:
+            error = e
+            self.failed += len(rows)
+            logging.error(f"Write-behind flush of {len(rows)} rows failed: {e}")
+        elapsed_ms = (time.perf_counter() - start) * 1e3
+
+        self.batches += 1
+        self.last_flush_ms = elapsed_ms
+        self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+        self._total_flush_ms += elapsed_ms
+
+        for _, future in batch:
+            if future is not None and not future.done():
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(None)
+
+    async def close(self, timeout: float = 10.0):
+        """Stop accepting rows, flush what is queued and stop the flusher"""
+        if self._task is None:
+            return
+        self._closing = True
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning(f"Write-behind drain timed out with {self._queue.qsize()} rows still queued")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def stats(self) -> Dict:
+        return {
+            "durability": self.durability,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_size": self.max_size,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch_size": (self.written + self.failed) / self.batches if self.batches else 0.0,
+            "last_flush_ms": self.last_flush_ms,
+            "avg_flush_ms": self._total_flush_ms / self.batches if self.batches else 0.0,
+            "max_flush_ms": self.max_flush_ms,
+        }